@@ -1,73 +1,290 @@
 import asyncio
-from database.db_access import get_session
-from models.actuator_models import ActuatorStates as ast
-from sqlalchemy import and_, or_, not_
-from actuators.circulation_fans.circulator import CirculatorFan
-from actuators.blackout_curtains.curtains import BlackoutCurtain
-from actuators.irrigation.base_irrigator import Irrigator
-from actuators.irrigation.irrigator_line_1 import IrrigatorLine1
-from actuators.irrigation.irrigator_line_2 import IrrigatorLine2
-from actuators.side_windows.side_window_1 import SideWindow1
+from dataclasses import dataclass
+from database.db_access import get_async_session
+from models.actuator_models import ActuatorStates as ast, ActuatorGpioNo as agn
+from actuators.base_actuators.gpio_line_manager import gpio_line_manager
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.actuator_class_registry import actuator_class_registry
+from actuators.base_actuators.actuator_supervisor import actuator_supervisor
+from actuators.base_actuators.change_versions import change_versions
+from actuators.base_actuators.state_stream import state_stream
+from actuators.base_actuators.metrics import monitor_loop_lag
+from actuators.irrigation.irrigation_scheduler import irrigation_scheduler
+from services.environment_history import environment_history
+from config import settings
+from sqlalchemy import and_, or_, not_, select
+
+
+@dataclass(frozen=True)
+class ActuatorConfig:
+    """actuator_states, actuator_gpionoテーブルから読み込んだ制御機器1台分の設定
+    """
+    actuator_id: str        # 制御機器ID
+    class_name: str         # クラス名
+    aperture: float         # 開度
+    adjust_value: float     # 調整値　モータの場合は、完全開放時間
+    interval: int           # 計測間隔
+    gpio_nos: tuple         # GPIO番号
+    version: int = 0        # actuator_states.version（楽観的排他制御）
+    group_no: int = None    # 器機グループ番号（/actuators_state/stream/ の絞り込み）
+
+    @property
+    def fingerprint(self) -> tuple:
+        """制御機器を再初期化すべき設定の組
+        開度と稼働状態は運転中に変わるため含めない
+        （actuator_states.versionも開度・稼働状態の更新で増えるため使用しない）
+        """
+        return (self.class_name, self.adjust_value, self.interval, self.gpio_nos)
+
 
 class ActuatorManager:
     """各制御機能を実行する
     ActuatorStates(actuator_states)テーブルに登録されている
     制御機能を実行する
+    実行中もテーブルを定期的に読み直し、追加・削除・設定変更された制御機器だけを
+    起動・停止・再初期化する
     """
     def __init__(self, loop) -> None:
         self.actuator_dic = {}
         self.loop = loop
-    
-    def get_actuators_dic(self):
-        """ActuatorStates(actuator_states)テーブルの
-        class_name列にactuatorクラス名が登録されている
-        レコードを抽出する
-        その抽出結果を、idをキーとし、クラス名を値とする
-        辞書を作成する
-            {'blkcrtn_01': 'BlackoutCurtain', 'crcltn_01': 'CirculatorFan'}
+        self.actuators = {}             # {制御機器ID: 制御機器オブジェクト}
+        self.tasks = {}                 # {制御機器ID: 実行中のタスク}
+        self.configs = {}               # {制御機器ID: ActuatorConfig}
+        self.versions = {}              # {制御機器ID: 直近に読み込んだactuator_states.version}
+        self.background_tasks = []      # 開度の書き込み、設定の読み直しタスク
+        self.task_group: asyncio.TaskGroup = None
+
+    async def get_actuator_configs(self) -> dict:
+        """class_nameが登録されている制御機器の設定を読み込む
 
         Returns:
-            dict: {id: class_name, ...}
+            dict: {制御機器ID: ActuatorConfig, ...}
+        """
+        async with get_async_session() as db:
+            rows = (await db.execute(
+                select(ast.actuator_id, ast.class_name, ast.aperture, ast.adjust_value, ast.interval, ast.version,
+                       ast.group_no)
+                .where(and_(ast.class_name != "", ast.class_name.is_not(None))))).all()
+
+            gpio_rows = (await db.execute(
+                select(agn.actuator_id, agn.gpio_no)
+                .where(agn.actuator_id.in_([row.actuator_id for row in rows])))).all()
+
+        gpio_nos = {}
+        for actuator_id, gpio_no in gpio_rows:
+            gpio_nos.setdefault(actuator_id, []).append(int(gpio_no))
+
+        return {
+            row.actuator_id: ActuatorConfig(
+                actuator_id=row.actuator_id,
+                class_name=row.class_name,
+                aperture=row.aperture,
+                adjust_value=row.adjust_value,
+                interval=row.interval,
+                gpio_nos=tuple(gpio_nos.get(row.actuator_id, [])),
+                version=row.version,
+                group_no=row.group_no)
+            for row in rows}
+
+    def request_gpio_lines(self, config: ActuatorConfig):
+        """制御機器のGPIOラインをリクエストする
+        リクエストしたラインは、制御機器を削除するまでGpioLineManagerが保持する
+
+        Args:
+            config (ActuatorConfig): 制御機器の設定
         """
-        with get_session() as db:
-            list = db.query(ast.actuator_id, ast.class_name, ast.aperture, ast.adjust_value) \
-                        .filter(
-                            and_(
-                                ast.class_name != "",
-                                ast.class_name is not None
-                            )
-                        ).all()
-            db.commit()
-            #filterd:[('blkcrtn_01', 'BlackoutCurtain', 10, 180), ('crcltn_01', 'CirculatorFan', -1, 0)]
-            dic = {}
-            for element in list:
-                actuator_id, class_name, aperture, adjust_value = element
-                dic[actuator_id] = (class_name, aperture, adjust_value)
-
-            return dic
+        if len(config.gpio_nos) == 0:
+            return
+
+        try:
+            gpio_line_manager.request(config.actuator_id, list(config.gpio_nos))
+        except OSError as ex:
+            print(f'GPIO request failed: {config.actuator_id} {config.gpio_nos} {ex}')
+
+    def start_actuator(self, config: ActuatorConfig):
+        """制御機器を起動する
+        生成と実行はActuatorSupervisorが監視し、例外で終了した場合は再起動する
+
+        Args:
+            config (ActuatorConfig): 制御機器の設定
+        """
+        print(f'start actuator:{config}')
+        self.request_gpio_lines(config)
+        id = config.actuator_id
+
+        async def run():
+            # クラスのモジュールは、ここで初めてインポートする
+            cls = actuator_class_registry.get(config.class_name)
+            # GPIO番号はイベントループを止めずに読み込んでから、インスタンスを生成する
+            obj = cls(id, gpionos=await cls.get_gpio_no_async(id))
+            self.actuators[id] = obj
+            try:
+                # 開度は、未書き込みのものを含めた最新の値から再開する
+                aperture = aperture_store.get(id, config.aperture)
+                await obj.task(aperture, config.adjust_value)
+            finally:
+                if self.actuators.get(id) is obj:
+                    del self.actuators[id]
+                obj.close()
+
+        coro = actuator_supervisor.supervise(id, run)
+        if self.task_group is not None:
+            tsk = self.task_group.create_task(coro)
+        else:
+            tsk = self.loop.create_task(coro)
+
+        self.tasks[id] = tsk
+        self.configs[id] = config
+
+    async def stop_actuator(self, id: str, release_gpio: bool = True):
+        """制御機器を停止する
+        タスクをキャンセルすると、制御機器はモータ等を停止して終了する
+
+        Args:
+            id (str): 制御機器ID
+            release_gpio (bool, optional): True:GPIOラインを解放する
+        """
+        print(f'stop actuator:{id}')
+        tsk = self.tasks.pop(id, None)
+        self.configs.pop(id, None)
+
+        if tsk is not None:
+            tsk.cancel()
+            await asyncio.gather(tsk, return_exceptions=True)
+
+        if release_gpio:
+            gpio_line_manager.release(id)
+
+    async def reconcile(self, strict: bool = False) -> dict:
+        """テーブルの設定と実行中の制御機器を突き合わせ、差分だけを反映する
+            追加: 起動する
+            削除: 停止してGPIOラインを解放する
+            設定変更（クラス名、調整値、計測間隔、GPIO番号）: 停止して起動し直す
+            器機グループ番号は、制御機器を再初期化せずにStateStreamへ反映する
+
+        Args:
+            strict (bool, optional): True:登録されていないクラス名があれば例外を送出する
+
+        Returns:
+            dict: {'added': [...], 'removed': [...], 'changed': [...]}
+        """
+        configs = await self.get_actuator_configs()
+
+        if strict:
+            actuator_class_registry.validate([config.class_name for config in configs.values()])
+        else:
+            for id, config in list(configs.items()):
+                try:
+                    actuator_class_registry.validate([config.class_name])
+                except ValueError as err:
+                    print(f'skip actuator:{id} {err}')
+                    del configs[id]
+
+        running = set(self.configs.keys())
+        added = [id for id in configs.keys() if id not in running]
+        removed = [id for id in running if id not in configs]
+        changed = [id for id in running & configs.keys()
+                   if configs[id].fingerprint != self.configs[id].fingerprint]
+
+        for id in removed:
+            await self.stop_actuator(id)
+            actuator_state_registry.remove(id)
+
+        for id in changed:
+            await self.stop_actuator(id, release_gpio=False)
+
+        for id in removed:
+            actuator_supervisor.remove(id)
+
+        for id in added + changed:
+            self.start_actuator(configs[id])
+
+        # 追加した制御機器とグループの変更を、/actuators_state/stream/ の絞り込みに反映する
+        state_stream.set_groups({id: config.group_no for id, config in configs.items()})
+
+        self.actuator_dic = {
+            id: (config.class_name, config.aperture, config.adjust_value) for id, config in self.configs.items()}
+
+        # 他のプロセスによる変更も含めて、/actuators_state/ 等のETagを更新する
+        if len(added) > 0 or len(removed) > 0:
+            change_versions.bump('actuator_states')
+        for id, config in configs.items():
+            if self.versions.get(id) != config.version:
+                change_versions.bump('actuator_states', id)
+        self.versions = {id: config.version for id, config in configs.items()}
+
+        return {'added': added, 'removed': removed, 'changed': changed}
+
+    async def run_reconciler(self, interval: float = None):
+        """一定間隔で設定を読み直す
+
+        Args:
+            interval (float, optional): 読み直し間隔（秒）. Noneの場合はsettings.ACTUATOR_RECONCILE_INTERVAL
+        """
+        interval = interval if interval is not None else settings.ACTUATOR_RECONCILE_INTERVAL
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await self.reconcile()
+                if any(len(ids) > 0 for ids in result.values()):
+                    print(f'reconciled actuators:{result}')
+            except Exception as err:
+                print(f'reconcile failed: {err=}, {type(err)=}')
 
     async def execute_task(self):
-        """作成した辞書
+        """actuator_statesテーブルの設定
             {'blkcrtn_01': 'BlackoutCurtain', 'crcltn_01': 'CirculatorFan'}
         をもとに、クラス名からidを仮引数とするインスタンスを作成する
         そのインスタンスを非同期で実行する
+        以降は、設定の追加・削除・変更を定期的に反映する
         """
-        self.actuator_dic = self.get_actuators_dic()
-        print(f'actuator_dic:{self.actuator_dic}')
-
-        task_list = []
-        for key, value in self.actuator_dic.items():
-            print(f'key:{key} value:{value}')
-            # key: actuator_id
-            # value[0]: Actuator Class Name
-            # value[1]: now aperture
-            # value[2]: adjust value
-            class_name, now_aperture, adjust_value = value
-            obj = eval(class_name)(key)
-            tk = self.loop.create_task(obj.task(now_aperture, adjust_value))
-            # obj = eval(value[0])(key)
-            # tk = self.loop.create_task(obj.task(value[1], value[2])) # type: ignore
-            task_list.append(tk)
-
-        for tsk in task_list:
-            await tsk
+        # 各制御機器の稼働状態を読み込む。以降はPUT /actuator_mode/で更新される
+        actuator_state_registry.load()
+        # 潅水スケジュールを読み込む。以降はIrrigationScheduleAdminの更新で差分を反映する
+        await irrigation_scheduler.load()
+
+        # 制御機器を起動する前に、クラス名が全て登録されているか検査する
+        configs = await self.get_actuator_configs()
+        actuator_class_registry.validate([config.class_name for config in configs.values()])
+
+        # 全てのタスクはTaskGroupが持ち、shutdown()で全て終了するまで待つ
+        # 制御機器の例外はActuatorSupervisorが受け止めるため、他のタスクには波及しない
+        async with asyncio.TaskGroup() as tg:
+            self.task_group = tg
+
+            await self.reconcile()
+            print(f'actuator_dic:{self.actuator_dic}')
+
+            # モータ開度を一定間隔でまとめて書き込む
+            self.background_tasks.append(tg.create_task(aperture_store.run()))
+            # actuator_statesテーブルの変更を反映する
+            self.background_tasks.append(tg.create_task(self.run_reconciler()))
+            # 潅水時刻の到来を潅水装置へ配信する
+            self.background_tasks.append(tg.create_task(irrigation_scheduler.run()))
+            # 保持期間を過ぎた環境計測値を削除する
+            self.background_tasks.append(tg.create_task(environment_history.run()))
+            # イベントループの遅延を計測する（/metrics）
+            self.background_tasks.append(tg.create_task(monitor_loop_lag('actuators')))
+
+        self.task_group = None
+
+    async def shutdown(self):
+        """全ての制御機器を停止する
+        タスクをキャンセルしてから、モータ等を停止し、未書き込みの開度を
+        書き込んで、GPIOラインを解放する
+        """
+        for tsk in self.background_tasks:
+            tsk.cancel()
+
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+
+        for id in list(self.tasks.keys()):
+            await self.stop_actuator(id, release_gpio=False)
+
+        try:
+            await aperture_store.flush_async()
+        finally:
+            gpio_line_manager.release_all()
@@ -0,0 +1,103 @@
+import importlib
+import threading
+import time
+
+
+# actuator_states.class_nameに登録できるクラス名と、そのクラスを定義しているモジュール
+ACTUATOR_CLASSES = {
+    'BlackoutCurtain': 'actuators.blackout_curtains.curtains',
+    'CirculatorFan': 'actuators.circulation_fans.circulator',
+    'Irrigator': 'actuators.irrigation.base_irrigator',
+    'IrrigatorLine1': 'actuators.irrigation.irrigator_line_1',
+    'IrrigatorLine2': 'actuators.irrigation.irrigator_line_2',
+    'SideWindow1': 'actuators.side_windows.side_window_1',
+}
+
+
+class ActuatorClassRegistry:
+    """actuator_states.class_nameから制御機器クラスを取得するレジストリ
+    モジュールは、そのクラス名を使うレコードがあるときに初めてインポートする。
+    インポートにかかった時間はクラスごとに記録する。
+    """
+    def __init__(self, classes: dict = None) -> None:
+        """初期化処理
+
+        Args:
+            classes (dict, optional): {クラス名: モジュール名}. Noneの場合はACTUATOR_CLASSES
+        """
+        self._lock = threading.Lock()
+        self._modules: dict[str, str] = dict(ACTUATOR_CLASSES if classes is None else classes)
+        self._classes: dict[str, type] = {}         # {クラス名: インポート済みのクラス}
+        self.import_times: dict[str, float] = {}    # {クラス名: インポート時間（秒）}
+
+    def register(self, class_name: str, module_name: str):
+        """制御機器クラスを登録する
+
+        Args:
+            class_name (str): クラス名
+            module_name (str): クラスを定義しているモジュール名 ex.actuators.blackout_curtains.curtains
+        """
+        with self._lock:
+            self._modules[class_name] = module_name
+            self._classes.pop(class_name, None)
+
+    def names(self) -> list:
+        """登録されているクラス名の一覧を取得する
+        """
+        with self._lock:
+            return sorted(self._modules.keys())
+
+    def validate(self, class_names) -> None:
+        """クラス名が全て登録されているか検査する
+        制御機器を起動する前に呼び出し、誤ったクラス名を早い段階で検出する
+
+        Args:
+            class_names (iterable): 検査するクラス名
+
+        Raises:
+            ValueError: 登録されていないクラス名がある
+        """
+        with self._lock:
+            unknown = sorted({name for name in class_names if name not in self._modules})
+
+        if len(unknown) > 0:
+            raise ValueError(f'登録されていない制御機器クラスです: {unknown} (登録済み: {self.names()})')
+
+    def get(self, class_name: str) -> type:
+        """クラス名から制御機器クラスを取得する
+        初回はモジュールをインポートし、その時間を記録する
+
+        Args:
+            class_name (str): クラス名
+
+        Raises:
+            ValueError: 登録されていないクラス名
+
+        Returns:
+            type: 制御機器クラス
+        """
+        with self._lock:
+            cls = self._classes.get(class_name)
+            module_name = self._modules.get(class_name)
+
+        if cls is not None:
+            return cls
+
+        if module_name is None:
+            raise ValueError(f'登録されていない制御機器クラスです: {class_name}')
+
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        cls = getattr(module, class_name)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._classes[class_name] = cls
+            self.import_times.setdefault(class_name, elapsed)
+
+        print(f'import {class_name} ({module_name}): {elapsed * 1000:.1f} ms')
+
+        return cls
+
+
+actuator_class_registry = ActuatorClassRegistry()
@@ -0,0 +1,111 @@
+import threading
+from actuators.base_actuators.notifier import Notifier, Subscription
+from database.db_access import get_session
+from models.actuator_models import ActuatorStates as ast
+from actuators.base_actuators.change_versions import change_versions
+from actuators.base_actuators.metrics import db_query_duration
+from actuators.base_actuators.state_stream import state_stream
+
+
+class ActuatorStateRegistry:
+    """各制御機器の稼働状態（actuator_states.state）のメモリ内レジストリ
+    起動時にactuator_statesテーブルから読み込み、以降は
+    EnvironmentValuesService.update_actuator_mode（PUT /actuator_mode/）から更新される。
+    更新すると、対象の制御機器へ即座に通知する。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._states: dict[str, int] = {}           # {制御機器ID: 稼働状態}
+        self._notifiers: dict[str, Notifier] = {}   # {制御機器ID: Notifier}
+
+    def load(self):
+        """actuator_statesテーブルから全ての制御機器の稼働状態を読み込む
+        器機グループ番号は、/actuators_state/stream/ の絞り込み用にStateStreamへ登録する
+        """
+        with db_query_duration.time('get_actuator_state'), get_session() as db:
+            rows = db.query(ast.actuator_id, ast.state, ast.group_no).all()
+
+        with self._lock:
+            for actuator_id, state, _ in rows:
+                self._states[actuator_id] = state
+
+        state_stream.set_groups({actuator_id: group_no for actuator_id, _, group_no in rows})
+
+    def get(self, actuator_id: str) -> int:
+        """制御機器の稼働状態を取得する
+        未読み込みの制御機器は、actuator_statesテーブルから一度だけ読み込む
+
+        Args:
+            actuator_id (str): 制御機器ID
+
+        Raises:
+            ValueError: 指定したIDを持つ制御機器が登録されていない
+
+        Returns:
+            int: 稼働状態 1:自動運転中, 0:手動運転中, 9:停止中, 11:強制開, 19:強制閉
+        """
+        with self._lock:
+            if actuator_id in self._states:
+                return self._states[actuator_id]
+
+        with db_query_duration.time('get_actuator_state'), get_session() as db:
+            state = db.query(ast.state).filter(ast.actuator_id == actuator_id).first()
+
+        if state is None:
+            raise ValueError('指定したIDを持つ制御機器はactuator_statesテーブルには登録されていません。')
+
+        with self._lock:
+            return self._states.setdefault(actuator_id, state[0])
+
+    def update(self, actuator_id: str, state: int):
+        """制御機器の稼働状態を更新し、対象の制御機器へ通知する
+
+        Args:
+            actuator_id (str): 制御機器ID
+            state (int): 稼働状態
+        """
+        with self._lock:
+            self._states[actuator_id] = state
+            notifier = self._notifiers.get(actuator_id)
+
+        change_versions.bump('actuator_states', actuator_id)
+        state_stream.publish(actuator_id, state=state)
+
+        if notifier is not None:
+            notifier.notify_all()
+
+    def remove(self, actuator_id: str):
+        """制御機器をレジストリから削除する
+        """
+        with self._lock:
+            self._states.pop(actuator_id, None)
+
+        state_stream.remove_group(actuator_id)
+
+    def _get_notifier(self, actuator_id: str) -> Notifier:
+        with self._lock:
+            return self._notifiers.setdefault(actuator_id, Notifier())
+
+    def subscribe(self, actuator_id: str) -> Subscription:
+        """制御機器の稼働状態の変更通知を購読する
+
+        Args:
+            actuator_id (str): 制御機器ID
+
+        Returns:
+            Subscription: 購読オブジェクト
+        """
+        return self._get_notifier(actuator_id).subscribe()
+
+    def attach(self, actuator_id: str, subscription: Subscription) -> Subscription:
+        """既存の購読オブジェクトで稼働状態の変更通知を受け取る
+        """
+        return self._get_notifier(actuator_id).attach(subscription)
+
+    def unsubscribe(self, actuator_id: str, subscription: Subscription):
+        """購読を解除する
+        """
+        self._get_notifier(actuator_id).unsubscribe(subscription)
+
+
+actuator_state_registry = ActuatorStateRegistry()
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from actuators.base_actuators.metrics import actuator_iteration_duration, actuator_missed_ticks
+from config import settings
+
+
+@dataclass
+class ActuatorHealth:
+    """制御機器1台分の稼働状況
+    """
+    actuator_id: str                    # 制御機器ID
+    status: str = 'starting'            # starting:起動中, running:実行中, backoff:再起動待ち, stopped:停止
+    iterations: int = 0                 # 実行した周期数
+    last_latency: float = None          # 直近1周期の処理時間（秒）
+    restarts: int = 0                   # 再起動回数
+    last_error: str = None              # 直近のエラー
+    last_error_at: float = None         # 直近のエラー時刻（UNIX時刻）
+    started_at: float = None            # 直近の起動時刻（UNIX時刻）
+    _iteration_times: deque = field(default_factory=lambda: deque(maxlen=20), repr=False)
+
+    @property
+    def iterations_per_sec(self) -> float:
+        """直近の周期から求めた1秒あたりの周期数
+        """
+        times = self._iteration_times
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def to_dict(self) -> dict:
+        return {
+            'actuator_id': self.actuator_id,
+            'status': self.status,
+            'iterations': self.iterations,
+            'iterations_per_sec': self.iterations_per_sec,
+            'last_latency': self.last_latency,
+            'restarts': self.restarts,
+            'missed_ticks': int(actuator_missed_ticks.get(self.actuator_id)),
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at,
+            'started_at': self.started_at,
+        }
+
+
+class ActuatorSupervisor:
+    """制御機器タスクの監視
+    制御機器ごとに、生成から実行までを1つの監視タスクで包む。
+    生成や実行で例外が発生した場合は、その制御機器だけを指数バックオフで再起動する。
+    他の制御機器や、監視タスクを持つTaskGroupには例外を伝えない。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._health: dict[str, ActuatorHealth] = {}
+
+    def get_health(self, actuator_id: str) -> ActuatorHealth:
+        with self._lock:
+            return self._health.setdefault(actuator_id, ActuatorHealth(actuator_id))
+
+    def remove(self, actuator_id: str):
+        """制御機器の稼働状況を削除する
+        """
+        with self._lock:
+            self._health.pop(actuator_id, None)
+
+    def record_iteration(self, actuator_id: str, latency: float):
+        """制御機器の1周期分の処理時間を記録する
+
+        Args:
+            actuator_id (str): 制御機器ID
+            latency (float): 処理時間（秒）
+        """
+        health = self.get_health(actuator_id)
+        with self._lock:
+            health.iterations += 1
+            health.last_latency = latency
+            health._iteration_times.append(time.monotonic())
+
+        actuator_iteration_duration.observe(latency, actuator_id)
+
+    def stats(self) -> dict:
+        """全ての制御機器の稼働状況を取得する
+
+        Returns:
+            dict: {制御機器ID: {'status':..., 'iterations_per_sec':..., ...}, ...}
+        """
+        with self._lock:
+            return {actuator_id: health.to_dict() for actuator_id, health in self._health.items()}
+
+    def get_backoff(self, failures: int) -> float:
+        """連続失敗回数から再起動までの待ち時間を求める
+
+        Args:
+            failures (int): 連続失敗回数（1以上）
+
+        Returns:
+            float: 待ち時間（秒）
+        """
+        return min(settings.ACTUATOR_RESTART_BACKOFF * (2 ** (failures - 1)), settings.ACTUATOR_RESTART_BACKOFF_MAX)
+
+    async def supervise(self, actuator_id: str, run):
+        """制御機器を実行し、例外で終了した場合は再起動する
+        キャンセルされるまで終了しない
+
+        Args:
+            actuator_id (str): 制御機器ID
+            run (callable): 制御機器を生成して実行するコルーチン関数
+        """
+        health = self.get_health(actuator_id)
+        failures = 0
+
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                health.status = 'running'
+                health.started_at = time.time()
+
+            try:
+                await run()
+                # 制御機器のタスクが正常に終了した場合は再起動しない
+                with self._lock:
+                    health.status = 'stopped'
+                return
+            except asyncio.CancelledError:
+                with self._lock:
+                    health.status = 'stopped'
+                raise
+            except Exception as err:
+                # 安定して動作していた後の失敗は、バックオフを最初からやり直す
+                if time.monotonic() - started >= settings.ACTUATOR_RESTART_BACKOFF_MAX:
+                    failures = 0
+                failures += 1
+                delay = self.get_backoff(failures)
+
+                print(f'{actuator_id}: task failed {err=}, {type(err)=}, restart in {delay:.1f}s')
+                with self._lock:
+                    health.status = 'backoff'
+                    health.last_error = f'{type(err).__name__}: {err}'
+                    health.last_error_at = time.time()
+
+            await asyncio.sleep(delay)
+            with self._lock:
+                health.restarts += 1
+
+
+actuator_supervisor = ActuatorSupervisor()
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from sqlalchemy import select
+from database.db_access import get_session, get_async_session
+from models.actuator_models import ActuatorStates as ast
+from actuators.base_actuators.change_versions import change_versions
+from actuators.base_actuators.state_stream import state_stream
+from actuators.base_actuators.metrics import db_query_duration
+from config import settings
+
+
+class ApertureStore:
+    """各制御機器の現在開度を保持し、actuator_statesテーブルへまとめて書き込む（ライトビハインド）
+    モータ動作中の開度はメモリ上でだけ更新し、一定間隔（settings.APERTURE_FLUSH_INTERVAL）と
+    モータ停止時、終了時に、全制御機器の最新開度を1つのトランザクションで書き込む。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._apertures: dict[str, float] = {}  # {制御機器ID: 現在開度}
+        self._dirty: set[str] = set()           # 未書き込みの制御機器ID
+
+    def set(self, actuator_id: str, aperture: float):
+        """現在開度を更新する（テーブルへはflush()で書き込む）
+
+        Args:
+            actuator_id (str): 制御機器ID
+            aperture (float): 開度 0 to 100
+        """
+        with self._lock:
+            changed = self._apertures.get(actuator_id) != aperture
+            self._apertures[actuator_id] = aperture
+            self._dirty.add(actuator_id)
+
+        if changed:
+            change_versions.bump('actuator_states', actuator_id)
+            state_stream.publish(actuator_id, aperture=aperture)
+
+    def get(self, actuator_id: str, default: float = None) -> float:
+        """現在開度を取得する
+
+        Args:
+            actuator_id (str): 制御機器ID
+            default (float, optional): 開度を保持していない場合の値
+
+        Returns:
+            float: 現在開度
+        """
+        with self._lock:
+            return self._apertures.get(actuator_id, default)
+
+    def pending(self) -> dict:
+        """未書き込みの開度を取得する
+
+        Returns:
+            dict: {制御機器ID: 開度, ...}
+        """
+        with self._lock:
+            return {actuator_id: self._apertures[actuator_id] for actuator_id in self._dirty}
+
+    def flush(self) -> int:
+        """未書き込みの開度を1つのトランザクションでactuator_statesテーブルへ書き込む
+        書き込みに失敗した場合は、次回のflush()で再度書き込む
+
+        Returns:
+            int: 更新したレコード数
+        """
+        pending = self._take_pending()
+
+        if len(pending) == 0:
+            return 0
+
+        try:
+            with db_query_duration.time('update_aperture'), get_session() as db:
+                rows = db.query(ast).filter(ast.actuator_id.in_(list(pending.keys()))).all()
+
+                for row in rows:
+                    row.aperture = pending[row.actuator_id]
+
+                db.commit()
+
+            return len(rows)
+        except Exception:
+            self._restore_pending(pending)
+            raise
+
+    def _take_pending(self) -> dict:
+        with self._lock:
+            pending = {actuator_id: self._apertures[actuator_id] for actuator_id in self._dirty}
+            self._dirty.clear()
+
+        return pending
+
+    def _restore_pending(self, pending: dict):
+        with self._lock:
+            self._dirty.update(pending.keys())
+
+    async def flush_async(self) -> int:
+        """未書き込みの開度を1つのトランザクションでactuator_statesテーブルへ書き込む（非同期版）
+        書き込みに失敗した場合は、次回の書き込みで再度書き込む
+
+        Returns:
+            int: 更新したレコード数
+        """
+        pending = self._take_pending()
+
+        if len(pending) == 0:
+            return 0
+
+        try:
+            with db_query_duration.time('update_aperture'):
+                async with get_async_session() as db:
+                    rows = (await db.scalars(
+                        select(ast).where(ast.actuator_id.in_(list(pending.keys()))))).all()
+
+                    for row in rows:
+                        row.aperture = pending[row.actuator_id]
+
+                    await db.commit()
+
+            return len(rows)
+        except Exception as err:
+            self._restore_pending(pending)
+            print(f'aperture flush failed: {err=}, {type(err)=}')
+            return 0
+
+    async def run(self, interval: float = None):
+        """一定間隔で未書き込みの開度を書き込む
+        タスクがキャンセルされた場合も、最後に書き込みをおこなう
+
+        Args:
+            interval (float, optional): 書き込み間隔（秒）. Noneの場合はsettings.APERTURE_FLUSH_INTERVAL
+        """
+        interval = interval if interval is not None else settings.APERTURE_FLUSH_INTERVAL
+
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush_async()
+        finally:
+            # キャンセルされた場合でも書き込む
+            self.flush()
+
+
+aperture_store = ApertureStore()
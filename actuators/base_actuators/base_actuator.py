@@ -3,18 +3,42 @@ import gpiod
 from contextlib import contextmanager
 from requests import Session
 from schemas.actuator_schemas import ActuatorGpioNoSchema
-from database.db_access import get_session
-from models.actuator_models import EnvironmentValues as ev, ActuatorStates as ast
+from sqlalchemy import select
+from database.db_access import get_session, get_async_session
+from models.actuator_models import ActuatorStates as ast
+from actuators.base_actuators.environment_bus import environment_bus
+from actuators.base_actuators.tick_scheduler import tick_scheduler
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.notifier import Subscription
+from actuators.base_actuators.gpio_line_manager import gpio_line_manager
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.actuator_supervisor import actuator_supervisor
+from config import settings
 from gpiod.line import Direction, Value
 from models.actuator_models import ActuatorGpioNo as agn
 from schemas.actuator_schemas import ActuatorGpioNoSchema, GpioNoSchema
 
+# 実行中の開度書き込みタスク（完了するまで参照を保持し、ガベージコレクションで消えないようにする）
+flush_tasks: set = set()
+
+def on_flush_done(task: asyncio.Task):
+    """開度書き込みタスクの完了時に、参照を破棄して例外を出力する
+    """
+    flush_tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        err = task.exception()
+        print(f'aperture flush failed: {err=}, {type(err)=}')
+
 
 class Actuator:
     def __init__(self, id) -> None:
         self.PAUSED = "_pause_"   # 停止中
         self.state = self.PAUSED
         self.id = id  # 自分自身のID
+        self.wake_subscription = None   # 周期待機中の起床通知（稼働状態の変更、環境計測値の更新）
+        self.ticker = None  # 周期実行タイマー
+        self.iteration_started = None   # 現在の周期の処理開始時刻（イベントループの単調時刻）
 
     # プロパティの値を取り出すメソッドを定義する
     @property
@@ -32,11 +56,57 @@ class Actuator:
         """
         pass
 
-    def get_interval(self):
-        """計測間隔を取得する
-        ActuatorStates(actuator_states)テーブルから取得する
+    async def get_interval_async(self) -> float:
+        """計測間隔を取得する（非同期版）
+        DBアクセス中もイベントループを止めない
+
+        Returns:
+            float: 計測間隔（秒）, 未設定の場合はsettings.ACTUATOR_DEFAULT_INTERVAL
         """
-        pass
+        async with get_async_session() as db:
+            interval = await db.scalar(select(ast.interval).where(ast.actuator_id == self.id))
+
+        if interval is None or interval <= 0:
+            return settings.ACTUATOR_DEFAULT_INTERVAL
+
+        return float(interval)
+
+    async def wait_next_tick(self, wake_on_environment: bool = False):
+        """次の計測周期まで待機する
+        周期はactuator_states.intervalで、処理時間によるずれは補正される
+
+        Args:
+            wake_on_environment (bool, optional): True:新しい環境計測値が届いたら周期の途中でも起床する
+                                                  稼働状態の変更では常に起床する
+        """
+        if self.ticker is None:
+            self.ticker = tick_scheduler.register(self.id, await self.get_interval_async())
+
+        # 1周期分の処理時間を記録する
+        loop = asyncio.get_running_loop()
+        if self.iteration_started is not None:
+            actuator_supervisor.record_iteration(self.id, loop.time() - self.iteration_started)
+
+        await self.ticker.wait(self.get_wake_subscription(wake_on_environment))
+        self.iteration_started = loop.time()
+
+    def get_wake_subscription(self, wake_on_environment: bool = False) -> Subscription:
+        """起床通知の購読オブジェクトを取得する（初回のみ購読を開始する）
+        稼働状態の変更では常に通知を受け取る
+
+        Args:
+            wake_on_environment (bool, optional): True:新しい環境計測値でも通知を受け取る
+
+        Returns:
+            Subscription: 購読オブジェクト
+        """
+        if self.wake_subscription is None:
+            self.wake_subscription = actuator_state_registry.attach(
+                self.id, Subscription(asyncio.get_running_loop()))
+            if wake_on_environment:
+                environment_bus.attach(self.wake_subscription)
+
+        return self.wake_subscription
 
     def execute(self, *args):
         """制御装置（デバイス）を作動させる
@@ -44,57 +114,110 @@ class Actuator:
         """
         pass
 
+    def shutdown(self):
+        """終了時に制御装置（デバイス）を安全な状態で停止させる
+        モータやポンプなどを動かしたまま終了しないよう、継承先でこの関数をoverrideする
+        """
+        pass
+
+    def close(self):
+        """制御機器を停止し、購読している通知と周期実行タイマーを解除する
+        ActuatorManagerが制御機器を削除・再初期化するときに呼び出す
+        """
+        try:
+            self.shutdown()
+        finally:
+            if self.wake_subscription is not None:
+                actuator_state_registry.unsubscribe(self.id, self.wake_subscription)
+                environment_bus.unsubscribe(self.wake_subscription)
+                self.wake_subscription = None
+
+            if self.ticker is not None:
+                tick_scheduler.unregister(self.id)
+                self.ticker = None
+
+    def get_environment_snapshot(self):
+        """環境計測値配信バスから、現在の環境計測値を取得する
+        DBを読むのは、計測値を未受信の起動直後だけ
+
+        Returns:
+            EnvironmentSnapshot: 現在の環境計測値
+        """
+        snapshot = environment_bus.latest()
+
+        if snapshot is None:
+            raise ValueError('環境計測値がまだ登録されていません。')
+
+        return snapshot
+
     def get_environment_values(self) -> float:
-        """environment_valuesテーブルから、
-        現在の環境計測値（温度、湿度等）を取得する
+        """現在の環境計測値（照度）を取得する
 
         Returns:
             float: 現在計測照度
         """
-        with get_session() as db:
-            environments = db.query(ev).first()
-
-        return environments.lux
+        return self.get_environment_snapshot().lux
     
     def get_environment_temperature(self) -> float:
-        """environment_valuesテーブルから、
-        現在の環境計測値（温度）を取得する
+        """現在の環境計測値（温度）を取得する
 
         Returns:
             float: 現在計測温度
         """
-        with get_session() as db:
-            environments = db.query(ev).first()
+        return self.get_environment_snapshot().temperature
 
-        return environments.temperature
-    
     def update_aperture(self, aperture = 0) :
-        """指定した開度をactuator_statesテーブルへ更新する
-        テーブル:actuator_states
+        """指定した開度を更新する
+        開度はApertureStoreがメモリ上で保持し、actuator_statesテーブルへは
+        一定間隔とモータ停止時にまとめて書き込む
 
         Args:
             aperture (int, optional): 開度. 0 to 100.
         """
-        with get_session() as db:
-            filtered = db.query(ast).filter(ast.actuator_id == self.id).first()
+        aperture_store.set(self.id, aperture)
 
-            if filtered is not None:
-                #print(f'update_aperture.new aperture:{aperture}')
-                filtered.aperture = aperture
-                #db.flush() 
-                db.commit()
+    def flush_aperture(self):
+        """未書き込みの開度をactuator_statesテーブルへ書き込む
+        モータ停止時に呼び出す。イベントループ上では非同期に書き込む
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None:
+            try:
+                aperture_store.flush()
+            except Exception as err:
+                print(f'aperture flush failed: {err=}, {type(err)=}')
+        else:
+            # イベントループ上では、書き込みを待たずに制御を続ける
+            task = loop.create_task(aperture_store.flush_async())
+            flush_tasks.add(task)
+            task.add_done_callback(on_flush_done)
+
+    async def get_actuator_state(self) -> int:
+        """稼働状態を取得する
+        ActuatorStateRegistryから取得するため、定常時はDBを読まない
 
-        # await asyncio.sleep(1)
+        Returns:
+            int: 稼働状態 1:自動運転中, 0:手動運転中, 9:停止中, 11:強制開, 19:強制閉
+        """
+        return actuator_state_registry.get(self.id)
 
-    async def get_actuator_state(self):
-        with get_session() as db:
-            filtered = db.query(ast).filter(ast.actuator_id == self.id).first()
-            await asyncio.sleep(1)
-            
-            if filtered is not None:
-                return filtered.state
-            else:
-                raise ValueError('指定したIDを持つ制御機器はactuator_statesテーブルには登録されていません。')
+    def is_actuator_state(self, state: int) -> bool:
+        """稼働状態が指定した状態かどうかを判定する
+        判定した稼働状態はactuator_stateに保持する
+
+        Args:
+            state (int): 稼働状態
+
+        Returns:
+            bool: True:指定した稼働状態である
+        """
+        self.actuator_state = actuator_state_registry.get(self.id)
+
+        return self.actuator_state == state
 
     def get_gpio_no(self, id: str) -> ActuatorGpioNoSchema:
         """
@@ -135,6 +258,27 @@ class Actuator:
 
             return ActuatorGpioNoSchema(gpionos=list_gs)
 
+    @staticmethod
+    async def get_gpio_no_async(id: str) -> ActuatorGpioNoSchema:
+        """
+        指定された制御機器IDに対応するGPIO番号と状態情報を取得します（非同期版）。
+        ActuatorManagerがインスタンスを生成する前に読み込み、コンストラクタのgpionosに渡します。
+
+        Args:
+            id (str): 制御機器ID。
+
+        Returns:
+            ActuatorGpioNoSchema: 指定された制御機器IDに関連付けられたGPIO番号と状態情報のリストを含むスキーマ。
+        """
+        async with get_async_session() as db:
+            result = await db.execute(
+                select(agn.actuator_id, agn.gpio_no, agn.state).where(agn.actuator_id == id))
+
+            list_gs = [GpioNoSchema(actuator_id=val.actuator_id, gpio_no=val.gpio_no, state=val.state)
+                       for val in result.all()]
+
+        return ActuatorGpioNoSchema(gpionos=list_gs)
+
 
     def request_lines(self, gpio_no: int) -> object:
         """
@@ -170,7 +314,7 @@ class Actuator:
         #     },
         # )
 
-    def set_line(self, gpio_no: int, action: Value) -> object:
+    def set_line(self, gpio_no: int, action: Value):
         """
         指定されたGPIOピンに対してアクションを設定します。
 
@@ -178,25 +322,11 @@ class Actuator:
             gpio_no (int): 操作対象のGPIOピン番号。
             action (Value): 設定するアクションの値。通常はValue.ACTIVEまたはValue.INACTIVE。
 
-        Returns:
-            object: 操作の結果を表すオブジェクト。
-
         使用例:
             set_line(17, Value.ACTIVE)
 
         注意:
-            この関数は/dev/gpiochip4を使用してGPIOピンを操作します。
-            適切な権限が必要です。
+            GPIOラインは起動時にGpioLineManagerがリクエストして保持しているため、
+            出力のたびにチップを開き直すことはありません。
         """
-
-        with gpiod.request_lines(
-            "/dev/gpiochip4",
-            consumer="action-motor",
-            config={
-                gpio_no: 
-                gpiod.LineSettings(
-                    direction=Direction.OUTPUT, 
-                    output_value=Value.ACTIVE)},
-        ) as request:
-            request.set_value(gpio_no, action)
-
+        gpio_line_manager.set_value(gpio_no, action)
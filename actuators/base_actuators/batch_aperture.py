@@ -0,0 +1,150 @@
+"""開度判定（condition_judgement, get_aperture, on_off_condition_judgement）の一括評価
+段階別設定のチューニングで、大量の過去の環境計測値を一度に評価するために使う。
+結果は、1件ずつ評価するcalc_apertureの関数と完全に一致する。
+制御ループはnumpyを必要としないよう、calc_apertureとは別モジュールにしている。
+"""
+import numpy as np
+from actuators.base_actuators.calc_aperture import \
+    ControlCurve, \
+    PATTERN_TIME, \
+    get_day_or_night_aperture
+
+
+def condition_judgement_batch(
+        values,
+        degrees: list,
+        now_aperture,
+        apertures: list,
+        min_aperture=100,
+        max_aperture=0) -> np.ndarray:
+    """condition_judgementを配列で一括評価する
+
+    condition_judgementの判定は、「現在値 <= degrees[i] となる最初のi」で決まる。
+        現在値 == degrees[i]: apertures[i]
+        現在値 <  degrees[i]: apertures[i - 1]（i == 0の場合は現在の開度）
+    degreesの累積最大値は昇順のため、このiは昇順でない（0.0が混在している等）設定でも二分探索で求められる。
+
+    Args:
+        values (array_like): 現在の温度または、照度の配列
+        degrees (list): 温度範囲または、照度範囲 -> [30, 33, 35]
+        now_aperture (float | array_like): 現在の開度（valuesと同じ長さの配列も指定できる）
+        apertures (list): 開度範囲 -> [60, 40, 0]
+        min_aperture (int): 現在値が最低値未満の場合のデフォルト値 100
+        max_aperture (int): condition_judgementと同じく未使用（最大値より大きい場合はmin(apertures)）
+
+    Raises:
+        ValueError: degreesが空（condition_judgementと同じ）
+
+    Returns:
+        np.ndarray: 開度の配列
+    """
+    values = np.asarray(values, dtype=float)
+    if len(degrees) == 0:
+        raise ValueError('degreesが空です。')
+
+    stages = np.asarray(degrees, dtype=float)
+    # condition_judgementはzip()で判定するため、短い方に合わせる
+    count = min(len(degrees), len(apertures))
+
+    result = np.zeros(values.shape)
+    if count > 0:
+        stages_count = stages[:count]
+        aptrs = np.asarray(apertures[:count], dtype=float)
+
+        index = np.searchsorted(np.maximum.accumulate(stages_count), values, side='left')
+        found = index < count
+        at = np.minimum(index, count - 1)
+
+        previous = np.where(index == 0, now_aperture, aptrs[np.maximum(index - 1, 0)])
+        result = np.where(stages_count[at] == values, aptrs[at], previous)
+        # 見つからない場合（NaN等）は-1、-1は0とする
+        result = np.where(found, result, -1)
+        result = np.where(result == -1, 0, result)
+
+    above = values > stages.max()
+    if above.any():
+        result = np.where(above, min(apertures), result)
+
+    return np.where(values < stages.min(), min_aperture, result)
+
+def on_off_condition_judgement_batch(values, degrees: list, now_aperture, apertures: list) -> np.ndarray:
+    """on_off_condition_judgementを配列で一括評価する
+    condition_judgement（最低値未満は1）の結果を反転する
+
+    Args:
+        values (array_like): 現在の温度または、照度の配列
+        degrees (list): 温度範囲または、照度範囲 -> [30, 33, 35]
+        now_aperture (float | array_like): 現在の開度
+        apertures (list): 開度範囲 -> [60, 40, 0]
+
+    Returns:
+        np.ndarray: True:オン, False:オフ の配列
+    """
+    return condition_judgement_batch(
+        values, degrees, now_aperture, apertures, min_aperture=1, max_aperture=0) == 0
+
+def get_aperture_batch(curve: ControlCurve, values, now_aperture) -> np.ndarray:
+    """ControlCurve.get_apertureを配列で一括評価する
+    時間パターンがある場合は、現在時刻の昼間または夜間の開度（全て同じ値）とする
+
+    Args:
+        curve (ControlCurve): 制御機器のControlCurve
+        values (array_like): 現在の環境測定値の配列
+        now_aperture (float | array_like): 現在の開度
+
+    Returns:
+        np.ndarray: 開度の配列
+    """
+    values = np.asarray(values, dtype=float)
+
+    if str(PATTERN_TIME) in curve.states:
+        return np.full(values.shape, float(get_day_or_night_aperture(curve.states)))
+    elif curve.lux is not None:
+        return condition_judgement_batch(
+            values, list(curve.lux.stages), now_aperture, list(curve.lux.apertures))
+    elif curve.temperature is not None:
+        return condition_judgement_batch(
+            values, list(curve.temperature.stages), now_aperture, list(curve.temperature.apertures),
+            min_aperture=0, max_aperture=100)
+
+    return np.zeros(values.shape)
+
+def on_off_batch(curve: ControlCurve, values) -> np.ndarray:
+    """ControlCurve.on_offを配列で一括評価する
+
+    Args:
+        curve (ControlCurve): 制御機器のControlCurve
+        values (array_like): 現在の温度の配列
+
+    Returns:
+        np.ndarray: True:オン, False:オフ の配列
+    """
+    stage = curve.last_stage
+    if stage is None:
+        raise ValueError('degreesが空です。')
+
+    return on_off_condition_judgement_batch(values, list(stage.stages), 0, list(stage.apertures))
+
+def get_apertures_batch(curves: list, values, now_aperture=0) -> np.ndarray:
+    """複数の制御機器の開度を一括評価する
+
+    Args:
+        curves (list): ControlCurveのリスト
+        values (array_like): 環境測定値 全ての制御機器で共通の1次元配列, または制御機器ごとの2次元配列
+        now_aperture (float | array_like): 現在の開度
+
+    Returns:
+        np.ndarray: (制御機器数, 環境測定値数) の開度の配列
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = np.broadcast_to(values, (len(curves), len(values)))
+    elif len(values) != len(curves):
+        raise ValueError('valuesの行数が制御機器数と一致しません。')
+
+    if len(curves) == 0:
+        return np.zeros(values.shape)
+
+    # 1回の評価が環境測定値の配列全体を処理するため、制御機器ごとのループは無視できる
+    return np.stack([get_aperture_batch(curve, row, now_aperture)
+                     for curve, row in zip(curves, values)])
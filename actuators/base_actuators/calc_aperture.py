@@ -1,6 +1,13 @@
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
 from datetime import datetime
+from types import MappingProxyType
 from models.actuator_models import DeviceControlTable as dc
 from database.db_access import get_session
+from actuators.base_actuators.metrics import db_query_duration
+from config import settings
 
 PATTERN_TEMP: int = 0    # 温度
 PATTERN_LUX: int = 1    # 日射量
@@ -23,7 +30,8 @@ def get_degrees_apertures(id: str):
         int, list, list: パターンid, stageリスト, apertureリスト
     """
     with get_session() as db:
-        controlls = db.query(dc).filter(dc.actuator_id == id).all()
+        with db_query_duration.time('get_degrees_apertures'):
+            controlls = db.query(dc).filter(dc.actuator_id == id).all()
 
         if controlls is not None:
             for ctrl in controlls:
@@ -162,20 +170,21 @@ def get_nighttime_range(key: str, states: dict) -> list:
 
     return result[1] if len(result) == 2 else []
 
-def get_day_or_night_aperture(states: dict) -> int:
+def get_day_or_night_aperture(states: dict, now: datetime = None) -> int:
     """現在時刻から昼間時間または、夜間時間の開度を取得する
 
     Args:
         states (dict): 検索対象辞書
             states = {"0":[[28.0, 30.0, 33.0],[70.0, 20.0, 5.0]], 
                       "1":[[3000.0, 4000.0, 5000.0],[60.0, 20.0, 5.0]]}
+        now (datetime, optional): 判定する時刻（過去の計測値を再生する場合は計測時刻を渡す）. Noneの場合はdatetime.now()
 
     Returns:
         int: 昼間または、夜間時間開度
             時間範囲外の場合は、PATTERN_DISMISS(-1)
     """
     # 現在時間を取得 hh:mm形式
-    now = datetime.now()
+    now = now if now is not None else datetime.now()
     now_hw = now.strftime("%H:%M")
     
     term = get_daytime_range(str(PATTERN_TIME), states)
@@ -274,10 +283,32 @@ def on_off_condition_judgement(
         min_aperture=1,
         max_aperture=0)
 
+def build_states(rows) -> dict:
+    """get_degrees_apertures()の抽出結果から、未設定(None, '')を除いた
+    パターンidをキーとするstates辞書を作成する
+
+    Args:
+        rows (iterable): (パターンid, stageリスト, apertureリスト)のリスト
+
+    Returns:
+        dict: states = {"0":[[28.0, 30.0, 33.0],[70.0, 20.0, 5.0]],
+                        "1":[[3000.0, 4000.0, 5000.0],[60.0, 20.0, 5.0]]}
+    """
+    states = {}
+    for pattern, stages, apertures in rows:
+        stg = [x for x in stages if (x != None) and (x != '')]
+        aptr = [x for x in apertures if (x != None) and (x != '')]
+
+        states[str(pattern)]=[stg, aptr]
+
+    return states
+
 def get_aperture(id: str, value: float, now_aperture: float) -> float:
     """device_control_tableから、対象のIDをもつレコードを取得する
     取得したレコードの情報と現在の計測した温度または、照度と比較して、
     比較から得られた開度を求める。
+    レコードはControlCurveへコンパイルしてキャッシュしているため、
+    device_control_tableを読むのは初回と、update_device_control()で更新された後だけ。
     例.
         取得したレコードの情報
         degrees     =   [30, 33, 35]
@@ -294,39 +325,7 @@ def get_aperture(id: str, value: float, now_aperture: float) -> float:
     Returns:
         float: 開度（0≦開度≦100）
     """
-    states = {}
-    for pattern, stages, apertures in get_degrees_apertures(id):
-        stg = [x for x in stages if (x != None) and (x != '')]
-        aptr = [x for x in apertures if (x != None) and (x != '')]
-
-        states[str(pattern)]=[stg, aptr]
-        # states = {"0":[[28.0, 30.0, 33.0],[70.0, 20.0, 5.0]], 
-        # "1":[[3000.0, 4000.0, 5000.0],[60.0, 20.0, 5.0]]}
-
-    # PATTERN_TEMP: int = 0    # 温度
-    # PATTERN_LUX: int = 1    # 日射量
-    # PATTERN_TIME: int = 2    # 時間
-    # PATTERN_DISMISS: int = -1    # データなし
-
-    # states辞書のなかから、keyが時間である（key="2"）要素があるか検査する
-    # "2":[ [11:00, 13:00, 10], [19:00, 4:00, 20] ]
-    # もし存在すれば、これを最優先とし、この開度を返す。
-    # 夜間の定義（気象庁）18時頃から翌日の午前６時頃まで。府県天気予報では日界が24時のため、18時頃から24時まで。別図参照。
-    aperture = 0
-    #print(f'converted states:{states}')
-    if str(PATTERN_TIME) in states:
-        aperture = get_day_or_night_aperture(states)
-    # keyが日射量（key="1"）が含まれているときは、温度より先に、計測した照度を比較検証する。
-    elif str(PATTERN_LUX) in states:
-        return get_new_aperture(value, PATTERN_LUX, now_aperture, states)
-    # 比較した結果、states辞書の照度範囲に入っていれば、照度に対応する開度を返す。
-
-    # 現在の照度が範囲以外のときは、温度(PATTERN_TEMP=0)範囲から、対応する開度を返す。
-    elif str(PATTERN_TEMP) in states:
-        print(f'PATTERN_TEMP:{states}')
-        return get_temperature_aperture(value, PATTERN_TEMP, now_aperture, states)
-    
-    return aperture
+    return control_curve_cache.get(id).get_aperture(value, now_aperture, control_curve_cache.clock())
 
 def get_new_aperture(value: float, pattern_value: int, now_aperture: float, states: dict) -> float:
     """
@@ -384,3 +383,203 @@ def get_temperature_aperture(value: float, pattern_value: int, now_aperture: flo
             max_aperture=100)    # 開度リスト ex.[2.0, 60.0, 100.0]
 
     return aperture
+
+@dataclass(frozen=True)
+class StageCurve:
+    """段階別設定（stageリスト、apertureリスト）をコンパイルしたもの
+    stageが昇順のときは二分探索で開度を求める。
+    昇順でない（0.0が混在している等）ときは、condition_judgementで求める。
+    どちらの場合も、condition_judgementと同じ結果を返す。
+    """
+    stages: tuple       # 段階リスト ex.(28.0, 30.0, 33.0)
+    apertures: tuple    # 開度リスト ex.(70.0, 20.0, 5.0)
+    bisectable: bool    # True:二分探索できる
+
+    @classmethod
+    def compile(cls, stages: list, apertures: list) -> "StageCurve":
+        bisectable = len(stages) > 0 \
+            and len(stages) == len(apertures) \
+            and all(isinstance(x, (int, float)) for x in stages) \
+            and all(a <= b for a, b in zip(stages, stages[1:]))
+
+        return cls(tuple(stages), tuple(apertures), bisectable)
+
+    def judge(self, value: float, now_aperture: float, min_aperture=100, max_aperture=0) -> float:
+        """condition_judgementと同じ判定をおこなう
+
+        Args:
+            value (float): 現在の温度または、照度
+            now_aperture (float): 現在の開度
+            min_aperture (int): 最低値未満の場合のデフォルト値
+            max_aperture (int): 最大値より大きい場合のデフォルト値（condition_judgementと同じく未使用）
+
+        Returns:
+            float: 最新の開度
+        """
+        if not self.bisectable:
+            return condition_judgement(
+                value, list(self.stages), now_aperture, list(self.apertures), min_aperture, max_aperture)
+
+        stages = self.stages
+        if value < stages[0]:
+            return min_aperture
+        elif value > stages[-1]:
+            return min(self.apertures)
+        elif value != value:
+            # NaN
+            return 0
+
+        index = bisect_left(stages, value)
+        if stages[index] == value:
+            return self.apertures[index]
+
+        return self.apertures[index - 1]
+
+
+@dataclass(frozen=True)
+class ControlCurve:
+    """1台の制御機器のdevice_control_tableをコンパイルしたもの
+    """
+    actuator_id: str
+    states: MappingProxyType    # build_states()の結果（時間パターンの判定に使用する）
+    lux: StageCurve             # 日射量パターン, 未設定の場合はNone
+    temperature: StageCurve     # 温度パターン, 未設定の場合はNone
+    last_stage: StageCurve      # 最後のレコードのパターン（オンオフ系の判定に使用する）
+
+    @classmethod
+    def compile(cls, actuator_id: str, rows) -> "ControlCurve":
+        """get_degrees_apertures()の抽出結果からコンパイルする
+
+        Args:
+            actuator_id (str): 制御機器ID
+            rows (iterable): (パターンid, stageリスト, apertureリスト)のリスト
+
+        Returns:
+            ControlCurve: コンパイル結果
+        """
+        rows = list(rows)
+        states = build_states(rows)
+
+        def stage_curve(key: str) -> StageCurve:
+            if key not in states:
+                return None
+            return StageCurve.compile(*states[key])
+
+        last_stage = None
+        if len(rows) > 0:
+            _, stages, apertures = rows[-1]
+            last_stage = StageCurve.compile(
+                [x for x in stages if (x is not None) and (x != '')],
+                [x for x in apertures if (x is not None) and (x != '')])
+
+        return cls(
+            actuator_id,
+            MappingProxyType(states),
+            stage_curve(str(PATTERN_LUX)),
+            stage_curve(str(PATTERN_TEMP)),
+            last_stage)
+
+    def get_aperture(self, value: float, now_aperture: float, now: datetime = None) -> float:
+        """get_apertureと同じ優先順位（時間 > 日射量 > 温度）で開度を求める
+
+        Args:
+            value (float): 現在の環境測定値
+            now_aperture (float): 現在の開度
+            now (datetime, optional): 時間パターンの判定時刻. Noneの場合はdatetime.now()
+
+        Returns:
+            float: 開度（0≦開度≦100）
+        """
+        if str(PATTERN_TIME) in self.states:
+            return get_day_or_night_aperture(self.states, now)
+        elif self.lux is not None:
+            return self.lux.judge(value, now_aperture)
+        elif self.temperature is not None:
+            return self.temperature.judge(value, now_aperture, min_aperture=0, max_aperture=100)
+
+        return 0
+
+    def on_off(self, value: float) -> int:
+        """on_off_condition_judgementと同じオンオフ判定をおこなう
+        判定には最後のレコードのパターンを使用する
+
+        Args:
+            value (float): 現在の温度
+
+        Returns:
+            int: True:オン, False:オフ
+        """
+        stage = self.last_stage if self.last_stage is not None else StageCurve((), (), False)
+
+        return not stage.judge(value, 0, min_aperture=1, max_aperture=0)
+
+
+class ControlCurveCache:
+    """制御機器ごとのControlCurveのキャッシュ
+    update_device_control()でdevice_control_tableが更新されたときに破棄する。
+    APIを通さない変更も反映するよう、コンパイルからsettings.CONTROL_CURVE_CACHE_TTL秒を
+    過ぎたものはコンパイルし直す
+    """
+    def __init__(self, clock=datetime.now, timer=time.monotonic) -> None:
+        """初期化処理
+
+        Args:
+            clock (callable, optional): 時間パターンの判定に使う現在時刻を返す関数
+            timer (callable, optional): 有効期限の判定に使う単調時刻（秒）を返す関数
+        """
+        self.clock = clock
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._curves: dict[str, ControlCurve] = {}
+        self._expires: dict[str, float] = {}    # {制御機器ID: 有効期限（単調時刻）}
+        self._generation = 0
+
+    def get(self, actuator_id: str) -> ControlCurve:
+        """制御機器のControlCurveを取得する。未コンパイルの場合はコンパイルする
+
+        Args:
+            actuator_id (str): 制御機器ID
+
+        Returns:
+            ControlCurve: コンパイル結果
+        """
+        now = self.timer()
+        with self._lock:
+            curve = self._curves.get(actuator_id)
+            expires = self._expires.get(actuator_id)
+            generation = self._generation
+
+        if curve is not None and (expires is None or now < expires):
+            return curve
+
+        curve = ControlCurve.compile(actuator_id, get_degrees_apertures(actuator_id))
+
+        with self._lock:
+            # コンパイル中に破棄された場合は、キャッシュしない
+            if generation == self._generation:
+                self._curves[actuator_id] = curve
+                ttl = settings.CONTROL_CURVE_CACHE_TTL
+                if ttl > 0:
+                    self._expires[actuator_id] = now + ttl
+                else:
+                    self._expires.pop(actuator_id, None)
+
+        return curve
+
+    def invalidate(self, actuator_id: str = None):
+        """キャッシュを破棄する
+
+        Args:
+            actuator_id (str, optional): 制御機器ID. Noneの場合は全て破棄する
+        """
+        with self._lock:
+            self._generation += 1
+            if actuator_id is None:
+                self._curves.clear()
+                self._expires.clear()
+            else:
+                self._curves.pop(actuator_id, None)
+                self._expires.pop(actuator_id, None)
+
+
+control_curve_cache = ControlCurveCache()
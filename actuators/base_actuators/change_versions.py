@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+class ChangeVersions:
+    """テーブルごと、制御機器IDごとの変更カウンタ
+    ETag（条件付きGET）に使う。カウンタはメモリ上にだけあり、
+    変更がなければDBを読まずに304 Not Modifiedを返すことができる。
+    再起動後に古いETagと一致しないよう、ETagには起動時刻を含める。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tables: dict[str, int] = {}       # {テーブル名: 変更回数}
+        self._generations: dict[str, int] = {}  # {テーブル名: テーブル全体を変更した回数}
+        self._keys: dict[tuple, int] = {}       # {(テーブル名, 制御機器ID): 変更回数}
+        self.epoch = f'{time.time_ns():x}'
+
+    def bump(self, table: str, key: str = None):
+        """変更を記録する
+
+        Args:
+            table (str): テーブル名 ex.'actuator_states'
+            key (str, optional): 制御機器ID. Noneの場合はテーブル全体（全ての制御機器）の変更
+        """
+        with self._lock:
+            self._tables[table] = self._tables.get(table, 0) + 1
+            if key is None:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            else:
+                self._keys[(table, key)] = self._keys.get((table, key), 0) + 1
+
+    def get(self, table: str, key: str = None) -> str:
+        """現在のバージョンを取得する
+
+        Args:
+            table (str): テーブル名
+            key (str, optional): 制御機器ID. Noneの場合はテーブル全体
+
+        Returns:
+            str: バージョン
+        """
+        with self._lock:
+            if key is None:
+                return str(self._tables.get(table, 0))
+
+            return f'{self._generations.get(table, 0)}.{self._keys.get((table, key), 0)}'
+
+    def etag(self, table: str, key: str = None) -> str:
+        """ETagを取得する
+
+        Args:
+            table (str): テーブル名
+            key (str, optional): 制御機器ID. Noneの場合はテーブル全体
+
+        Returns:
+            str: ETag ex.'"actuator_states-17d2c0e5a1b2c3d4-12"'
+        """
+        return f'"{table}-{self.epoch}-{self.get(table, key)}"'
+
+
+change_versions = ChangeVersions()
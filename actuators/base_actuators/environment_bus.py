@@ -0,0 +1,123 @@
+import threading
+from dataclasses import dataclass
+from actuators.base_actuators.notifier import Notifier, Subscription
+from database.db_access import get_session
+from models.actuator_models import EnvironmentValues as ev
+
+
+@dataclass(frozen=True)
+class EnvironmentSnapshot:
+    """環境計測値（WatchOverから送信されてきた1件分）
+    """
+    temperature: float      # 温度
+    humidity: float         # 湿度
+    moisture: float         # 水分
+    lux: float              # 照度
+    updated: str            # 計測年月日時刻
+
+    @classmethod
+    def from_schema(cls, values) -> "EnvironmentSnapshot":
+        """DeviceSchemasから変換する
+        """
+        return cls(
+            temperature=values.temp,
+            humidity=values.hum,
+            moisture=values.mstr_0,
+            lux=values.lux,
+            updated=values.now)
+
+    @classmethod
+    def from_model(cls, row) -> "EnvironmentSnapshot":
+        """EnvironmentValues(environment_values)のレコードから変換する
+        """
+        return cls(
+            temperature=row.temperature,
+            humidity=row.humidity,
+            moisture=row.moisture,
+            lux=row.lux,
+            updated=row.updated)
+
+
+class EnvironmentBus:
+    """環境計測値のプロセス内配信バス
+    EnvironmentValuesService.create_env_valuesが登録した最新の計測値を保持し、
+    購読している制御機器へ通知する。
+    environment_valuesテーブルを読むのは、起動直後（計測値未受信）のときだけ。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest: EnvironmentSnapshot = None
+        self._notifier = Notifier()
+
+    def publish(self, snapshot: EnvironmentSnapshot):
+        """最新の計測値を登録し、購読者へ通知する
+
+        Args:
+            snapshot (EnvironmentSnapshot): 最新の計測値
+        """
+        with self._lock:
+            self._latest = snapshot
+
+        self._notifier.notify_all()
+
+    def publish_if_newer(self, snapshot: EnvironmentSnapshot) -> bool:
+        """保持している計測値より新しい（同時刻を含む）場合だけ登録し、購読者へ通知する
+        通信断から復帰したWatchOverが、過去の計測値をまとめて再送したときに使う
+
+        Args:
+            snapshot (EnvironmentSnapshot): 計測値
+
+        Returns:
+            bool: True:登録した, False:保持している計測値の方が新しい
+        """
+        with self._lock:
+            if self._latest is not None and self._latest.updated > snapshot.updated:
+                return False
+            self._latest = snapshot
+
+        self._notifier.notify_all()
+        return True
+
+    def latest(self) -> EnvironmentSnapshot:
+        """最新の計測値を取得する
+        まだ計測値を受信していない場合は、environment_valuesテーブルから読み込む
+
+        Returns:
+            EnvironmentSnapshot: 最新の計測値, 計測値が無い場合はNone
+        """
+        with self._lock:
+            if self._latest is not None:
+                return self._latest
+
+        with get_session() as db:
+            # environment_valuesは追記のみのため、最後に追加したレコードが最新
+            row = db.query(ev).order_by(ev.id.desc()).first()
+            snapshot = EnvironmentSnapshot.from_model(row) if row is not None else None
+
+        with self._lock:
+            # 読み込み中に新しい計測値が登録されていれば、そちらを優先する
+            if self._latest is None:
+                self._latest = snapshot
+
+            return self._latest
+
+    def subscribe(self) -> Subscription:
+        """計測値の更新通知を購読する
+
+        Returns:
+            Subscription: 購読オブジェクト
+        """
+        return self._notifier.subscribe()
+
+    def attach(self, subscription: Subscription) -> Subscription:
+        """既存の購読オブジェクトで計測値の更新通知を受け取る
+        """
+        return self._notifier.attach(subscription)
+
+    def unsubscribe(self, subscription: Subscription):
+        """購読を解除する
+        """
+        self._notifier.unsubscribe(subscription)
+
+
+environment_bus = EnvironmentBus()
@@ -0,0 +1,263 @@
+import threading
+import time
+from gpiod.line import Value
+from actuators.base_actuators.metrics import gpio_set_line_duration, gpio_toggles
+from config import settings
+
+
+class GpiodChipBackend:
+    """gpiodを使って実機のGPIOチップを操作するバックエンド
+    """
+    def __init__(self, chip_path: str) -> None:
+        """初期化処理
+
+        Args:
+            chip_path (str): GPIOチップのパス ex./dev/gpiochip4
+        """
+        self.chip_path = chip_path
+
+    def request_lines(self, consumer: str, gpio_nos: list, initial_value: Value):
+        """GPIOラインを出力としてリクエストする
+
+        Args:
+            consumer (str): 使用者名（制御機器ID）
+            gpio_nos (list): GPIO番号リスト
+            initial_value (Value): リクエスト時の出力値
+
+        Returns:
+            gpiod.LineRequest: リクエストしたGPIOライン
+        """
+        import gpiod
+        from gpiod.line import Direction
+
+        return gpiod.request_lines(
+            self.chip_path,
+            consumer=consumer,
+            config={
+                tuple(gpio_nos):
+                gpiod.LineSettings(
+                    direction=Direction.OUTPUT,
+                    output_value=initial_value)},
+        )
+
+
+class FakeLineRequest:
+    """FakeChipBackendがリクエストしたGPIOライン
+    gpiod.LineRequestと同じset_value/set_values/releaseを持つ
+    """
+    def __init__(self, chip: "FakeChipBackend", consumer: str, gpio_nos: list) -> None:
+        self.chip = chip
+        self.consumer = consumer
+        self.gpio_nos = list(gpio_nos)
+        self.released = False
+
+    def set_value(self, gpio_no: int, value: Value):
+        self.set_values({gpio_no: value})
+
+    def set_values(self, values: dict):
+        if self.released:
+            raise OSError('GPIO line request has been released.')
+
+        for gpio_no, value in values.items():
+            if gpio_no not in self.gpio_nos:
+                raise ValueError(f'GPIO {gpio_no} is not requested by {self.consumer}.')
+            self.chip.write(self.consumer, gpio_no, value)
+
+    def release(self):
+        self.released = True
+
+
+class FakeChipBackend:
+    """ハードウェアなしでGPIO操作を確認するための疑似GPIOチップ
+    各ラインの現在値と、値の変化（タイムスタンプ付き）を記録する
+    """
+    def __init__(self, clock=time.monotonic) -> None:
+        """初期化処理
+
+        Args:
+            clock (callable, optional): タイムスタンプを返す関数
+        """
+        self.clock = clock
+        self.values: dict[int, Value] = {}  # {GPIO番号: 現在値}
+        self.transitions: list[tuple] = []  # [(timestamp, consumer, GPIO番号, 値), ...]
+        self.request_count = 0              # ラインリクエスト回数
+        self.write_count = 0                # 出力回数
+
+    def request_lines(self, consumer: str, gpio_nos: list, initial_value: Value) -> FakeLineRequest:
+        self.request_count += 1
+        for gpio_no in gpio_nos:
+            self.write(consumer, gpio_no, initial_value)
+
+        return FakeLineRequest(self, consumer, gpio_nos)
+
+    def write(self, consumer: str, gpio_no: int, value: Value):
+        self.write_count += 1
+        if self.values.get(gpio_no) != value:
+            self.values[gpio_no] = value
+            self.transitions.append((self.clock(), consumer, gpio_no, value))
+
+
+def create_backend(name: str):
+    """設定名からGPIOバックエンドを作成する
+
+    Args:
+        name (str): 'gpiod':実機, 'fake':疑似GPIOチップ
+
+    Returns:
+        object: GPIOバックエンド
+    """
+    if name == 'fake':
+        return FakeChipBackend()
+    elif name == 'gpiod':
+        return GpiodChipBackend(settings.GPIO_CHIP_PATH)
+
+    raise ValueError(f'Unknown GPIO backend: {name}')
+
+
+class GpioLineManager:
+    """プロセス全体で共有するGPIOラインリクエストの管理
+    各制御機器のGPIOラインは起動時に一度だけリクエストし、保持したまま
+    set_value/set_valuesで出力する。出力のたびにチップを開き直さないため、
+    リクエスト時の初期値に戻ってしまうこともない。
+    """
+    def __init__(self, backend=None) -> None:
+        """初期化処理
+
+        Args:
+            backend (object, optional): GPIOバックエンド. Noneの場合はsettings.GPIO_BACKENDから作成する
+        """
+        self._lock = threading.Lock()
+        self._backend = backend
+        self._requests: dict[str, object] = {}   # {制御機器ID: LineRequest}
+        self._lines: dict[int, object] = {}      # {GPIO番号: LineRequest}
+        self._values: dict[int, Value] = {}      # {GPIO番号: 最後に出力した値}（出力の切り替え回数の計測用）
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend(settings.GPIO_BACKEND)
+
+        return self._backend
+
+    def set_backend(self, backend):
+        """GPIOバックエンドを差し替える
+        保持しているラインリクエストは全て解放する
+
+        Args:
+            backend (object): GPIOバックエンド
+        """
+        self.release_all()
+        self._backend = backend
+
+    def request(self, actuator_id: str, gpio_nos: list, initial_value: Value = Value.INACTIVE):
+        """制御機器のGPIOラインをリクエストして保持する
+        既にリクエスト済みの制御機器は、一度解放してからリクエストし直す
+
+        Args:
+            actuator_id (str): 制御機器ID（consumer名として使用する）
+            gpio_nos (list): GPIO番号リスト
+            initial_value (Value, optional): リクエスト時の出力値
+        """
+        gpio_nos = [int(no) for no in gpio_nos]
+        if len(gpio_nos) == 0:
+            return
+
+        self.release(actuator_id)
+
+        with self._lock:
+            request = self.backend.request_lines(actuator_id, gpio_nos, initial_value)
+            self._requests[actuator_id] = request
+            for gpio_no in gpio_nos:
+                self._lines[gpio_no] = request
+                self._values[gpio_no] = initial_value
+
+    def release(self, actuator_id: str):
+        """制御機器のGPIOラインを解放する
+
+        Args:
+            actuator_id (str): 制御機器ID
+        """
+        with self._lock:
+            request = self._requests.pop(actuator_id, None)
+            if request is None:
+                return
+
+            for gpio_no in [no for no, req in self._lines.items() if req is request]:
+                del self._lines[gpio_no]
+                self._values.pop(gpio_no, None)
+
+        request.release()
+
+    def release_all(self):
+        """保持している全てのGPIOラインを解放する
+        """
+        with self._lock:
+            actuator_ids = list(self._requests.keys())
+
+        for actuator_id in actuator_ids:
+            self.release(actuator_id)
+
+    def is_requested(self, gpio_no: int) -> bool:
+        with self._lock:
+            return gpio_no in self._lines
+
+    def set_value(self, gpio_no: int, value: Value):
+        """GPIOラインへ出力する
+        起動時にリクエストされていないラインは、その場でリクエストして保持する
+
+        Args:
+            gpio_no (int): GPIO番号
+            value (Value): Value.ACTIVE または Value.INACTIVE
+        """
+        request = self._lines.get(gpio_no)
+        if request is None:
+            self.request(f'gpio_{gpio_no}', [gpio_no])
+            request = self._lines[gpio_no]
+
+        started = time.perf_counter()
+        request.set_value(gpio_no, value)
+        gpio_set_line_duration.observe(time.perf_counter() - started, gpio_no)
+        self._record_outputs({gpio_no: value})
+
+    def set_values(self, values: dict):
+        """複数のGPIOラインへ出力する
+        同じリクエストに属するラインはまとめて1回で出力する
+
+        Args:
+            values (dict): {GPIO番号: Value, ...}
+        """
+        for gpio_no in values.keys():
+            if not self.is_requested(gpio_no):
+                self.request(f'gpio_{gpio_no}', [gpio_no])
+
+        with self._lock:
+            grouped = {}
+            for gpio_no, value in values.items():
+                request = self._lines[gpio_no]
+                grouped.setdefault(id(request), (request, {}))[1][gpio_no] = value
+
+        for request, request_values in grouped.values():
+            started = time.perf_counter()
+            if len(request_values) == 1:
+                request.set_value(*next(iter(request_values.items())))
+            else:
+                request.set_values(request_values)
+
+            # まとめて出力したラインは、同じ処理時間を記録する
+            elapsed = time.perf_counter() - started
+            for gpio_no in request_values.keys():
+                gpio_set_line_duration.observe(elapsed, gpio_no)
+            self._record_outputs(request_values)
+
+    def _record_outputs(self, values: dict):
+        """出力値を保持し、前回と異なる値を出力したラインの切り替え回数を数える
+        """
+        with self._lock:
+            toggled = [gpio_no for gpio_no, value in values.items() if self._values.get(gpio_no) != value]
+            self._values.update(values)
+
+        for gpio_no in toggled:
+            gpio_toggles.inc(gpio_no)
+
+
+gpio_line_manager = GpioLineManager()
@@ -0,0 +1,263 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from config import settings
+
+# ヒストグラムの区間の上限（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+GPIO_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """ラベルを{name="value",...}の形式にする
+    """
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if len(labels) > 0 else ''
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンタ
+    """
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}   # {ラベル値: 値}
+
+    def inc(self, *labels, amount: float = 1):
+        """カウンタを加算する
+
+        Args:
+            labels: ラベル値（labelnamesの順）
+            amount (float, optional): 加算する値
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values]
+
+
+class Gauge(Counter):
+    """増減する値（直近の値）
+    """
+    type = 'gauge'
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """区間ごとの観測回数、合計、回数を集計するヒストグラム
+    観測は区間の二分探索と加算だけで、値そのものは保持しない
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # {ラベル値: [区間ごとの回数（最後は+Inf）..., 合計]}
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        """値を観測する
+
+        Args:
+            value (float): 観測値（秒）
+            labels: ラベル値（labelnamesの順）
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """withブロックの処理時間を観測する（例外で終了した場合も観測する）
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def get_count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return 0 if series is None else sum(series[:-1])
+
+    def samples(self) -> list:
+        with self._lock:
+            series_list = [(labels, list(series)) for labels, series in self._series.items()]
+
+        lines = []
+        for labels, series in series_list:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{format_value(upper)}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(series[-1])}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスの登録と、Prometheusのテキスト形式への出力
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, object] = {}
+
+    def register(self, metric):
+        """メトリクスを登録する
+
+        Args:
+            metric (Counter | Gauge | Histogram): メトリクス
+
+        Raises:
+            ValueError: 同じ名前のメトリクスが登録済み
+
+        Returns:
+            metric: 登録したメトリクス
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+
+        return metric
+
+    def render(self) -> str:
+        """全てのメトリクスをPrometheusのテキスト形式(0.0.4)で出力する
+
+        Returns:
+            str: # HELP, # TYPE, サンプル行
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+event_loop_lag = metrics_registry.register(Histogram(
+    'event_loop_lag_seconds',
+    'Delay of a periodic timer on the event loop beyond its scheduled time.',
+    ('loop',), LOOP_LAG_BUCKETS))
+actuator_iteration_duration = metrics_registry.register(Histogram(
+    'actuator_iteration_duration_seconds',
+    'Processing time of one actuator iteration (_count is the number of iterations).',
+    ('actuator_id',)))
+db_query_duration = metrics_registry.register(Histogram(
+    'db_query_duration_seconds',
+    'Latency of database helpers.',
+    ('helper',)))
+actuator_missed_ticks = metrics_registry.register(Counter(
+    'actuator_missed_ticks_total',
+    'Number of actuator ticks skipped because an iteration overran its interval.',
+    ('actuator_id',)))
+gpio_set_line_duration = metrics_registry.register(Histogram(
+    'gpio_set_line_duration_seconds',
+    'Latency of writing a value to a GPIO line.',
+    ('gpio_no',), GPIO_BUCKETS))
+gpio_toggles = metrics_registry.register(Counter(
+    'gpio_toggles_total',
+    'Number of GPIO line output changes.',
+    ('gpio_no',)))
+http_request_duration = metrics_registry.register(Histogram(
+    'http_request_duration_seconds',
+    'Latency of API requests until the response starts.',
+    ('method', 'route', 'status')))
+
+async def monitor_loop_lag(name: str, interval: float = None):
+    """一定間隔のタイマーの遅れで、イベントループの遅延を計測する
+    キャンセルされるまで終了しない
+
+    Args:
+        name (str): イベントループの名前（loopラベル）
+        interval (float, optional): 計測間隔（秒）. Noneの場合はsettings.METRICS_LOOP_LAG_INTERVAL
+    """
+    interval = interval if interval is not None else settings.METRICS_LOOP_LAG_INTERVAL
+    loop = asyncio.get_running_loop()
+
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(loop.time() - expected, 0.0), name)
+
+
+class MetricsMiddleware:
+    """APIの処理時間をルートごとに計測するASGIミドルウェア
+    ラベルにはURLではなくルートのパス（/actuator_state/ 等）を使い、系列数を増やさない
+    Server-Sent Eventsのように本文が終わらない応答もあるため、応答の開始までを計測する
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status):
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            http_request_duration.observe(time.perf_counter() - started, scope['method'], path, str(status))
+
+        async def send_wrapper(message):
+            nonlocal observed
+            if message['type'] == 'http.response.start' and not observed:
+                observed = True
+                observe(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not observed:
+                # 応答する前に例外で終了した
+                observe(500)
@@ -0,0 +1,196 @@
+import asyncio
+from gpiod.line import Value
+from actuators.base_actuators.gpio_line_manager import gpio_line_manager
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.notifier import Subscription
+from config import settings
+
+
+class MotorPositioner:
+    """モータ（遮光カーテン、側窓）の開度を動作時間で制御する
+    全開時間（actuator_states.adjust_value）から目標開度までの動作時間を求め、
+    モータを1回起動して、その時間だけ動かしてから停止する。
+    時間はイベントループの単調時刻で計るため、1秒未満の動作時間も正確に扱える。
+    動作中に稼働状態の変更や新しい環境計測値の通知を受けると、
+    その時点の開度から目標を計算し直し、動作時間の延長・短縮、または停止をおこなう。
+    """
+    def __init__(self, actuator_id: str, forward_gpio: int, reverse_gpio: int) -> None:
+        """初期化処理
+
+        Args:
+            actuator_id (str): 制御機器ID
+            forward_gpio (int): 順方向（開く）モータのGPIO番号
+            reverse_gpio (int): 逆方向（閉じる）モータのGPIO番号
+        """
+        self.actuator_id = actuator_id
+        self.forward_gpio = forward_gpio
+        self.reverse_gpio = reverse_gpio
+        self.full_travel_time = 0.0     # 全開時間（秒）
+        self.direction = 0              # 1:開く, -1:閉じる, 0:停止中
+        self.target: float = None       # 目標開度
+        self._position = 0.0            # 起動時（停止中は現在）の開度
+        self._started_at: float = None  # 起動時刻（イベントループの単調時刻）
+
+    def configure(self, full_travel_time: float, aperture: float):
+        """全開時間と現在開度を設定する
+
+        Args:
+            full_travel_time (float): 全開時間（秒）
+            aperture (float): 現在開度
+        """
+        self.full_travel_time = float(full_travel_time or 0)
+        self._position = float(aperture)
+
+    @property
+    def moving(self) -> bool:
+        return self.direction != 0
+
+    @property
+    def unit_time(self) -> float:
+        """開度１％あたりの秒数
+        """
+        return self.full_travel_time / 100
+
+    @property
+    def position(self) -> float:
+        """現在開度
+        動作中は起動からの経過時間から求める
+
+        Returns:
+            float: 現在開度 0 to 100
+        """
+        if not self.moving:
+            return self._position
+
+        elapsed = asyncio.get_running_loop().time() - self._started_at
+        position = self._position + self.direction * elapsed / self.unit_time
+
+        if self.direction > 0:
+            return min(position, self.target, 100)
+        else:
+            return max(position, self.target, 0)
+
+    def remaining_time(self) -> float:
+        """目標開度に達するまでの残り秒数
+        """
+        if not self.moving:
+            return 0.0
+
+        return abs(self.target - self.position) * self.unit_time
+
+    def start(self, direction: int, target: float):
+        """モータを起動する
+
+        Args:
+            direction (int): 1:開く, -1:閉じる
+            target (float): 目標開度
+        """
+        self.target = target
+        self._started_at = asyncio.get_running_loop().time()
+        self.direction = direction
+
+        if direction > 0:
+            values = {self.reverse_gpio: Value.INACTIVE, self.forward_gpio: Value.ACTIVE}
+        else:
+            values = {self.forward_gpio: Value.INACTIVE, self.reverse_gpio: Value.ACTIVE}
+
+        try:
+            gpio_line_manager.set_values(values)
+        except Exception:
+            self.direction = 0
+            raise
+
+    def stop(self) -> float:
+        """モータを停止する
+        停止中の場合は何もしない
+
+        Returns:
+            float: 停止した時点の開度
+        """
+        if not self.moving:
+            return self._position
+
+        position = self.position
+        self.direction = 0
+        self._position = position
+
+        gpio_line_manager.set_values({
+            self.forward_gpio: Value.INACTIVE,
+            self.reverse_gpio: Value.INACTIVE})
+
+        aperture_store.set(self.actuator_id, position)
+
+        return position
+
+    def retarget(self, target: float) -> bool:
+        """動作中の目標開度を変更する
+        同じ方向で、現在開度より先の目標であれば動作時間を延長・短縮する
+
+        Args:
+            target (float): 新しい目標開度
+
+        Returns:
+            bool: True:動作を継続する, False:停止すべき（目標に達した、または逆方向）
+        """
+        target = min(max(target, 0), 100)
+        position = self.position
+
+        if (target - position) * self.direction <= 0:
+            return False
+
+        self.target = target
+        return True
+
+    async def move_to(self, target: float, keep_running=None, retarget=None, wake: Subscription = None) -> float:
+        """目標開度までモータを動かす
+
+        Args:
+            target (float): 目標開度
+            keep_running (callable, optional): 動作を続けてよいか返す関数. Falseを返すと停止する
+            retarget (callable, optional): 現在開度を受け取り、新しい目標開度を返す関数
+            wake (Subscription, optional): 動作中に再判定させる通知（稼働状態の変更、環境計測値の更新）
+
+        Returns:
+            float: 停止した時点の開度
+        """
+        target = min(max(target, 0), 100)
+        direction = (target > self._position) - (target < self._position)
+
+        if direction == 0:
+            return self._position
+
+        if self.full_travel_time <= 0:
+            # 全開時間が未設定の場合は、動作させずに開度だけ更新する
+            self._position = target
+            aperture_store.set(self.actuator_id, target)
+            return target
+
+        print(f'{self.actuator_id}: move {self._position:.1f} -> {target:.1f} '
+              f'({abs(target - self._position) * self.unit_time:.2f}s)')
+
+        self.start(direction, target)
+        try:
+            while True:
+                remaining = self.remaining_time()
+                if remaining <= 0:
+                    break
+
+                # 動作中も一定間隔で現在開度を更新する（APIからの参照用）
+                timeout = min(remaining, settings.MOTOR_PROGRESS_INTERVAL)
+                if wake is not None:
+                    await wake.wait(timeout=timeout)
+                else:
+                    await asyncio.sleep(timeout)
+
+                aperture_store.set(self.actuator_id, self.position)
+
+                if keep_running is not None and not keep_running():
+                    break
+
+                if retarget is not None:
+                    if not self.retarget(retarget(self.position)):
+                        break
+        finally:
+            position = self.stop()
+
+        return position
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+
+class Subscription:
+    """通知を受け取る購読オブジェクト
+    購読したイベントループ上のasyncio.Eventで通知を受け取る。
+    通知元はどのスレッドからでもnotify()を呼び出すことができる。
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify(self):
+        """購読側のイベントループ上でイベントをセットする
+        """
+        if self.loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self.loop:
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.event.set)
+            except RuntimeError:
+                # イベントループ終了直後の通知は無視する
+                pass
+
+    async def wait(self, timeout: float = None) -> bool:
+        """通知があるか、タイムアウトするまで待機する
+
+        Args:
+            timeout (float, optional): 最大待機秒数. Noneの場合は通知があるまで待機する
+
+        Returns:
+            bool: True:通知あり, False:タイムアウト
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+
+class Notifier:
+    """複数の購読者へ通知を配信する
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: list[Subscription] = []
+
+    def subscribe(self) -> Subscription:
+        """実行中のイベントループで購読を開始する
+
+        Returns:
+            Subscription: 購読オブジェクト
+        """
+        return self.attach(Subscription(asyncio.get_running_loop()))
+
+    def attach(self, subscription: Subscription) -> Subscription:
+        """既存の購読オブジェクトでも通知を受け取るようにする
+        1つの購読オブジェクトで、複数の通知元からの通知を待つことができる
+
+        Args:
+            subscription (Subscription): 購読オブジェクト
+
+        Returns:
+            Subscription: 購読オブジェクト
+        """
+        with self._lock:
+            self._subscriptions.append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """購読を解除する
+
+        Args:
+            subscription (Subscription): 解除する購読オブジェクト
+        """
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def notify_all(self):
+        """全ての購読者へ通知する
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            subscription.notify()
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from config import settings
+
+
+class StateStreamClient:
+    """ストリームの購読者（SSE接続1本分）
+    購読したイベントループ上の上限付きキューで、変更を受け取る
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, group_no: int = None, maxsize: int = None) -> None:
+        self.loop = loop
+        self.group_no = group_no    # Noneの場合は全てのグループ
+        self.queue = asyncio.Queue(maxsize if maxsize is not None else settings.STATE_STREAM_QUEUE_SIZE)
+        self.dropped = False        # True:受信が追いつかず切断された
+
+    def offer(self, delta: dict):
+        """変更をキューへ入れる（購読側のイベントループ上で呼び出す）
+        キューが一杯の場合は、この購読者を切断する
+        """
+        if self.dropped:
+            return
+
+        try:
+            self.queue.put_nowait(delta)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+    async def get(self, timeout: float = None) -> dict:
+        """変更を1件取り出す
+
+        Args:
+            timeout (float, optional): 最大待機秒数
+
+        Returns:
+            dict: 変更, タイムアウトした場合はNone
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class StateStream:
+    """制御機器の稼働状態・開度の変更を、SSEの購読者へ配信する
+    ApertureStoreとActuatorStateRegistryが、変更があったときにpublish()する。
+    器機グループ番号は、ActuatorStateRegistryの読み込みとActuatorManagerの設定の読み直しで更新する。
+    購読者ごとのキューは上限付きで、受信が追いつかない購読者は切断する。
+    制御ループは配信を待たない（キューが一杯でも止まらない）。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: list[StateStreamClient] = []
+        self._groups: dict[str, int] = {}       # {制御機器ID: 器機グループ番号}
+
+    def set_groups(self, groups: dict):
+        """器機グループ番号を登録する（グループ番号での絞り込みに使う）
+
+        Args:
+            groups (dict): {制御機器ID: 器機グループ番号, ...}
+        """
+        with self._lock:
+            self._groups.update(groups)
+
+    def remove_group(self, actuator_id: str):
+        """器機グループ番号を削除する
+
+        Args:
+            actuator_id (str): 制御機器ID
+        """
+        with self._lock:
+            self._groups.pop(actuator_id, None)
+
+    def subscribe(self, group_no: int = None) -> StateStreamClient:
+        """実行中のイベントループで購読を開始する
+
+        Args:
+            group_no (int, optional): 器機グループ番号. Noneの場合は全てのグループ
+
+        Returns:
+            StateStreamClient: 購読者
+        """
+        client = StateStreamClient(asyncio.get_running_loop(), group_no)
+        with self._lock:
+            self._clients.append(client)
+
+        return client
+
+    def unsubscribe(self, client: StateStreamClient):
+        """購読を解除する
+        """
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, actuator_id: str, **changes):
+        """変更を購読者へ配信する（どのスレッドからでも呼び出せる）
+
+        Args:
+            actuator_id (str): 制御機器ID
+            changes: 変更した項目 ex.aperture=40.0, state=1
+        """
+        with self._lock:
+            if len(self._clients) == 0:
+                return
+            group_no = self._groups.get(actuator_id)
+            clients = [client for client in self._clients
+                       if client.group_no is None or client.group_no == group_no]
+
+        delta = {'actuator_id': actuator_id, 'group_no': group_no, **changes}
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        for client in clients:
+            if client.loop is running:
+                client.offer(delta)
+            elif not client.loop.is_closed():
+                try:
+                    client.loop.call_soon_threadsafe(client.offer, delta)
+                except RuntimeError:
+                    # イベントループ終了直後の配信は無視する
+                    pass
+
+
+state_stream = StateStream()
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from actuators.base_actuators.notifier import Subscription
+from actuators.base_actuators.metrics import actuator_missed_ticks
+
+
+class Ticker:
+    """制御機器1台分の周期実行タイマー
+    期限は「開始時刻 + n × 計測間隔」で管理するため、処理時間による
+    ずれが累積しない。処理が計測間隔を超えた場合は、過ぎてしまった周期を
+    まとめて読み飛ばし、その数をmissed_ticksに加算する。
+    読み飛ばした周期数は、再起動しても消えないよう/metricsのカウンタにも加算する
+    （/actuators_health/のmissed_ticksはこのカウンタの値）。
+    """
+    def __init__(self, actuator_id: str, interval: float) -> None:
+        """初期化処理
+
+        Args:
+            actuator_id (str): 制御機器ID
+            interval (float): 計測間隔（秒）
+        """
+        self.actuator_id = actuator_id
+        self.interval = interval
+        self.deadline: float = None     # 次の周期の期限（イベントループの単調時刻）
+        self.ticks = 0                  # 実行した周期数
+        self.missed_ticks = 0           # 読み飛ばした周期数
+
+    async def wait(self, wake: Subscription = None):
+        """次の周期の期限まで待機する
+        wakeを指定した場合は、通知があった時点で期限前でも待機を終える。
+        期限は変わらないため、次の呼び出しでは残り時間だけ待機する。
+
+        Args:
+            wake (Subscription, optional): 早期起床させる通知
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        if self.deadline is None:
+            self.deadline = now + self.interval
+        elif now >= self.deadline:
+            # 期限を過ぎている。過ぎた周期は読み飛ばす
+            missed = int((now - self.deadline) // self.interval)
+            if missed > 0:
+                self.missed_ticks += missed
+                actuator_missed_ticks.inc(self.actuator_id, amount=missed)
+                print(f'{self.actuator_id}: missed {missed} ticks (total:{self.missed_ticks})')
+
+            self.deadline += (missed + 1) * self.interval
+            self.ticks += 1
+
+        delay = max(self.deadline - now, 0)
+
+        if wake is not None:
+            await wake.wait(timeout=delay)
+        else:
+            await asyncio.sleep(delay)
+
+
+class TickScheduler:
+    """各制御機器の周期実行タイマーを管理する
+    全ての制御機器は同じイベントループ上で協調的に待機する。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tickers: dict[str, Ticker] = {}
+
+    def register(self, actuator_id: str, interval: float) -> Ticker:
+        """制御機器の周期実行タイマーを登録する
+
+        Args:
+            actuator_id (str): 制御機器ID
+            interval (float): 計測間隔（秒）
+
+        Returns:
+            Ticker: 周期実行タイマー
+        """
+        ticker = Ticker(actuator_id, interval)
+        with self._lock:
+            self._tickers[actuator_id] = ticker
+
+        return ticker
+
+    def unregister(self, actuator_id: str):
+        """制御機器の周期実行タイマーを削除する
+
+        Args:
+            actuator_id (str): 制御機器ID
+        """
+        with self._lock:
+            self._tickers.pop(actuator_id, None)
+
+    def stats(self) -> dict:
+        """周期実行の状況を取得する
+
+        Returns:
+            dict: {actuator_id: {'interval': float, 'ticks': int, 'missed_ticks': int}, ...}
+        """
+        with self._lock:
+            tickers = list(self._tickers.values())
+
+        return {
+            ticker.actuator_id: {
+                'interval': ticker.interval,
+                'ticks': ticker.ticks,
+                'missed_ticks': ticker.missed_ticks,
+            } for ticker in tickers
+        }
+
+
+tick_scheduler = TickScheduler()
@@ -0,0 +1,100 @@
+import asyncio
+import selectors
+import threading
+from datetime import datetime, timedelta
+
+# スレッド（DBアクセス等）の完了を待つときに、実際に待機する最大秒数
+IO_POLL_INTERVAL: float = 0.005
+
+
+class VirtualSelector(selectors.BaseSelector):
+    """仮想時刻で待機するセレクタ
+    イベントループが時間待ち（タイマー）だけで待機しようとしたときは、
+    実際には待たずに仮想時刻を進める。
+    スレッド（aiosqliteのDBアクセス等）の処理中は、その完了を実際に待ち、仮想時刻は進めない。
+    """
+    def __init__(self, loop: "VirtualTimeLoop") -> None:
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj):
+        return self._selector.get_key(fileobj)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if len(events) > 0 or (timeout is not None and timeout <= 0):
+            return events
+
+        if timeout is None:
+            # タイマーが無い場合は、実際の入出力を待つ
+            return self._selector.select(None)
+
+        if self._loop.io_pending():
+            # スレッドの完了（call_soon_threadsafe）を待つ。仮想時刻は進めない
+            return self._selector.select(min(timeout, IO_POLL_INTERVAL))
+
+        self._loop.advance(timeout)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """仮想時刻のイベントループ（シミュレーション用）
+    loop.time()は仮想時刻を返し、asyncio.sleep、wait_for、call_later、
+    Ticker、MotorPositionerの動作時間は全て仮想時刻で進む。
+    待機中の時間は実際には経過しないため、1日分の動作を数秒で実行できる。
+    """
+    def __init__(self, start: datetime = None) -> None:
+        """初期化処理
+
+        Args:
+            start (datetime, optional): 仮想時刻0の年月日時刻. Noneの場合は現在時刻
+        """
+        self._virtual_time = 0.0
+        self.start = start if start is not None else datetime.now().replace(microsecond=0)
+        # 作成時に存在していたスレッド（これ以外のスレッドが動作中は、仮想時刻を進めない）
+        self._threads = set(threading.enumerate())
+        super().__init__(VirtualSelector(self))
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        """仮想時刻を進める
+
+        Args:
+            seconds (float): 進める秒数
+        """
+        self._virtual_time += seconds
+
+    def now(self) -> datetime:
+        """仮想時刻の年月日時刻を取得する（datetime.nowの代わりに使う）
+
+        Returns:
+            datetime: start + 仮想時刻
+        """
+        return self.start + timedelta(seconds=self._virtual_time)
+
+    def io_pending(self) -> bool:
+        """作成後に開始したスレッドが動作中かどうか
+        DBアクセスはセッションごとに接続（スレッド）を開閉するため、動作中はDBアクセス中とみなす
+        run_in_executorのワーカースレッドは待機中も終了しないため、使用すると仮想時刻の進みが遅くなる
+
+        Returns:
+            bool: True:動作中のスレッドがある
+        """
+        return any(thread not in self._threads for thread in threading.enumerate())
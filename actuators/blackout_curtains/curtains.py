@@ -1,8 +1,9 @@
 import asyncio
 import inspect
-from time import sleep
+from schemas.actuator_schemas import ActuatorGpioNoSchema
 from actuators.base_actuators.calc_aperture import get_aperture
 from actuators.base_actuators.base_actuator import Actuator
+from actuators.base_actuators.motor_positioner import MotorPositioner
 from config import settings
 from gpiod.line import Value
 
@@ -13,7 +14,13 @@ class BlackoutCurtain(Actuator):
     Base Class:
         Actuator (base_actuator.py)
     """
-    def __init__(self, id: str) -> None:
+    def __init__(self, id: str, gpionos: ActuatorGpioNoSchema = None) -> None:
+        """初期化処理
+
+        Args:
+            id (str): 遮光カーテンID
+            gpionos (ActuatorGpioNoSchema, optional): GPIO番号. Noneの場合はDBから読み込む
+        """
         super().__init__(id)
 
         self.actuator_state = settings.ACTUATOR_STOPPED
@@ -26,7 +33,7 @@ class BlackoutCurtain(Actuator):
             # このため、GPIO番号は2つ必要である
             GPIO_NUMBER_COUNT = 2   # GPIO番号の数
 
-            nos = self.get_gpio_no(id)
+            nos = gpionos if gpionos is not None else self.get_gpio_no(id)
 
             if len(nos.gpionos) != GPIO_NUMBER_COUNT:
                 raise Exception('Invalid GPIO number count.')
@@ -34,6 +41,7 @@ class BlackoutCurtain(Actuator):
             print(f'gpio_no: {nos.gpionos[0].gpio_no}, {nos.gpionos[1].gpio_no}')
             self.forward_motor_gpio = int(nos.gpionos[0].gpio_no)
             self.reverse_motor_gpio = int(nos.gpionos[1].gpio_no)
+            self.positioner = MotorPositioner(id, self.forward_motor_gpio, self.reverse_motor_gpio)
 
         except Exception as e:
             print(f'Error: {e} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
@@ -67,235 +75,106 @@ class BlackoutCurtain(Actuator):
         self.curtain_busy = False
 
         try:
-            self.execute_forward_motor(Value.INACTIVE)
-            self.execute_reverse_motor(Value.INACTIVE)
+            self.newest_aperture = self.positioner.stop()
         except Exception as e:
             print(f'Error: {e} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
+
+        # 停止した時点の開度を書き込む
+        self.flush_aperture()
     
     def forced_stop(self):
         """カーテンが回転していれば、強制的に停止させる
         """
         if self.curtain_busy:
             self.stop_curtain()
-    
-    async def open_curtain(self, unit_time: float, new_aperture: float, aperture: float):
-        """  遮光カーテンを開ける
-            new_aperture > aperture
 
-        Args:
-            unit_time (float): 開度１％増やすための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
+    def shutdown(self):
+        """終了時に、回転していればモータを停止させる
         """
-        try:
-            self.execute_forward_motor(Value.ACTIVE)
-
-            await self.increase_aperture(new_aperture, aperture, unit_time)
-        except OSError as ex:
-            print(f'{ex}')
-        finally:
+        if self.positioner.moving:
             self.stop_curtain()
-    
-    async def increase_aperture(self, new_aperture: float, aperture: float, unit_time: float) -> float:
-        """自動運転での、遮光カーテンオープン
-
-        Args:
-            unit_time (float): 開度１％を減じるための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
 
-        Returns:
-            float: _description_
-        """
-        print(f'before: now:{aperture=}, new:{new_aperture}')
-        while aperture < new_aperture:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_AUTO:
-                # print(f'increase updated:{aperture}')
-                break;
-
-            lux = self.get_environment_values()
-            # 現在の照度から、更新すべき新しい開度を取得する
-            new_aperture = get_aperture(self.id, lux, aperture)
-
-            aperture += 1
-            self.newest_aperture = aperture
-            # print(f'increase:{aperture=}')
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
-
-    async def close_curtain(self, unit_time: float, new_aperture: float, aperture: float):
-        """  遮光カーテンを閉じる
-            new_aperture < aperture
+    async def move_curtain(self, new_aperture: float, state: int, retarget=None):
+        """遮光カーテンを目標開度まで動かす
+        モータは1回だけ起動し、目標開度までの動作時間が経過したら停止する。
+        動作中に稼働状態がstateでなくなった場合は、その時点で停止する。
 
         Args:
-            unit_time (float): 開度１％を減じるための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
+            new_aperture (float): 目標開度
+            state (int): 動作を続ける稼働状態
+            retarget (callable, optional): 現在開度を受け取り、新しい目標開度を返す関数
         """
-        closing_time = (aperture - new_aperture) * unit_time
         try:
-            self.execute_reverse_motor(Value.ACTIVE)
-
-            await self.decrease_aperture( new_aperture, aperture, unit_time)
+            self.newest_aperture = await self.positioner.move_to(
+                new_aperture,
+                keep_running=lambda: self.is_actuator_state(state),
+                retarget=retarget,
+                wake=self.get_wake_subscription(wake_on_environment=True))
         except OSError as ex:
-            print(f'{ex}')
+            print(f'{ex} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
         finally:
             self.stop_curtain()
 
-    async def decrease_aperture(self, new_aperture:float, aperture: float, unit_time: float):
-        """自動運転での、遮光カーテンクローズ
+    def get_new_aperture(self, aperture: float) -> float:
+        """現在の環境計測値（照度）から、更新すべき新しい開度を取得する
 
         Args:
-            aperture (float): 現在開度
-            new_aperture (float): 設定開度
-            full_opening_times (float): 全開時間
-        """
-        print(f'before: now:{aperture=}, new:{new_aperture}')
-        # url = 'http://192.168.10.4:5000/aperture_steps'
-
-        while aperture > new_aperture:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_AUTO:
-                # print(f'decrease updated:{aperture}')
-                break;
-
-            lux = self.get_environment_values()
-            # 現在の照度から、更新すべき新しい開度を取得する
-            new_aperture = get_aperture(self.id, lux, aperture)
-
-            aperture -= 1
-            self.newest_aperture = aperture
-            # response = requests.get(url, params={'step':str(aperture)})
+            aperture (float): 現在の開度
 
-            # print(f'decrease:{aperture=}')
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        Returns:
+            float: 新しい開度
+        """
+        return get_aperture(self.id, self.get_environment_values(), aperture)
 
     async def execute_forced_open(self, aperture: float, full_opening_times: float):
         """強制的に遮光カーテンを開く
 
         Args:
-            aperture (float): _description_
-            full_opening_times (float): _description_
+            aperture (float): 現在開度
+            full_opening_times (float): 全開時間
         """
-        # print(f'forced open before: now:{aperture=}')
         if aperture == 100:
             return
 
-        # 開度１％時間
-        unit_time = full_opening_times / 100
-
-        try:
-            if not self.curtain_busy:
-                self.curtain_busy = True
-                self.execute_forward_motor(Value.ACTIVE)
-
-            await self.forced_open(aperture, unit_time)
-            
-        except OSError as ex:
-            print(f'{ex}')
-        finally:
-            if self.curtain_busy:
-                self.stop_curtain()
-
-    async def forced_open(self, aperture: float, unit_time: float):
-        """開度が100%になるまで、開度を増やし、その値をaperture_statesテーブルへ
-        更新する
-
-        Args:
-            aperture (float): 現在の開度
-            unit_time (float): 開度１％あたりの秒数
-        """
-        while aperture < 100:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_FORCED_OPEN:
-                self.forced_stop()
-                # print(f'forced open stopped:{aperture}')
-                break;
-
-            aperture += 1
-            self.newest_aperture = aperture
+        self.positioner.configure(full_opening_times, aperture)
+        self.curtain_busy = True
 
-            # print(f'forced increase:{aperture=}')
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        await self.move_curtain(100, settings.ACTUATOR_FORCED_OPEN)
 
     async def execute_forced_close(self, aperture: float, full_opening_times: float):
         """強制的に遮光カーテンを閉じる
 
         Args:
-            aperture (float): _description_
-            full_opening_times (float): _description_
+            aperture (float): 現在開度
+            full_opening_times (float): 全開時間
         """
-        # print(f'forced close before: now:{aperture=}')
         if aperture == 0:
             return
 
-        # 開度１％時間
-        unit_time = full_opening_times / 100
-
-        try:
-            if not self.curtain_busy:
-                self.curtain_busy = True
-                self.execute_reverse_motor(Value.ACTIVE)
-            
-            await self.forced_close(aperture, unit_time)
-            
-        except OSError as ex:
-            print(f'{ex}')
-        finally:
-            if self.curtain_busy:
-                self.stop_curtain()
-
-    async def forced_close(self, aperture: float, unit_time: float):
-        """開度が０％になるまで、開度を減じ、その値をaperture_statesテーブルへ
-        更新する
-
-        Args:
-            aperture (float): 現在の開度
-            unit_time (float): 開度１％あたりの秒数
-        """
-        while aperture > 0:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_FORCED_CLOSE:
-                self.forced_stop()
-                # print(f'forced close stopped:{aperture}')
-                break;
-
-            aperture -= 1
-            self.newest_aperture = aperture
+        self.positioner.configure(full_opening_times, aperture)
+        self.curtain_busy = True
 
-            # print(f'forced decrease:{aperture=}')
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        await self.move_curtain(0, settings.ACTUATOR_FORCED_CLOSE)
 
     async def execute(self, aperture: float, new_aperture: float, full_opening_times: float):
         """遮光カーテンの開閉を実行する
+        動作時間: |設定開度 - 現在開度| ＊ 開度１％時間（全開時間 / 100）
+        動作中に新しい環境計測値が届いた場合は、設定開度を計算し直す
 
         Args:
             aperture (float): 現在開度
             new_aperture (float): 設定開度
             full_opening_times (float): 全開時間
         """
-        # 開度１％時間
-        unit_open_time = full_opening_times / 100
+        if aperture == new_aperture:
+            self.curtain_busy = False
+            await asyncio.sleep(1)
+            return
 
+        self.positioner.configure(full_opening_times, aperture)
         self.curtain_busy = True
 
-        if aperture > new_aperture:
-            # カーテンを閉める
-            # 現在開度から指定開度までの差分 Θ = 現在開度-指定開度	
-            # 閉鎖時間: Θ ＊ 開度１％時間
-            await self.close_curtain(unit_open_time, new_aperture, aperture)
-
-        elif aperture < new_aperture:
-            # カーテンを開く
-            await self.open_curtain(unit_open_time, new_aperture, aperture)
-
-        else: # aperture == new_aperture
-            self.curtain_busy = False
-            await asyncio.sleep(1)
+        await self.move_curtain(new_aperture, settings.ACTUATOR_AUTO, retarget=self.get_new_aperture)
 
     async def task(self, *args):
         """遮光カーテン実行
@@ -312,7 +191,7 @@ class BlackoutCurtain(Actuator):
         print(f'start aperture:{aperture=}')
         while True:
             print(f"blackout curtains task:{self.curtain_busy=} ")
-            # environment_valuesテーブルから、現在の環境計測値（照度）を取得する
+            # 環境計測値配信バスから、現在の環境計測値（照度）を取得する
             try:
                 # mode (int): 1:自動運転中, 0:手動運転中, 9:停止中
                 # ACTUATOR_AUTO: int = 1
@@ -353,4 +232,5 @@ class BlackoutCurtain(Actuator):
             except Exception as err:
                 print(f"Unexpected {err=}, {type(err)=}")
 
-            sleep(1)
+            # 次の計測周期まで待機する（新しい環境計測値が届いたら起床する）
+            await self.wait_next_tick(wake_on_environment=True)
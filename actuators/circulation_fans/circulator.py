@@ -1,28 +1,25 @@
 import asyncio
 import inspect
-from time import sleep
-from models.actuator_models import EnvironmentValues as ev
-from database.db_access import get_session
+from schemas.actuator_schemas import ActuatorGpioNoSchema
 from actuators.base_actuators.base_actuator import Actuator
-from actuators.base_actuators.calc_aperture import \
-    get_degrees_apertures, \
-    on_off_condition_judgement
+from actuators.base_actuators.calc_aperture import control_curve_cache
 from config import settings
 from gpiod.line import Value
 
 class CirculatorFan(Actuator):
-    def __init__(self, id) -> None:
+    def __init__(self, id, gpionos: ActuatorGpioNoSchema = None) -> None:
         """初期化処理
 
         Args:
             id (_str_): 対象制御装置ID
+            gpionos (ActuatorGpioNoSchema, optional): GPIO番号. Noneの場合はDBから読み込む
         """
         super().__init__(id)
         self.actuator_state=self.PAUSED
 
         try:
             # GPIO番号17を使用
-            nos = self.get_gpio_no(id)
+            nos = gpionos if gpionos is not None else self.get_gpio_no(id)
             print(f'gpio_no: {nos.gpionos[0].gpio_no}')
             if len(nos.gpionos) != 1:
                 raise Exception('Invalid GPIO number count.')
@@ -66,17 +63,13 @@ class CirculatorFan(Actuator):
         except OSError as ex:
             print(ex)
 
-    def get_environment_values(self) -> float:
-        """environment_valuesテーブルから、
-        現在の環境計測値（温度）を取得する
-
-        Returns:
-            float: 現在計測温度
+    def shutdown(self):
+        """終了時に循環扇を停止させる
         """
-        with get_session() as db:
-            environments = db.query(ev).first()
-
-        return environments.temperature
+        try:
+            self.rotation_state(Value.INACTIVE)
+        except OSError as ex:
+            print(ex)
 
     def get_toggle_mode(self, now_temp: float) -> bool:
         """循環扇オンオフ状態を取得する
@@ -87,16 +80,10 @@ class CirculatorFan(Actuator):
         Returns:
             bool: True:オン, False:オフ
         """
-        stg = []
-        aptr = []
-        for _, stages, apertures in get_degrees_apertures(self.id):
-            stg = [x for x in stages if (x is not None) and (x != '')]
-            aptr = [x for x in apertures if (x is not None) and (x != '')]
-
+        # device_control_tableの設定はコンパイル済みのものを使用する
         # stg:[28.0, 30.0]
         # aptr:[1.0, 1.0]
-        return on_off_condition_judgement(now_temp, stg, 0, aptr)
-        # return not condition_judgement(temp, stg, 0, aptr, 1)
+        return control_curve_cache.get(self.id).on_off(now_temp)
 
     async def task(self,  *args):
         """循環扇の制御を実行する
@@ -105,8 +92,8 @@ class CirculatorFan(Actuator):
 
         while True:
             try:
-                # environment_valuesテーブルから、現在の環境計測値（温度）を取得する
-                temp = self.get_environment_values()
+                # 環境計測値配信バスから、現在の環境計測値（温度）を取得する
+                temp = self.get_environment_temperature()
                 print(f'circulator task / now temperature:{temp}')
 
                 self.actuator_state = await self.get_actuator_state()
@@ -137,4 +124,5 @@ class CirculatorFan(Actuator):
                 print(f'Unexpected Error: {err=} , {type(err)=} \
                     at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
 
-            sleep(1)
+            # 次の計測周期まで待機する（新しい環境計測値が届いたら起床する）
+            await self.wait_next_tick(wake_on_environment=True)
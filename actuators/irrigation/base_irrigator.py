@@ -3,14 +3,16 @@ import inspect
 import sqlalchemy
 import gpiod
 from gpiod.line import Direction, Value
-from time import sleep
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 from datetime import datetime
 from sqlite3 import IntegrityError, OperationalError, ProgrammingError
 from actuators.irrigation.irrigation_data import IrrigationLine
-from schemas.actuator_schemas import IrrigationScheduleSchema, IrrigationTimeSchema
+from actuators.irrigation.irrigation_scheduler import irrigation_scheduler
+from schemas.actuator_schemas import ActuatorGpioNoSchema, IrrigationScheduleSchema, IrrigationTimeSchema
 from actuators.base_actuators.base_actuator import Actuator
-from database.db_access import MANUAL_IRRIGATION_TIME, get_session
+from actuators.base_actuators.notifier import Subscription
+from actuators.base_actuators.metrics import db_query_duration
+from database.db_access import MANUAL_IRRIGATION_TIME, get_session, get_async_session
 from models.actuator_models import IrrigationSchedule
 from config import settings
 
@@ -20,11 +22,12 @@ class Irrigator(Actuator):
     Args:
         Actuator (_type_): _description_
     """
-    def __init__(self, id) -> None:
+    def __init__(self, id, gpionos: ActuatorGpioNoSchema = None) -> None:
         """初期化処理
 
         Args:
             id (_str_): 対象制御装置ID
+            gpionos (ActuatorGpioNoSchema, optional): GPIO番号. 潅水ライン（継承先）で使用する
         """
         super().__init__(id)
 
@@ -65,6 +68,30 @@ class Irrigator(Actuator):
         except OSError as ex:
             raise ex
 
+    def shutdown(self):
+        """終了時に、潅水中であれば潅水ラインを閉じる
+        """
+        if self.current_line is not None and self.current_line.busy:
+            self.turn_off()
+
+    def get_wake_subscription(self, wake_on_environment: bool = False) -> Subscription:
+        """起床通知の購読オブジェクトを取得する
+        稼働状態の変更に加えて、IrrigationSchedulerが潅水時刻の到来を配信したときにも起床する
+        """
+        if self.wake_subscription is None:
+            super().get_wake_subscription(wake_on_environment)
+            irrigation_scheduler.attach(self.id, self.wake_subscription)
+
+        return self.wake_subscription
+
+    def close(self):
+        """潅水スケジュールの配信通知も解除する
+        """
+        if self.wake_subscription is not None:
+            irrigation_scheduler.unsubscribe(self.id, self.wake_subscription)
+
+        super().close()
+
     def get_irrigation_schedule(self, actuator_id: str, current_time:str) -> IrrigationScheduleSchema:
         """潅水スケジュールを取得する
         指定した潅水ライン番号をもつ潅水スケジュールを
@@ -77,7 +104,7 @@ class Irrigator(Actuator):
             iss: irrigation_scheduleリスト
         """
         try:
-           with get_session() as db:
+           with db_query_duration.time('get_irrigation_schedule'), get_session() as db:
                 value = db.query(IrrigationSchedule).filter(
                             and_( 
                                 IrrigationSchedule.actuator_id == actuator_id,
@@ -118,17 +145,54 @@ class Irrigator(Actuator):
             print(f'{err}')
             return None
 
+    async def get_irrigation_schedule_async(self, actuator_id: str, current_time: str) -> IrrigationTimeSchema:
+        """潅水スケジュールを取得する（非同期版）
+        DBアクセス中もイベントループを止めない
+
+        Args:
+            actuator_id (str): 制御機器ID
+            current_time (str): 検査対象時刻(hh:mm)
+
+        Returns:
+            IrrigationTimeSchema: 潅水スケジュール, 該当しない場合はNone
+        """
+        try:
+            with db_query_duration.time('get_irrigation_schedule'):
+                async with get_async_session() as db:
+                    value = await db.scalar(
+                        select(IrrigationSchedule).where(and_(
+                            IrrigationSchedule.actuator_id == actuator_id,
+                            IrrigationSchedule.start_time == current_time)))
+
+            if value is None:
+                return None
+
+            return IrrigationTimeSchema(
+                actuator_id = value.actuator_id,            # 制御機器ID
+                permission = value.permission,              # 潅水許可 0:不許可 1:許可
+                line_no = value.line_no,                    # 潅水ライン
+                start_time = value.start_time,              # 潅水時刻
+                irrigation_time = value.irrigation_time,    # 潅水時間
+                builder_cd = value.builder_cd,              # 作成者コード
+                created = value.created,                    # 作成年月日時刻
+                updator_cd = value.updator_cd,              # 更新者コード
+                modified =  value.modified                  # 更新年月日時刻
+                )
+
+        except Exception as err:
+            print(f'{err}')
+            return None
+
     async def do_irrigation(self):
         """潅水時刻になったら、その時間に設定された潅水時間、潅水ポンプを作動させる
+        潅水時刻の判定はIrrigationSchedulerが行い、到来したスケジュールだけが配信される
         """
-        # 現在の時刻（hh:mm:dd）を文字列で取得
         try:
-            current_time = datetime.now().strftime('%H:%M')
-            # irrigation_scheduleテーブルから現在の時刻と一致するstart_timeをもつデータを取得する
-            target = self.get_irrigation_schedule(self.id, current_time)
+            # IrrigationSchedulerから配信された潅水スケジュールを取り出す（DBは読まない）
+            target = irrigation_scheduler.pop_due(self.id)
             # もしデータが取得出来たら、潅水を指定時間、実行する
 
-            if target is not None and not self.current_line.is_done(str(target.start_time)) and target.permission:
+            if target is not None and target.permission:
                 self.current_line.done_time = str(target.start_time)
                 self.turn_on()
                 await asyncio.sleep(target.irrigation_time)
@@ -153,7 +217,10 @@ class Irrigator(Actuator):
             if self.current_line.busy:
                 self.turn_off()
 
-            target = self.get_irrigation_schedule(self.id, MANUAL_IRRIGATION_TIME)
+            if irrigation_scheduler.loaded:
+                target = irrigation_scheduler.get_manual_schedule(self.id)
+            else:
+                target = await self.get_irrigation_schedule_async(self.id, MANUAL_IRRIGATION_TIME)
 
             if target is not None:
                 self.current_line.done_time = MANUAL_IRRIGATION_TIME
@@ -206,4 +273,5 @@ class Irrigator(Actuator):
             except Exception as e:
                 print(f"潅水処理で予期しないエラーが発生しました: {e}")
 
-            sleep(1)
+            # 次の計測周期まで待機する
+            await self.wait_next_tick()
@@ -0,0 +1,283 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from actuators.base_actuators.metrics import db_query_duration
+from actuators.base_actuators.notifier import Notifier, Subscription
+from database.db_access import MANUAL_IRRIGATION_TIME, get_async_session
+from models.actuator_models import IrrigationSchedule
+from schemas.actuator_schemas import IrrigationTimeSchema
+from config import settings
+
+
+def to_irrigation_time_schema(value) -> IrrigationTimeSchema:
+    """irrigation_scheduleのレコードをIrrigationTimeSchemaへ変換する
+    """
+    return IrrigationTimeSchema(
+        actuator_id = value.actuator_id,            # 制御機器ID
+        permission = value.permission,              # 潅水許可 0:不許可 1:許可
+        line_no = value.line_no,                    # 潅水ライン
+        start_time = value.start_time,              # 潅水時刻
+        irrigation_time = value.irrigation_time,    # 潅水時間
+        builder_cd = value.builder_cd,              # 作成者コード
+        created = value.created,                    # 作成年月日時刻
+        updator_cd = value.updator_cd,              # 更新者コード
+        modified =  value.modified                  # 更新年月日時刻
+        )
+
+
+class IrrigationScheduler:
+    """全潅水ラインの潅水スケジュールを、次回潅水時刻の最小ヒープで管理する
+    起動時にirrigation_scheduleテーブルを一度だけ読み込み、以降は
+    IrrigationScheduleAdminがスケジュールを更新したときにupsert()で差分を反映する。
+    更新された時刻の古いヒープ要素は削除せず、取り出したときに読み飛ばす（遅延削除）。
+    run()は次回潅水時刻まで待機し、到来したスケジュールを各潅水装置へ配信する。
+    ループの遅れで時刻を過ぎていても、settings.IRRIGATION_GRACE_SECONDS以内であれば潅水する。
+    配信したスケジュールも、潅水装置が猶予時間内に取り出さなければ破棄する
+    （手動運転中などに到来した潅水時刻を、自動運転に戻ったときにまとめて潅水しない）。
+    """
+    def __init__(self, clock=datetime.now) -> None:
+        """初期化処理
+
+        Args:
+            clock (callable, optional): 現在時刻を返す関数
+        """
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._schedules: dict[tuple, IrrigationTimeSchema] = {}  # {(制御機器ID, 潅水時刻): スケジュール}
+        self._versions: dict[tuple, int] = {}   # {(制御機器ID, 潅水時刻): 更新回数}
+        self._heap: list[tuple] = []            # [(潅水日時, 連番, 制御機器ID, 潅水時刻, 更新回数), ...]
+        self._sequence = itertools.count()
+        self._due: dict[str, deque] = {}        # {制御機器ID: [(潅水日時, 到来したスケジュール), ...]}
+        self._notifiers: dict[str, Notifier] = {}
+        self._changed = Notifier()              # スケジュール更新の通知（run()を起こす）
+        self.loaded = False
+
+    @staticmethod
+    def get_next_fire_time(start_time: str, now: datetime, grace: float = 0) -> datetime:
+        """潅水時刻(hh:mm)の次回潅水日時を求める
+
+        Args:
+            start_time (str): 潅水時刻 ex.'05:00'
+            now (datetime): 現在日時
+            grace (float, optional): 過ぎていても当日とみなす秒数
+
+        Returns:
+            datetime: 次回潅水日時, 潅水時刻の形式が正しくない場合はNone
+        """
+        try:
+            hour, minute = [int(val) for val in start_time.split(':')]
+            fire_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        except ValueError:
+            # 手動潅水専用設定時刻('99:99')など
+            return None
+
+        if (now - fire_at).total_seconds() > grace:
+            fire_at += timedelta(days=1)
+
+        return fire_at
+
+    async def load(self):
+        """irrigation_scheduleテーブルから全ての潅水スケジュールを読み込む
+        """
+        with db_query_duration.time('get_irrigation_schedule'):
+            async with get_async_session() as db:
+                rows = (await db.scalars(select(IrrigationSchedule))).all()
+
+        self.load_schedules([to_irrigation_time_schema(row) for row in rows])
+
+    def load_schedules(self, schedules: list):
+        """潅水スケジュールを全て置き換え、ヒープを作り直す
+        配信済みで潅水装置が取り出していないスケジュールも破棄する
+
+        Args:
+            schedules (list): [IrrigationTimeSchema, ...]
+        """
+        now = self.clock()
+        with self._lock:
+            self._schedules.clear()
+            self._heap.clear()
+            self._due.clear()
+            for schedule in schedules:
+                self._put(schedule, now)
+            self.loaded = True
+
+        self._changed.notify_all()
+
+    def upsert(self, schedule: IrrigationTimeSchema):
+        """潅水スケジュールを追加・更新する
+        古いヒープ要素は、取り出したときに読み飛ばす
+
+        Args:
+            schedule (IrrigationTimeSchema): 潅水スケジュール
+        """
+        self.upsert_many([schedule])
+
+    def upsert_many(self, schedules: list):
+        """複数の潅水スケジュールをまとめて追加・更新する
+        run()への通知は1回だけ行う
+
+        Args:
+            schedules (list): [IrrigationTimeSchema, ...]
+        """
+        now = self.clock()
+        with self._lock:
+            for schedule in schedules:
+                self._put(schedule, now)
+
+        self._changed.notify_all()
+
+    def _put(self, schedule: IrrigationTimeSchema, now: datetime):
+        key = (schedule.actuator_id, str(schedule.start_time))
+        version = self._versions.get(key, 0) + 1
+        self._versions[key] = version
+        self._schedules[key] = schedule
+
+        # 配信済みで取り出されていない同じ潅水時刻は、更新後のスケジュールに置き換える
+        # 不許可・潅水時間0に更新された場合は破棄する
+        due = self._due.get(key[0])
+        if due:
+            self._due[key[0]] = deque(
+                (fire_at, schedule if str(queued.start_time) == key[1] else queued)
+                for fire_at, queued in due
+                if str(queued.start_time) != key[1] or (schedule.permission and schedule.irrigation_time > 0))
+
+        fire_at = self.get_next_fire_time(key[1], now, settings.IRRIGATION_GRACE_SECONDS)
+        if fire_at is not None:
+            heapq.heappush(self._heap, (fire_at, next(self._sequence), key[0], key[1], version))
+
+    def get_schedule(self, actuator_id: str, start_time: str) -> IrrigationTimeSchema:
+        """潅水スケジュールを取得する（DBは読まない）
+
+        Args:
+            actuator_id (str): 制御機器ID
+            start_time (str): 潅水時刻(hh:mm) または MANUAL_IRRIGATION_TIME
+
+        Returns:
+            IrrigationTimeSchema: 潅水スケジュール, 登録されていない場合はNone
+        """
+        with self._lock:
+            return self._schedules.get((actuator_id, start_time))
+
+    def get_manual_schedule(self, actuator_id: str) -> IrrigationTimeSchema:
+        """手動潅水のスケジュールを取得する
+        """
+        return self.get_schedule(actuator_id, MANUAL_IRRIGATION_TIME)
+
+    def next_fire_time(self) -> datetime:
+        """ヒープ先頭（最も早い）の潅水日時を取得する
+
+        Returns:
+            datetime: 次回潅水日時, スケジュールが無い場合はNone
+        """
+        with self._lock:
+            while len(self._heap) > 0:
+                fire_at, _, actuator_id, start_time, version = self._heap[0]
+                if self._versions.get((actuator_id, start_time)) == version:
+                    return fire_at
+                heapq.heappop(self._heap)
+
+        return None
+
+    def dispatch(self) -> list:
+        """潅水時刻が到来したスケジュールを、各潅水装置へ配信する
+        配信したスケジュールは翌日の同時刻で登録し直す
+
+        Returns:
+            list: 配信したスケジュール
+        """
+        now = self.clock()
+        grace = settings.IRRIGATION_GRACE_SECONDS
+        delivered = []
+
+        with self._lock:
+            while len(self._heap) > 0 and self._heap[0][0] <= now:
+                fire_at, _, actuator_id, start_time, version = heapq.heappop(self._heap)
+                key = (actuator_id, start_time)
+                if self._versions.get(key) != version:
+                    # 更新済みの古い要素
+                    continue
+
+                schedule = self._schedules[key]
+                late = (now - fire_at).total_seconds()
+                if late > grace:
+                    print(f'{actuator_id}: irrigation {start_time} missed ({late:.0f}s late)')
+                elif schedule.permission and schedule.irrigation_time > 0:
+                    due = self._due.setdefault(actuator_id, deque())
+                    # 取り出されないまま猶予時間を過ぎたものは、ここでも破棄する（潅水装置が無い制御機器IDなど）
+                    self._drop_expired(due, now)
+                    due.append((fire_at, schedule))
+                    delivered.append(schedule)
+
+                heapq.heappush(self._heap, (
+                    fire_at + timedelta(days=1), next(self._sequence), actuator_id, start_time, version))
+
+        for actuator_id in {schedule.actuator_id for schedule in delivered}:
+            self._get_notifier(actuator_id).notify_all()
+
+        return delivered
+
+    def pop_due(self, actuator_id: str) -> IrrigationTimeSchema:
+        """潅水装置へ配信されたスケジュールを1件取り出す
+        潅水時刻からsettings.IRRIGATION_GRACE_SECONDSを過ぎたものは破棄する
+
+        Args:
+            actuator_id (str): 制御機器ID
+
+        Returns:
+            IrrigationTimeSchema: 潅水スケジュール, 無い場合はNone
+        """
+        now = self.clock()
+        with self._lock:
+            due = self._due.get(actuator_id)
+            if not due:
+                return None
+
+            self._drop_expired(due, now)
+            return due.popleft()[1] if due else None
+
+    def _drop_expired(self, due: deque, now: datetime):
+        grace = settings.IRRIGATION_GRACE_SECONDS
+        while due and (now - due[0][0]).total_seconds() > grace:
+            fire_at, schedule = due.popleft()
+            print(f'{schedule.actuator_id}: irrigation {schedule.start_time} expired before it was taken')
+
+    def _get_notifier(self, actuator_id: str) -> Notifier:
+        with self._lock:
+            return self._notifiers.setdefault(actuator_id, Notifier())
+
+    def attach(self, actuator_id: str, subscription: Subscription) -> Subscription:
+        """潅水スケジュールの配信通知を、既存の購読オブジェクトで受け取る
+        """
+        return self._get_notifier(actuator_id).attach(subscription)
+
+    def unsubscribe(self, actuator_id: str, subscription: Subscription):
+        """購読を解除する
+        """
+        self._get_notifier(actuator_id).unsubscribe(subscription)
+
+    async def run(self):
+        """次回潅水時刻まで待機し、到来したスケジュールを配信する
+        スケジュールが更新された場合は、待機をやり直す
+        """
+        if not self.loaded:
+            await self.load()
+
+        wake = self._changed.subscribe()
+        try:
+            while True:
+                self.dispatch()
+
+                fire_at = self.next_fire_time()
+                timeout = None
+                if fire_at is not None:
+                    timeout = max((fire_at - self.clock()).total_seconds(), 0)
+
+                await wake.wait(timeout)
+        finally:
+            self._changed.unsubscribe(wake)
+
+
+irrigation_scheduler = IrrigationScheduler()
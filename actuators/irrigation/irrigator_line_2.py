@@ -1,4 +1,5 @@
 import inspect
+from schemas.actuator_schemas import ActuatorGpioNoSchema
 from actuators.irrigation.irrigation_data import IrrigationLine
 from actuators.irrigation.base_irrigator import Irrigator
 
@@ -8,15 +9,16 @@ class IrrigatorLine2(Irrigator):
     Args:
         Irrigator (Irrigator): 潅水ラインベースクラス
     """
-    def __init__(self, id) -> None:
+    def __init__(self, id, gpionos: ActuatorGpioNoSchema = None) -> None:
         """初期化処理
 
         Args:
             id (str): 潅水ラインID
+            gpionos (ActuatorGpioNoSchema, optional): GPIO番号. Noneの場合はDBから読み込む
         """        
         try:
             # GPIO番号17を使用
-            nos = self.get_gpio_no(id)
+            nos = gpionos if gpionos is not None else self.get_gpio_no(id)
             print(f'gpio_no: {nos.gpionos[0].gpio_no}')
             if len(nos.gpionos) != 1:
                 raise Exception('Invalid GPIO number count.')
@@ -1,8 +1,8 @@
 import asyncio
 import inspect
-from time import sleep
 from actuators.base_actuators.calc_aperture import get_aperture
 from actuators.base_actuators.base_actuator import Actuator
+from actuators.base_actuators.motor_positioner import MotorPositioner
 from config import settings
 from gpiod.line import Value
 
@@ -28,6 +28,7 @@ class BaseSideWindow(Actuator):
         self.curtain_busy = False   # 光の強弱にかかわらず起動直後カーテン制御する
         self.forward_motor_gpio: int = motor_1_gpio
         self.reverse_motor_gpio: int = motor_2_gpio
+        self.positioner = MotorPositioner(id, motor_1_gpio, motor_2_gpio)
 
     def execute_forward_motor(self, action: Value):
         """
@@ -61,224 +62,107 @@ class BaseSideWindow(Actuator):
         print('stop SideWindow rotation...')
         self.curtain_busy = False
 
-        self.execute_forward_motor(Value.INACTIVE)
-        self.execute_reverse_motor(Value.INACTIVE)
- 
+        try:
+            self.newest_aperture = self.positioner.stop()
+        except Exception as e:
+            print(f'Error: {e} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
+
+        # 停止した時点の開度を書き込む
+        self.flush_aperture()
+    
     def forced_stop(self):
         """カーテンが回転していれば、強制的に停止させる
         """
         if self.curtain_busy:
             self.stop_curtain()
-    
-    async def open_curtain(self, unit_time: float, new_aperture: float, aperture: float):
-        """  側窓を開ける
-            new_aperture > aperture
 
-        Args:
-            unit_time (float): 開度１％増やすための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
+    def shutdown(self):
+        """終了時に、回転していればモータを停止させる
         """
-        try:
-            # self.init_gpio()
-            self.execute_forward_motor(Value.ACTIVE)
-
-            await self.increase_aperture(new_aperture, aperture, unit_time)
-        except OSError as ex:
-            print(f'{ex} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
-        finally:
+        if self.positioner.moving:
             self.stop_curtain()
-    
-    async def increase_aperture(self, new_aperture: float, aperture: float, unit_time: float) -> float:
-        """自動運転での、側窓オープン
-
-        Args:
-            unit_time (float): 開度１％を減じるための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
 
-        Returns:
-            float: _description_
-        """
-        print(f'before: now:{aperture=}, new:{new_aperture}')
-        while aperture < new_aperture:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_AUTO:
-                break;
-
-            # lux = self.get_environment_values()
-            temperature = self.get_environment_temperature()
-            # 現在の温度から、更新すべき新しい開度を取得する
-            new_aperture = get_aperture(self.id, temperature, aperture)
-
-            aperture += 1
-            self.newest_aperture = aperture
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
-
-    async def close_curtain(self, unit_time: float, new_aperture: float, aperture: float):
-        """  側窓を閉じる
-            new_aperture < aperture
+    async def move_curtain(self, new_aperture: float, state: int, retarget=None):
+        """側窓を目標開度まで動かす
+        モータは1回だけ起動し、目標開度までの動作時間が経過したら停止する。
+        動作中に稼働状態がstateでなくなった場合は、その時点で停止する。
 
         Args:
-            unit_time (float): 開度１％を減じるための単位時間
-            new_aperture (float): 最終的に設定する開度
-            aperture (float): 現在の開度
+            new_aperture (float): 目標開度
+            state (int): 動作を続ける稼働状態
+            retarget (callable, optional): 現在開度を受け取り、新しい目標開度を返す関数
         """
         try:
-            self.execute_reverse_motor(Value.ACTIVE)
-
-            await self.decrease_aperture( new_aperture, aperture, unit_time)
+            self.newest_aperture = await self.positioner.move_to(
+                new_aperture,
+                keep_running=lambda: self.is_actuator_state(state),
+                retarget=retarget,
+                wake=self.get_wake_subscription(wake_on_environment=True))
         except OSError as ex:
             print(f'{ex} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
         finally:
             self.stop_curtain()
 
-    async def decrease_aperture(self, new_aperture:float, aperture: float, unit_time: float):
-        """自動運転での、側窓クローズ
+    def get_new_aperture(self, aperture: float) -> float:
+        """現在の環境計測値（温度）から、更新すべき新しい開度を取得する
 
         Args:
-            aperture (float): 現在開度
-            new_aperture (float): 設定開度
-            full_opening_times (float): 全開時間
-        """
-        print(f'before: now:{aperture=}, new:{new_aperture}')
-
-        while aperture > new_aperture:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_AUTO:
-                break;
-
-            # lux = self.get_environment_values()
-            temperature = self.get_environment_temperature()
-
-            # 現在の温度から、更新すべき新しい開度を取得する
-            new_aperture = get_aperture(self.id, temperature, aperture)
-
-            aperture -= 1
-            self.newest_aperture = aperture
+            aperture (float): 現在の開度
 
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        Returns:
+            float: 新しい開度
+        """
+        return get_aperture(self.id, self.get_environment_temperature(), aperture)
 
     async def execute_forced_open(self, aperture: float, full_opening_times: float):
         """強制的に側窓を開く
 
         Args:
-            aperture (float): _description_
-            full_opening_times (float): _description_
+            aperture (float): 現在開度
+            full_opening_times (float): 全開時間
         """
         if aperture == 100:
             return
 
-        # 開度１％時間
-        unit_time = full_opening_times / 100
-
-        try:
-            if not self.curtain_busy:
-                self.curtain_busy = True
-                self.execute_forward_motor(Value.ACTIVE)
-
-            await self.forced_open(aperture, unit_time)
-            
-        except OSError as ex:
-            print(f'{ex} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
-        finally:
-            if self.curtain_busy:
-                self.stop_curtain()
-
-    async def forced_open(self, aperture: float, unit_time: float):
-        """開度が100%になるまで、開度を増やし、その値をaperture_statesテーブルへ
-        更新する
-
-        Args:
-            aperture (float): 現在の開度
-            unit_time (float): 開度１％あたりの秒数
-        """
-        while aperture < 100:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_FORCED_OPEN:
-                self.forced_stop()
-                break;
-
-            aperture += 1
-            self.newest_aperture = aperture
+        self.positioner.configure(full_opening_times, aperture)
+        self.curtain_busy = True
 
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        await self.move_curtain(100, settings.ACTUATOR_FORCED_OPEN)
 
     async def execute_forced_close(self, aperture: float, full_opening_times: float):
         """強制的に側窓を閉じる
 
         Args:
-            aperture (float): _description_
-            full_opening_times (float): _description_
+            aperture (float): 現在開度
+            full_opening_times (float): 全開時間
         """
         if aperture == 0:
             return
 
-        # 開度１％時間
-        unit_time = full_opening_times / 100
-
-        try:
-            if not self.curtain_busy:
-                self.curtain_busy = True
-                self.execute_reverse_motor(Value.ACTIVE)
-
-            await self.forced_close(aperture, unit_time)
-            
-        except OSError as ex:
-            print(f'{ex} at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}')
-        finally:
-            if self.curtain_busy:
-                self.stop_curtain()
-
-    async def forced_close(self, aperture: float, unit_time: float):
-        """開度が０％になるまで、開度を減じ、その値をaperture_statesテーブルへ
-        更新する
-
-        Args:
-            aperture (float): 現在の開度
-            unit_time (float): 開度１％あたりの秒数
-        """
-        while aperture > 0:
-            self.actuator_state = await self.get_actuator_state()
-            if self.actuator_state != settings.ACTUATOR_FORCED_CLOSE:
-                self.forced_stop()
-                break;
-
-            aperture -= 1
-            self.newest_aperture = aperture
+        self.positioner.configure(full_opening_times, aperture)
+        self.curtain_busy = True
 
-            self.update_aperture(aperture)
-            await asyncio.sleep(int(unit_time))
+        await self.move_curtain(0, settings.ACTUATOR_FORCED_CLOSE)
 
     async def execute(self, aperture: float, new_aperture: float, full_opening_times: float):
         """側窓の開閉を実行する
+        動作時間: |設定開度 - 現在開度| ＊ 開度１％時間（全開時間 / 100）
+        動作中に新しい環境計測値が届いた場合は、設定開度を計算し直す
 
         Args:
             aperture (float): 現在開度
             new_aperture (float): 設定開度
             full_opening_times (float): 全開時間
         """
-        # 開度１％時間
-        unit_open_time = full_opening_times / 100
+        if aperture == new_aperture:
+            self.curtain_busy = False
+            await asyncio.sleep(1)
+            return
 
+        self.positioner.configure(full_opening_times, aperture)
         self.curtain_busy = True
 
-        if aperture > new_aperture:
-            # カーテンを閉める
-            # 現在開度から指定開度までの差分 Θ = 現在開度-指定開度	
-            # 閉鎖時間: Θ ＊ 開度１％時間
-            await self.close_curtain(unit_open_time, new_aperture, aperture)
-
-        elif aperture < new_aperture:
-            # カーテンを開く
-            await self.open_curtain(unit_open_time, new_aperture, aperture)
-
-        else: # aperture == new_aperture
-            self.curtain_busy = False
-            await asyncio.sleep(1)
+        await self.move_curtain(new_aperture, settings.ACTUATOR_AUTO, retarget=self.get_new_aperture)
 
     async def task(self, *args):
         """側窓実行
@@ -298,7 +182,7 @@ class BaseSideWindow(Actuator):
 
         while True:
             print(f"side window task:{self.curtain_busy=} ")
-            # environment_valuesテーブルから、現在の環境計測値（照度）を取得する
+            # 環境計測値配信バスから、現在の環境計測値（温度）を取得する
             try:
                 # mode (int): 1:自動運転中, 0:手動運転中, 9:停止中
                 # ACTUATOR_AUTO: int = 1
@@ -338,4 +222,5 @@ class BaseSideWindow(Actuator):
                 print(f"Unexpected {err=}, {type(err)=} \
                     at {inspect.currentframe().f_code.co_name} in {inspect.getfile(inspect.currentframe())}")
 
-            # sleep(1)
+            # 次の計測周期まで待機する（新しい環境計測値が届いたら起床する）
+            await self.wait_next_tick(wake_on_environment=True)
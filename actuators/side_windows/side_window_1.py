@@ -1,4 +1,5 @@
 import inspect
+from schemas.actuator_schemas import ActuatorGpioNoSchema
 from actuators.side_windows.base_side_window import BaseSideWindow
 from database.db_access import get_session
 
@@ -8,11 +9,12 @@ class SideWindow1(BaseSideWindow):
     Args:
         BaseSideWindow (base_class): 側窓制御基本クラス
     """
-    def __init__(self, id: str) -> None:
+    def __init__(self, id: str, gpionos: ActuatorGpioNoSchema = None) -> None:
         """初期化処理
 
         Args:
             id (str): 側窓ID
+            gpionos (ActuatorGpioNoSchema, optional): GPIO番号. Noneの場合はDBから読み込む
         """
         # 側窓はモータードライバを使って制御している
         # モータードライバは2つのGPIOを使って制御する
@@ -21,7 +23,7 @@ class SideWindow1(BaseSideWindow):
         
         try:
             # GPIO番号14, 16を使用
-            nos = self.get_gpio_no(id)
+            nos = gpionos if gpionos is not None else self.get_gpio_no(id)
             
             if len(nos.gpionos) != GPIO_NUMBER_COUNT:
                 raise Exception('Invalid GPIO number count.')
@@ -1,28 +1,66 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from services.irrigation_schedule_admin import IrrigationScheduleAdmin
-from database.db_access import get_db
-from services.actuator_services import EnvironmentValuesService
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.irrigation_schedule_admin import AsyncIrrigationScheduleAdmin
+from database.db_access import get_async_db
+from services.actuator_services import AsyncEnvironmentValuesService
+from services.environment_rollups import AsyncEnvironmentRollupService
 from config import settings
+from actuators.base_actuators.actuator_supervisor import actuator_supervisor
+from actuators.base_actuators.change_versions import change_versions
+from actuators.base_actuators.metrics import metrics_registry
+from actuators.base_actuators.state_stream import StateStreamClient, state_stream
 from schemas.actuator_schemas import \
     ActuatorGpioNoSchema, \
+    ActuatorsHealthSchema, \
     ActuatorModeSchema, \
     ActuatorsStateSchema, \
+    DeviceBatchResultSchema, \
     DeviceControlSchema, \
     DeviceSchemas, \
+    EnvironmentRollupsSchema, \
     IrrigationScheduleSchema, \
+    StateDeltaSchema, \
     StateSchema
 
 router = APIRouter()
 
+def is_not_modified(request: Request, response: Response, etag: str) -> bool:
+    """If-None-MatchとETagを比較し、レスポンスにETagを設定する
+
+    Args:
+        request (Request): リクエスト
+        response (Response): レスポンス
+        etag (str): 現在のETag
+
+    Returns:
+        bool: True:変更なし（304を返す）
+    """
+    response.headers['ETag'] = etag
+    # ブラウザにも、毎回ETagで問い合わせさせる
+    response.headers['Cache-Control'] = 'no-cache'
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is None:
+        return False
+
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+def not_modified(etag: str) -> Response:
+    """304 Not Modifiedのレスポンスを作成する（DBの読み込みとシリアライズはおこなわない）
+    """
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
 @router.post("/env_values/", response_model=ActuatorsStateSchema)
-def get_actuators_state(values: DeviceSchemas, db: Session = Depends(get_db)):
+async def get_actuators_state(values: DeviceSchemas, db: AsyncSession = Depends(get_async_db)):
     """現在稼働中の制御機器の稼働状態を取得する
     取得情報は、この問い合わせ先（flskr.views.py/get_controllers_monitor()へ返す
 
     Args:
         values (DeviceSchemas): _description_
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         _json_: 制御機器の稼働状態を取得する
@@ -33,22 +71,100 @@ def get_actuators_state(values: DeviceSchemas, db: Session = Depends(get_db)):
     # if values is None:
     #     raise HTTPException(status_code=404, detail="values is None")
 
-    ev = EnvironmentValuesService(db)
+    ev = AsyncEnvironmentValuesService(db)
 
-    ev.create_env_values(values)
+    await ev.create_env_values(values)
     
-    states = ev.get_actuators_info()
+    states = await ev.get_actuators_info()
     # states = ev.get_actuators_states()
 
     return states
 
+# DeviceSchemasのリストを一度に検証する
+device_list_adapter = TypeAdapter(list[DeviceSchemas])
+
+async def read_device_readings(request: Request) -> list:
+    """リクエストボディから環境計測値のリストを読み込む
+    Content-Typeがapplication/x-ndjsonの場合は1行1件、それ以外はJSON配列として読み込む
+
+    Args:
+        request (Request): リクエスト
+
+    Raises:
+        HTTPException: 413:件数が多すぎる, 422:検証エラー
+
+    Returns:
+        list: [DeviceSchemas, ...]
+    """
+    readings = []
+    errors = []
+
+    def validate_line(line_no: int, line: bytes):
+        if line.strip() == b'':
+            return
+        try:
+            readings.append(DeviceSchemas.model_validate_json(line))
+        except ValidationError as err:
+            errors.extend({'line': line_no, **e} for e in err.errors(include_url=False, include_context=False))
+
+    if 'ndjson' in request.headers.get('content-type', ''):
+        # 受信しながら1行ずつ検証する
+        line_no = 0
+        buffer = b''
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b'\n')
+            for line in lines:
+                line_no += 1
+                validate_line(line_no, line)
+
+            if len(readings) > settings.ENVIRONMENT_BATCH_MAX:
+                raise HTTPException(status_code=413, detail=f'max {settings.ENVIRONMENT_BATCH_MAX} readings')
+
+        validate_line(line_no + 1, buffer)
+    else:
+        try:
+            readings = device_list_adapter.validate_json(await request.body())
+        except ValidationError as err:
+            errors = err.errors(include_url=False, include_context=False)
+
+    if len(errors) > 0:
+        raise HTTPException(status_code=422, detail=errors)
+
+    if len(readings) > settings.ENVIRONMENT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f'max {settings.ENVIRONMENT_BATCH_MAX} readings')
+
+    return readings
+
+@router.post("/env_values/batch/", response_model=DeviceBatchResultSchema)
+async def post_env_values_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """WatchOverが送信できなかった環境計測値をまとめて登録する
+    JSON配列、またはNDJSON（Content-Type: application/x-ndjson）で受け付け、
+    全件を検証してから1トランザクションで登録する
+    制御機器へは最も新しい計測値だけを通知し、稼働状態は返さない
+
+    Args:
+        request (Request): [{'mstr_0': 0.96, 'temp': 26.3, 'hum': 71.9, 'lux': 90, 'now': '2024-06-27 20:48:30'}, ...]
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
+
+    Returns:
+        DeviceBatchResultSchema: 登録した件数と、最も新しい環境計測値
+    """
+    readings = await read_device_readings(request)
+
+    ev = AsyncEnvironmentValuesService(db)
+    latest = await ev.create_env_values_batch(readings)
+
+    return DeviceBatchResultSchema(inserted=len(readings), latest=latest)
+
 @router.get("/actuators_state/", response_model=ActuatorsStateSchema)
-def get_actuators_operating_status(db: Session = Depends(get_db)):
+async def get_actuators_operating_status(request: Request, response: Response,
+                                         db: AsyncSession = Depends(get_async_db)):
     """現在稼働中の制御機器の稼働状態を取得する
     取得情報は、この問い合わせ先（flskr.views.py/get_controllers_monitor()へ返す
+    If-None-MatchがETagと一致する場合は、DBを読まずに304を返す
 
     Args:
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         _json_: 制御機器の稼働状態を取得する
@@ -56,61 +172,132 @@ def get_actuators_operating_status(db: Session = Depends(get_db)):
                 {'actuator_id': 'blkcrtn_01', 'state': 1, 'aperture': 20.0}, 
                 {'actuator_id': 'sdwn_01', 'state': 1, 'aperture': 50.0}]}
     """
-    ev = EnvironmentValuesService(db)
+    # DBを読む前のバージョンを使う（読み込み中の変更は、次の問い合わせで取得される）
+    etag = change_versions.etag('actuator_states')
+    if is_not_modified(request, response, etag):
+        return not_modified(etag)
+
+    ev = AsyncEnvironmentValuesService(db)
 
-    states = ev.get_actuators_info()
+    states = await ev.get_actuators_info()
 
     return states
 
+async def stream_state_events(client: StateStreamClient, snapshot: ActuatorsStateSchema):
+    """Server-Sent Eventsの本文を作成する
+    最初に現在の稼働状態（snapshot）を送り、以降は変更（delta）を送る。
+    受信が追いつかず購読を切断された場合は、droppedを送って終了する（再接続してsnapshotから取り直す）。
+    """
+    try:
+        yield f'event: snapshot\ndata: {snapshot.model_dump_json()}\n\n'
+
+        while True:
+            if client.dropped:
+                yield 'event: dropped\ndata: {}\n\n'
+                return
+
+            delta = await client.get(settings.STATE_STREAM_KEEPALIVE)
+            if delta is None:
+                if not client.dropped:
+                    yield ': keepalive\n\n'
+                continue
+
+            yield f'event: delta\ndata: {StateDeltaSchema(**delta).model_dump_json(exclude_none=True)}\n\n'
+    finally:
+        state_stream.unsubscribe(client)
+
+@router.get("/actuators_state/stream/")
+async def stream_actuators_state(group_no: int = None, db: AsyncSession = Depends(get_async_db)):
+    """制御機器の稼働状態・開度の変更をServer-Sent Eventsで配信する
+    /actuators_state/ をポーリングする代わりに使う
+
+    Args:
+        group_no (int, optional): 器機グループ番号. 指定した場合は、そのグループの制御機器だけを配信する
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
+
+    Returns:
+        StreamingResponse: text/event-stream
+            event: snapshot  data: {'actuators': [StateSchema, ...]}
+            event: delta     data: {'actuator_id': 'sdwnd_01', 'group_no': 1, 'aperture': 42.0}
+    """
+    # 読み込み中の変更を取りこぼさないよう、snapshotを読む前に購読する
+    client = state_stream.subscribe(group_no)
+
+    try:
+        ev = AsyncEnvironmentValuesService(db)
+        states = await ev.get_actuators_info()
+    except Exception:
+        state_stream.unsubscribe(client)
+        raise
+
+    state_stream.set_groups({state.actuator_id: state.group_no for state in states.actuators})
+    if group_no is not None:
+        states = ActuatorsStateSchema(actuators=[state for state in states.actuators if state.group_no == group_no])
+
+    return StreamingResponse(stream_state_events(client, states), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @router.get("/actuator_state/", response_model=StateSchema)
-def get_actuators_operating_status(id:str, db: Session = Depends(get_db)):
+async def get_actuators_operating_status(id:str, request: Request, response: Response,
+                                         db: AsyncSession = Depends(get_async_db)):
     """指定した制御機器の稼働状態を取得する
     取得情報は、この問い合わせ先（flskr.views.py/get_controllers_monitor()へ返す
+    If-None-MatchがETagと一致する場合は、DBを読まずに304を返す
 
     Args:
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         _json_: 制御機器の稼働状態を取得する
             {actuator_id:"str", state: "int", aperture: "float", actuator_name: "str", adjust_value: "float"}
     """
-    ev = EnvironmentValuesService(db)
+    etag = change_versions.etag('actuator_states', id)
+    if is_not_modified(request, response, etag):
+        return not_modified(etag)
+
+    ev = AsyncEnvironmentValuesService(db)
 
-    state = ev.get_actuator_info(id)
+    state = await ev.get_actuator_info(id)
 
     return state
 
 @router.get("/actuators_gpiono/", response_model=ActuatorGpioNoSchema)
-def get_actuators_operating_status(id: str, db: Session = Depends(get_db)):
+async def get_actuators_operating_status(id: str, db: AsyncSession = Depends(get_async_db)):
     """対象制御機器に設定するGPIO番号を取得する
 
     Args:
         id (str): 対象制御機器ID
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         ActuatorGpioNoSchema: GpioNoSchema辞書
     """
-    ev = EnvironmentValuesService(db)
+    ev = AsyncEnvironmentValuesService(db)
 
-    states = ev.get_actuators_gpiono(id)
+    states = await ev.get_actuators_gpiono(id)
 
     return states
 
 @router.get("/device_steps/", response_model=DeviceControlSchema)
-def get_device_step_values(id: str, db: Session = Depends(get_db)):
+async def get_device_step_values(id: str, request: Request, response: Response,
+                                 db: AsyncSession = Depends(get_async_db)):
     """device_control_tableから、指定したidをもつデータを抽出する
+    If-None-MatchがETagと一致する場合は、DBを読まずに304を返す
 
     Args:
         id (str): 対象とする制御機器ID
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         _DeviceControlSchema_: DeviceControlSchemaの内容をjsonに変換したデータ
     """
-    ev = EnvironmentValuesService(db)
+    etag = change_versions.etag('device_control_table', id)
+    if is_not_modified(request, response, etag):
+        return not_modified(etag)
 
-    values = ev.get_device_step_values(id)
+    ev = AsyncEnvironmentValuesService(db)
+
+    values = await ev.get_device_step_values(id)
     # devctrls=[
     # StepValuesSchema(actuator_id='blkcrtn_01', pattern_id=0, priority=1, min_value=28.0, first_stage=28.0, first_value=70.0, secnd_stage=30.0, secnd_value=20.0, third_stage=33.0, third_value=5.0, forth_stage=0.0, forth_value=0.0, fifth_stage=0.0, fifth_value=0.0, daytime_start='', daytime_ending='', daytime_aperture=0.0, night_start='', night_ending='', night_aperture=0.0, classify=0.0), 
     # StepValuesSchema(actuator_id='blkcrtn_01', pattern_id=1, priority=1, min_value=100.0, first_stage=100.0, first_value=20.0, secnd_stage=200.0, secnd_value=10.0, third_stage=250.0, third_value=5.0, forth_stage=0.0, forth_value=0.0, fifth_stage=0.0, fifth_value=0.0, daytime_start='', daytime_ending='', daytime_aperture=0.0, night_start='', night_ending='', night_aperture=0.0, classify=0.0)])
@@ -118,7 +305,7 @@ def get_device_step_values(id: str, db: Session = Depends(get_db)):
     return values
 
 @router.put("/actuator_mode/", response_model=StateSchema)
-def post_change_mode(state: ActuatorModeSchema, db: Session = Depends(get_db)):
+async def post_change_mode(state: ActuatorModeSchema, db: AsyncSession = Depends(get_async_db)):
     """idをキーとする稼働中の制御機器の動作を変更する
     動作：自動運転中、手動運転中、停止中
     actuator_statesテーブル
@@ -138,13 +325,13 @@ def post_change_mode(state: ActuatorModeSchema, db: Session = Depends(get_db)):
     # print(f'{state.actuator_id=}')
     # print(f'{state.mode=}')
 
-    evs = EnvironmentValuesService(db)
-    result = evs.update_actuator_mode(state.actuator_id, state.mode)
+    evs = AsyncEnvironmentValuesService(db)
+    result = await evs.update_actuator_mode(state.actuator_id, state.mode)
     
     return result
 
 @router.put("/update_device_control/")
-def post_device_control(data: dict, db: Session = Depends(get_db)) -> bool:
+async def post_device_control(data: dict, db: AsyncSession = Depends(get_async_db)) -> bool:
     """段階別データ更新処理
         device_control_tableのデータを更新する
         このコードは、FastAPIを使用してデバイス制御の更新を行うエンドポイントを定義しています。
@@ -157,7 +344,7 @@ def post_device_control(data: dict, db: Session = Depends(get_db)) -> bool:
         この関数は、デバイス制御テーブルのデータを更新するための処理を行います。        
     Args:
         data (dict): 更新データ
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         StateSchema: 更新後のデータ
@@ -166,39 +353,39 @@ def post_device_control(data: dict, db: Session = Depends(get_db)) -> bool:
     # print(data['pattern'])
     # print(data['updateData'])
 
-    evs = EnvironmentValuesService(db)
-    result = evs.update_device_control(data['id'], data['pattern'], data['updateData'])
+    evs = AsyncEnvironmentValuesService(db)
+    result = await evs.update_device_control(data['id'], data['pattern'], data['updateData'])
 
     return result
 
 @router.get("/irrigation_schedule/", response_model=IrrigationScheduleSchema)
-def get_irrigation_time_schedule(line_no: int, db: Session = Depends(get_db)):
+async def get_irrigation_time_schedule(line_no: int, db: AsyncSession = Depends(get_async_db)):
     """自動潅水スケジュールを取得する
     irrigation_timesテーブルから、潅水スケジュールを取得する
     
     Args:
         line_no (int): 潅水ライン番号
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
     """
     # print(f'{line_no=}')
     # evs = EnvironmentValuesService(db)
     # result = evs.get_irrigation_time_schedule(line_no)
-    isa = IrrigationScheduleAdmin(db)
-    result = isa.get_irrigation_time_schedule(line_no)
+    isa = AsyncIrrigationScheduleAdmin(db)
+    result = await isa.get_irrigation_time_schedule(line_no)
     
     # print(f'{result=}')
     
     return result
 
 @router.put("/update_irrigation_table/")
-def update_irrigation_table(data: dict, db: Session = Depends(get_db)) -> bool:
+async def update_irrigation_table(data: dict, db: AsyncSession = Depends(get_async_db)) -> bool:
     """自動潅水スケジュールを更新する
 
     Args:
         data (dict): 更新データ辞書 
             ex.{'id': 'irrgtn_01', 
                 'schedules':{'05:00': [0, 0], '06:00': [0, 0], '07:00': [0, 20], ...}}
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         bool: 更新が成功した場合はTrueを返す。更新が失敗した場合はFalseを返す。
@@ -207,45 +394,89 @@ def update_irrigation_table(data: dict, db: Session = Depends(get_db)) -> bool:
     print(f'id:{data["id"]}')
     print(f'schedules:{data["schedules"]}')
     # evs = EnvironmentValuesService(db)
-    isa = IrrigationScheduleAdmin(db)
+    isa = AsyncIrrigationScheduleAdmin(db)
 
-    result = isa.update_irrigation_table(data)
+    result = await isa.update_irrigation_table(data)
 
     return result
 
 @router.get("/irrigation_line_no/")
-def get_irrigation_line_no(id: str, db: Session = Depends(get_db)):
+async def get_irrigation_line_no(id: str, db: AsyncSession = Depends(get_async_db)):
     """潅水ライン番号を取得する
 
     Args:
         id (str): 制御機器ID
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         int: 潅水ライン番号
     """
-    isa = IrrigationScheduleAdmin(db)
+    isa = AsyncIrrigationScheduleAdmin(db)
 
-    result = isa.get_irrigation_line_no(id)
+    result = await isa.get_irrigation_line_no(id)
     # print(f'irrigation_line_no:{id=}:{result=}')
 
     return result
 
 @router.put("/manual_irrigation_time/")
-def put_manual_irrigtion_time(data: dict, db: Session = Depends(get_db)) -> bool:
+async def put_manual_irrigtion_time(data: dict, db: AsyncSession = Depends(get_async_db)) -> bool:
     """手動潅水時刻を設定する
 
     Args:
         data (dict): {"id": ID, "time": value}
                      ex.{"id": "irrgtn_01", "time": 15}
-        db (Session, optional): _description_. Defaults to Depends(get_db).
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
 
     Returns:
         bool: 更新が成功した場合はTrueを返す。更新が失敗した場合はFalseを返す。
     """
     print(f'<<<<<< {data["id"]=}:{data["time"]=}>>>>>>>>')
-    isa = IrrigationScheduleAdmin(db)
+    isa = AsyncIrrigationScheduleAdmin(db)
 
-    result = isa.set_manual_irrigtion_time(data["id"], data["time"])
+    result = await isa.set_manual_irrigtion_time(data["id"], data["time"])
 
     return result
+
+@router.get("/actuators_health/", response_model=ActuatorsHealthSchema)
+async def get_actuators_health():
+    """各制御機器タスクの稼働状況を取得する
+    1秒あたりの周期数、直近1周期の処理時間、再起動回数、読み飛ばした周期数、直近のエラー
+
+    Returns:
+        ActuatorsHealthSchema: 制御機器ごとの稼働状況
+    """
+    stats = actuator_supervisor.stats()
+
+    return ActuatorsHealthSchema(actuators=list(stats.values()))
+
+@router.get("/env_rollups/", response_model=EnvironmentRollupsSchema)
+async def get_env_rollups(resolution: int = 600, start: str = None, end: str = None,
+                          db: AsyncSession = Depends(get_async_db)):
+    """環境計測値の集計（平均・最小・最大）を取得する
+    集計は計測値の受信時に更新済みのため、履歴（environment_values）は読まない
+
+    Args:
+        resolution (int, optional): 分解能（秒） 60, 600, 3600. Defaults to 600.
+        start (str, optional): 期間の開始年月日時刻（この時刻を含む） ex.'2024-06-20 00:00:00'
+        end (str, optional): 期間の終了年月日時刻（この時刻を含まない）
+        db (Session, optional): _description_. Defaults to Depends(get_async_db).
+
+    Returns:
+        EnvironmentRollupsSchema: 区間の開始年月日時刻順の集計リスト
+    """
+    ers = AsyncEnvironmentRollupService(db)
+
+    try:
+        return await ers.get_rollups(resolution, start, end)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheusのテキスト形式で、計測値を取得する
+    イベントループの遅延、制御機器の周期処理時間、DBアクセス・GPIO出力・APIの処理時間、GPIOの切り替え回数
+
+    Returns:
+        PlainTextResponse: text/plain; version=0.0.4
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -5,6 +5,18 @@ class Settings(BaseSettings):
     APP_NAME: str = "K'sFarmware"
     ORIGIN_FLSKR_URL: str = ""
     DATABASE_URL: str = 'sqlite:///../database/actuators_manage_db.sqlite'
+    # 非同期エンジン用のDB URL 未設定の場合はDATABASE_URLをaiosqliteに置き換えて使用する
+    ASYNC_DATABASE_URL: str = ''
+    # SQLite接続プロファイル（接続するたびにPRAGMAで設定する）
+    # WALにすると、書き込み中も他のスレッドから読み込める
+    # journal_modeはDBファイルに保存されるため、接続ごとではなくmain.pyの起動時に設定する
+    # （設定するとDBファイル自体がWALモードに移行し、-wal, -shmファイルが作成される） 空文字:変更しない
+    SQLITE_JOURNAL_MODE: str = 'WAL'
+    SQLITE_SYNCHRONOUS: str = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT: int = 5000         # ロック解除を待つ最大時間（ミリ秒）
+    SQLITE_MMAP_SIZE: int = 67108864        # メモリマップI/Oのサイズ（バイト） 0:使用しない
+    SQLITE_CACHE_SIZE: int = -8192          # ページキャッシュ 負の値はKiB単位
+    SQLITE_TEMP_STORE: str = 'MEMORY'
     # 遮光カーテン自動、手動モード
     # mode (int): 1:自動運転中, 0:手動運転中, 9:停止中
     ACTUATOR_AUTO: int = 1
@@ -13,6 +25,45 @@ class Settings(BaseSettings):
     ACTUATOR_FORCED_OPEN: int = 11
     ACTUATOR_FORCED_CLOSE: int = 19
     ACTUATOR_MODE: int = ACTUATOR_MANUAL
+    # True:FastAPIのlifespanで制御機器を起動し、APIと制御機器を1つのイベントループで実行する
+    # False:FastAPIを別スレッドで起動する（従来の動作）
+    SINGLE_LOOP_MODE: bool = False
+    # actuator_statesテーブルを読み直し、制御機器の追加・削除・設定変更を反映する間隔（秒）
+    ACTUATOR_RECONCILE_INTERVAL: float = 30.0
+    # 制御機器のタスクが例外で終了した場合の再起動待ち時間（秒） 連続で失敗するたびに倍にする
+    ACTUATOR_RESTART_BACKOFF: float = 1.0
+    ACTUATOR_RESTART_BACKOFF_MAX: float = 60.0
+    # actuator_states.intervalが未設定(0)の場合の計測間隔（秒）
+    ACTUATOR_DEFAULT_INTERVAL: float = 1.0
+    # GPIOバックエンド 'gpiod':実機, 'fake':疑似GPIOチップ（ハードウェアなしでの確認用）
+    GPIO_BACKEND: str = 'gpiod'
+    GPIO_CHIP_PATH: str = '/dev/gpiochip4'
+    # モータ開度をactuator_statesテーブルへまとめて書き込む間隔（秒）
+    APERTURE_FLUSH_INTERVAL: float = 5.0
+    # モータ動作中に現在開度を更新する間隔（秒）
+    MOTOR_PROGRESS_INTERVAL: float = 1.0
+    # コンパイル済みの段階別設定(device_control_table)を読み直すまでの秒数 0以下の場合はAPIでの更新時だけ読み直す
+    # DBツールやリストアなど、APIを通さない変更もこの秒数以内に反映される
+    CONTROL_CURVE_CACHE_TTL: float = 60.0
+    # 潅水時刻を過ぎてから、遅れて潅水を開始してよい秒数 これを超えた潅水は実行せずに記録する
+    IRRIGATION_GRACE_SECONDS: float = 60.0
+    # environment_valuesテーブルに環境計測値を保持する日数 0以下の場合は削除しない
+    ENVIRONMENT_RETENTION_DAYS: float = 30.0
+    # 保持期間を過ぎた環境計測値を削除する間隔（秒）と、1回のDELETEで削除する件数
+    ENVIRONMENT_PRUNE_INTERVAL: float = 600.0
+    ENVIRONMENT_PRUNE_BATCH: int = 1000
+    # 環境計測値を集計する分解能（秒） 1分, 10分, 1時間
+    ENVIRONMENT_ROLLUP_RESOLUTIONS: list[int] = [60, 600, 3600]
+    # environment_rollupsテーブルに集計を保持する日数 {分解能（秒）: 日数} 0以下または未設定の場合は削除しない
+    ENVIRONMENT_ROLLUP_RETENTION_DAYS: dict[int, float] = {60: 7.0, 600: 90.0, 3600: 730.0}
+    # /env_values/batch/ で1回に受け付ける環境計測値の最大件数
+    ENVIRONMENT_BATCH_MAX: int = 50000
+    # /actuators_state/stream/ の購読者ごとに保持する未送信の変更の上限 超えた購読者は切断する
+    STATE_STREAM_QUEUE_SIZE: int = 100
+    # /actuators_state/stream/ で変更がないときにキープアライブを送る間隔（秒）
+    STATE_STREAM_KEEPALIVE: float = 15.0
+    # /metrics のイベントループ遅延を計測する間隔（秒）
+    METRICS_LOOP_LAG_INTERVAL: float = 0.5
     
     class Config:
         env_file = ".env"
@@ -1,15 +1,91 @@
-from contextlib import contextmanager
-from sqlalchemy import create_engine
+from contextlib import contextmanager, asynccontextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from config import settings
 #from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import declarative_base
 
 engine = create_engine(settings.DATABASE_URL, connect_args={'check_same_thread': False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_sqlite_pragmas() -> dict:
+    """SQLite接続プロファイル（接続ごとに設定するPRAGMA）を取得する
+    値はsettings.SQLITE_*から取得し、空文字またはNoneの項目は設定しない
+    journal_modeはDBファイルに保存されるため含めない（apply_journal_mode()で設定する）
+
+    Returns:
+        dict: {PRAGMA名: 値, ...}
+    """
+    pragmas = {
+        'synchronous': settings.SQLITE_SYNCHRONOUS,
+        'busy_timeout': settings.SQLITE_BUSY_TIMEOUT,
+        'mmap_size': settings.SQLITE_MMAP_SIZE,
+        'cache_size': settings.SQLITE_CACHE_SIZE,
+        'temp_store': settings.SQLITE_TEMP_STORE,
+    }
+
+    return {name: value for name, value in pragmas.items() if value is not None and value != ''}
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """接続時にSQLite接続プロファイルを設定する（connectイベント）
+
+    Args:
+        dbapi_connection (object): DBAPI接続（sqlite3またはaiosqliteのアダプタ）
+        connection_record (object): 接続レコード
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in get_sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+def apply_journal_mode(bind=None) -> str:
+    """settings.SQLITE_JOURNAL_MODEをDBファイルに設定する
+    journal_modeはDBファイルに保存され、以降の全ての接続に適用される（WALへの切り替えはファイルの移行）
+    このため接続ごとには設定せず、アプリケーションの起動時（main.py）に一度だけ呼び出す
+
+    Args:
+        bind (Engine, optional): 設定するDBのエンジン. Noneの場合はengine
+
+    Returns:
+        str: 設定後のjournal_mode, 設定しなかった場合はNone
+    """
+    bind = bind if bind is not None else engine
+    if bind.dialect.name != 'sqlite' or not settings.SQLITE_JOURNAL_MODE:
+        return None
+
+    with bind.connect() as connection:
+        return connection.exec_driver_sql(f'PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}').scalar()
+
+if engine.dialect.name == 'sqlite':
+    event.listen(engine, 'connect', apply_sqlite_pragmas)
 Base = declarative_base()
 Base.metadata.create_all(bind=engine, checkfirst=False)
 
+def get_async_database_url() -> str:
+    """非同期エンジン用のDB URLを取得する
+    settings.ASYNC_DATABASE_URLが未設定の場合は、DATABASE_URLのドライバをaiosqliteに置き換える
+
+    Returns:
+        str: 非同期エンジン用のDB URL ex.sqlite+aiosqlite:///../database/actuators_manage_db.sqlite
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    return settings.DATABASE_URL.replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+# 非同期エンジン（aiosqlite）
+# 制御機器のイベントループとFastAPIのイベントループの両方から使用するため、
+# 接続はプールせずセッションごとに開閉する（aiosqliteの接続はイベントループをまたげない）
+async_engine = create_async_engine(get_async_database_url(), poolclass=NullPool)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if async_engine.dialect.name == 'sqlite':
+    event.listen(async_engine.sync_engine, 'connect', apply_sqlite_pragmas)
+
 # 手動潅水専用設定時刻　潅水装置IDひとつにつき、１つの設定時刻を持つ
 MANUAL_IRRIGATION_TIME: str = '99:99'
 
@@ -42,3 +118,27 @@ def get_session():
         raise 
     finally:
         db.close()
+
+async def get_async_db():
+    """非同期DBセッション（FastAPIのDepends用）
+
+    Yields:
+        AsyncSession: 非同期DBセッション
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@asynccontextmanager
+async def get_async_session():
+    """非同期DBセッションコンテキストマネージャ
+    async with ブロックと組み合わせて使い、例外時はロールバックする
+
+    Yields:
+        AsyncSession: 非同期DBセッション
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except:
+            await db.rollback()
+            raise
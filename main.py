@@ -1,26 +1,69 @@
+import sys
 import uvicorn
 import asyncio
 import threading
 from actuator_manager import ActuatorManager
+from actuators.base_actuators.gpio_line_manager import gpio_line_manager
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.metrics import MetricsMiddleware, monitor_loop_lag
+from services.environment_history import environment_history
 from config import settings
 from fastapi import FastAPI
 from api.endpoints.actuator_endpoints import router as api_router
-from database.db_access import engine, Base
+from database.db_access import engine, Base, apply_journal_mode
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
-def run_web_server():
-    """Fastapi実行
+def report_manager_exit(task: asyncio.Task):
+    """ActuatorManagerのタスクが終了した理由を出力する（シングルループモード）
+
+    Args:
+        task (asyncio.Task): ActuatorManager.execute_taskのタスク
+    """
+    if task.cancelled():
+        return
+
+    err = task.exception()
+    if err is not None:
+        print(f'actuator manager stopped: {err=}, {type(err)=}')
+
+def create_app() -> FastAPI:
+    """FastAPIアプリケーションを作成する
+    settings.SINGLE_LOOP_MODEがTrueの場合は、lifespanでActuatorManagerを
+    同じイベントループ上に起動し、終了時にモータ停止、開度の書き込み、
+    GPIOラインの解放を順におこなう
 
     Returns:
-        json: RESTでの処理結果
+        FastAPI: アプリケーション
     """
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         print("startup event")
         engine.connect()
+
+        manager_task = None
+        lag_task = None
+        app.state.actuator_manager = None
+        if settings.SINGLE_LOOP_MODE:
+            am = ActuatorManager(asyncio.get_running_loop())
+            app.state.actuator_manager = am
+            manager_task = asyncio.create_task(am.execute_task())
+            manager_task.add_done_callback(report_manager_exit)
+        else:
+            # 制御機器のイベントループとは別に、APIのイベントループの遅延を計測する
+            lag_task = asyncio.create_task(monitor_loop_lag('api'))
+
         yield
+
         print("shutdown event")
+        if manager_task is not None:
+            await app.state.actuator_manager.shutdown()
+            manager_task.cancel()
+            await asyncio.gather(manager_task, return_exceptions=True)
+        if lag_task is not None:
+            lag_task.cancel()
+            await asyncio.gather(lag_task, return_exceptions=True)
+
         engine.dispose()
     
     app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
@@ -39,14 +82,28 @@ def run_web_server():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # ルートごとのAPI処理時間を /metrics で公開する
+    app.add_middleware(MetricsMiddleware)
 
     
     # sqliteアクセスにあたり、テーブルを作成する
     Base.metadata.create_all(bind=engine)
+    # 既存のDBには、create_allでインデックスが追加されないため個別に作成する
+    environment_history.ensure_schema()
 
     #print('api_router')
     app.include_router(api_router)
 
+    return app
+
+def run_web_server():
+    """Fastapi実行
+
+    Returns:
+        json: RESTでの処理結果
+    """
+    app = create_app()
+
     # print('start fastapi..')
     uvicorn.run(app, host="0.0.0.0", port=8001, log_level="debug")
 
@@ -62,6 +119,15 @@ async def main(loop):
     await am.execute_task()
 
 if __name__ == "__main__":
+    # DBファイルのjournal_modeを設定する（テスト等でインポートしただけでは変更しない）
+    apply_journal_mode()
+
+    if settings.SINGLE_LOOP_MODE:
+        # FastAPIと制御機器を1つのイベントループで実行する
+        # 制御機器の起動と終了はlifespanでおこなう
+        run_web_server()
+        sys.exit(0)
+
     threading.Thread(target=run_web_server).start()
 
     loop = asyncio.get_event_loop()
@@ -71,4 +137,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print('exit')
     finally:
+        # 未書き込みの開度を書き込んでから終了する
+        aperture_store.flush()
+        gpio_line_manager.release_all()
         loop.close()
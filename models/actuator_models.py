@@ -1,9 +1,16 @@
-from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Float
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Float, Index
 from database.db_access import Base
 from datetime import datetime
 
 class EnvironmentValues(Base):
+    """環境計測値の履歴（追記のみ）
+    WatchOverから受信した計測値を1件ずつ追加し、保持期間を過ぎたものは
+    EnvironmentHistory.pruneでまとめて削除する
+    """
     __tablename__ = "environment_values"
+    __table_args__ = (
+        Index('ix_environment_values_updated', 'updated'),  # 計測年月日時刻の範囲検索・保持期間の削除用
+    )
 
     id = Column(Integer, primary_key=True)  # default autoincrement 
     temperature = Column(Float)
@@ -15,6 +22,29 @@ class EnvironmentValues(Base):
 
 #{'mstr_0': 0.96, 'temp': 26.3, 'hum': 71.9, 'lux': 90, 'now': '2024-06-27 20:48:30'}
 
+class EnvironmentRollup(Base):
+    """環境計測値の集計（分解能ごとの時間区間）
+    計測値を受信するたびに、該当する区間の件数・合計・最小・最大を更新する
+    平均は 合計 / 件数 で求める
+    """
+    __tablename__ = "environment_rollups"
+
+    resolution = Column(Integer, autoincrement=False, primary_key=True)   # 分解能（秒） ex.60, 600, 3600
+    bucket_start = Column(String(20), primary_key=True) # 区間の開始年月日時刻 ex.'2024-06-27 20:40:00'
+    count = Column(Integer, nullable=False)             # 計測値の件数
+    temperature_sum = Column(Float)                     # 温度
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    humidity_sum = Column(Float)                        # 湿度
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    moisture_sum = Column(Float)                        # 水分
+    moisture_min = Column(Float)
+    moisture_max = Column(Float)
+    lux_sum = Column(Float)                             # 照度
+    lux_min = Column(Float)
+    lux_max = Column(Float)
+
 class ActuatorStates(Base):
     __tablename__ = "actuator_states"
 
@@ -18,6 +18,12 @@ class DeviceSchemas(BaseModel):
     class Config:
         orm_mode = True
 
+class DeviceBatchResultSchema(BaseModel):
+    """環境計測値の一括登録結果スキーマ
+    """
+    inserted: int                       # 登録した件数
+    latest: DeviceSchemas | None = None # 最も新しい環境計測値
+
 class StateSchema(BaseModel):
     """actuator_statesテーブルスキーマクラス
 
@@ -44,6 +50,15 @@ class ActuatorsStateSchema(BaseModel):
     class Config:
         orm_mode = True
 
+class StateDeltaSchema(BaseModel):
+    """稼働状態・開度の変更スキーマ（/actuators_state/stream/ で配信する）
+    変更した項目だけを持ち、変更していない項目はNoneとする
+    """
+    actuator_id: str
+    group_no: int | None = None
+    state: int | None = None
+    aperture: float | None = None
+
 class GpioNoSchema(BaseModel):
     """_summary_
 
@@ -159,3 +174,46 @@ class IrrigationScheduleSchema(BaseModel):
     
     class Config:
         orm_mode = True
+
+class ActuatorHealthSchema(BaseModel):
+    """制御機器タスクの稼働状況スキーマ
+    """
+    actuator_id: str                    # 制御機器ID
+    status: str                         # starting:起動中, running:実行中, backoff:再起動待ち, stopped:停止
+    iterations: int                     # 実行した周期数
+    iterations_per_sec: float           # 1秒あたりの周期数
+    last_latency: float | None = None   # 直近1周期の処理時間（秒）
+    restarts: int                       # 再起動回数
+    missed_ticks: int = 0               # 処理が計測間隔を超えたため読み飛ばした周期数
+    last_error: str | None = None       # 直近のエラー
+    last_error_at: float | None = None  # 直近のエラー時刻（UNIX時刻）
+    started_at: float | None = None     # 直近の起動時刻（UNIX時刻）
+
+class ActuatorsHealthSchema(BaseModel):
+    """ActuatorHealthSchemaリストスキーマ
+    """
+    actuators: list[ActuatorHealthSchema] = []
+
+class EnvironmentRollupSchema(BaseModel):
+    """environment_rollupsテーブルスキーマ（1区間分の集計）
+    """
+    resolution: int                         # 分解能（秒）
+    bucket_start: str                       # 区間の開始年月日時刻
+    count: int                              # 計測値の件数
+    temperature_mean: float | None = None   # 温度
+    temperature_min: float | None = None
+    temperature_max: float | None = None
+    humidity_mean: float | None = None      # 湿度
+    humidity_min: float | None = None
+    humidity_max: float | None = None
+    moisture_mean: float | None = None      # 水分
+    moisture_min: float | None = None
+    moisture_max: float | None = None
+    lux_mean: float | None = None           # 照度
+    lux_min: float | None = None
+    lux_max: float | None = None
+
+class EnvironmentRollupsSchema(BaseModel):
+    """EnvironmentRollupSchemaリストスキーマ
+    """
+    rollups: list[EnvironmentRollupSchema] = []
@@ -1,8 +1,15 @@
 from datetime import datetime
 from sqlite3 import IntegrityError, OperationalError, ProgrammingError
-from sqlalchemy import and_
+from sqlalchemy import and_, select, insert
 import sqlalchemy
 from database.db_access import get_session
+from actuators.base_actuators.environment_bus import environment_bus, EnvironmentSnapshot
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.calc_aperture import control_curve_cache
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.change_versions import change_versions
+from services.environment_history import environment_history
+from services.environment_rollups import build_rollup_upserts
 from models.actuator_models import \
     EnvironmentValues as ev, \
     ActuatorStates as ast, \
@@ -22,13 +29,70 @@ from schemas.actuator_schemas import \
     IrrigationScheduleSchema as iss
     
 
+def to_step_values_schema(val) -> svs:
+    """device_control_tableのレコードをStepValuesSchemaへ変換する
+
+    Args:
+        val (DeviceControlTable): device_control_tableのレコード
+
+    Returns:
+        svs: 段階別設定値
+    """
+    return svs(
+        actuator_id = val.actuator_id,         # 機器ID
+        pattern_id = val.pattern_id,          # パターン№  0:温度、1:日射量、2:時間
+        priority = int(val.priority or 1),            # 優先順位 1:現時点では意味なし
+        min_value = float(val.min_value or 0.0),         # 最小値
+        first_stage = float(val.first_stage or 0.0),       # 第1段階
+        first_value = float(val.first_value or 0.0),       # 第1段階設定値
+        secnd_stage = float(val.secnd_stage or 0.0),       # 第2段階
+        secnd_value = float(val.secnd_value or 0.0),       # 第2段階設定値
+        third_stage = float(val.third_stage or 0.0),       # 第3段階
+        third_value = float(val.third_value or 0.0),       # 第3段階設定値
+        forth_stage = float(val.forth_stage or 0.0),       # 第4段階
+        forth_value = float(val.forth_value or 0.0),       # 第4段階設定値
+        fifth_stage = float(val.fifth_stage or 0.0),       # 第5段階
+        fifth_value = float(val.fifth_value or 0.0),       # 第5段階設定値
+        daytime_start = str(val.daytime_start  or ''),       # 昼間_開始時間
+        daytime_ending = str(val.daytime_ending or ''),      # 昼間_終了時間
+        daytime_aperture = float(val.daytime_aperture or 0.0),  # 昼間_開度
+        night_start = str(val.night_start or ''),         # 夜間_開始時間
+        night_ending = str(val.night_ending or ''),        # 夜間_終了時間
+        night_aperture = float(val.night_aperture or 0.0),    # 夜間_開度
+        classify = float(val.classify or 0.0)          # 動作種別
+    ) # type: ignore
+
+
+def apply_device_control(row, updateData: dict):
+    """段階別データの更新内容をdevice_control_tableのレコードへ設定する
+    第2段階は、updateDataの項目名(second_*)とテーブルの列名(secnd_*)が異なる
+
+    Args:
+        row (DeviceControlTable): 更新対象レコード
+        updateData (dict): 更新データ
+    """
+    row.first_stage = updateData.get('first_stage', 0)      # 第1段階
+    row.first_value = updateData.get('first_value', 0)      # 第1段階設定値
+    row.secnd_stage = updateData.get('second_stage', 0)     # 第2段階
+    row.secnd_value = updateData.get('second_value', 0)     # 第2段階設定値
+    row.third_stage = updateData.get('third_stage', 0)      # 第3段階
+    row.third_value = updateData.get('third_value', 0)      # 第3段階設定値
+    row.forth_stage = updateData.get('forth_stage', 0)      # 第4段階
+    row.forth_value = updateData.get('forth_value', 0)      # 第4段階設定値
+    row.fifth_stage = updateData.get('fifth_stage', 0)      # 第5段階
+    row.fifth_value = updateData.get('fifth_value', 0)      # 第5段階設定値
+    row.modified = datetime.now()                           # 更新年月日時刻
+
+
 class EnvironmentValuesService:
     def __init__(self, db):
         self.db = db
 
     def create_env_values(self, values: ds) -> ds:
         """environment_valuesテーブルにWatchOverから送信されてきた
-        環境情報をenvironment_valuesテーブルへ登録する
+        環境情報をenvironment_valuesテーブルへ追加する
+        登録した環境情報は、環境計測値配信バスで各制御機器へ通知する
+        古い環境情報はEnvironmentHistoryが保持期間を過ぎてから削除する
 
         Args:
             values (DeviceSchemas): 環境情報
@@ -36,9 +100,6 @@ class EnvironmentValuesService:
         Returns:
             ds: _description_
         """
-        # 全データ削除
-        self.db.query(ev).delete()
-        
         # DeviceSchemasからEnvironmentValuesへデータ変換する
         vals = ev()
         vals.temperature = values.temp
@@ -47,10 +108,17 @@ class EnvironmentValuesService:
         vals.lux = values.lux
         vals.updated = values.now
 
+        environment_history.ensure_schema()
         self.db.add(vals)
+        # 1分・10分・1時間の集計に加算する（同じトランザクションでコミットする）
+        for rollup in build_rollup_upserts([values]):
+            self.db.execute(rollup)
         self.db.commit()
         self.db.refresh(vals)
 
+        # 各制御機器へ最新の環境情報を通知する
+        environment_bus.publish(EnvironmentSnapshot.from_schema(values))
+
         return values
 
     def get_actuators_info(self) -> ass:
@@ -78,9 +146,10 @@ class EnvironmentValuesService:
 
         list_ss = []
         for val in list:
+            # 開度は、未書き込みのものを含めた最新の値を返す
             item = ss(actuator_id=val.actuator_id,
                     state=val.state,
-                    aperture=val.aperture,
+                    aperture=aperture_store.get(val.actuator_id, val.aperture),
                     actuator_name=val.actuator_name, 
                     adjust_value=val.adjust_value,
                     group_no=val.group_no) # type: ignore
@@ -108,7 +177,7 @@ class EnvironmentValuesService:
 
                 ret = ss(actuator_id=actuator.actuator_id, 
                         state=actuator.state, 
-                        aperture=actuator.aperture, 
+                        aperture=aperture_store.get(actuator.actuator_id, actuator.aperture), 
                         actuator_name=actuator.actuator_name, 
                         adjust_value=actuator.adjust_value,
                         group_no=actuator.group_no)
@@ -177,36 +246,15 @@ class EnvironmentValuesService:
         print(f'step_values={str(step_values[0].actuator_id)}')
         list_svs = []
         for val in list:
-            item = svs(
-                actuator_id = val.actuator_id,         # 機器ID
-                pattern_id = val.pattern_id,          # パターン№  0:温度、1:日射量、2:時間
-                priority = int(val.priority or 1),            # 優先順位 1:現時点では意味なし
-                min_value = float(val.min_value or 0.0),         # 最小値
-                first_stage = float(val.first_stage or 0.0),       # 第1段階
-                first_value = float(val.first_value or 0.0),       # 第1段階設定値
-                secnd_stage = float(val.secnd_stage or 0.0),       # 第2段階
-                secnd_value = float(val.secnd_value or 0.0),       # 第2段階設定値
-                third_stage = float(val.third_stage or 0.0),       # 第3段階
-                third_value = float(val.third_value or 0.0),       # 第3段階設定値
-                forth_stage = float(val.forth_stage or 0.0),       # 第4段階
-                forth_value = float(val.forth_value or 0.0),       # 第4段階設定値
-                fifth_stage = float(val.fifth_stage or 0.0),       # 第5段階
-                fifth_value = float(val.fifth_value or 0.0),       # 第5段階設定値
-                daytime_start = str(val.daytime_start  or ''),       # 昼間_開始時間
-                daytime_ending = str(val.daytime_ending or ''),      # 昼間_終了時間
-                daytime_aperture = float(val.daytime_aperture or 0.0),  # 昼間_開度
-                night_start = str(val.night_start or ''),         # 夜間_開始時間
-                night_ending = str(val.night_ending or ''),        # 夜間_終了時間
-                night_aperture = float(val.night_aperture or 0.0),    # 夜間_開度
-                classify = float(val.classify or 0.0)          # 動作種別
-            ) # type: ignore
+            item = to_step_values_schema(val)
             list_svs.append(item)
 
         return dcs(devctrls=list_svs)
 
     def update_actuator_mode(self, id: str, mode: int) -> ass:
         """対象の制御機器の稼働状態を更新する
-        actuator_statesテーブル
+        actuator_statesテーブルとActuatorStateRegistryを更新し、
+        対象の制御機器へ通知する
         # mode (int): 1:自動運転中, 0:手動運転中, 9:停止中
         config.py
             ACTUATOR_AUTO: int = 1
@@ -238,6 +286,9 @@ class EnvironmentValuesService:
                     db.commit()
                     ret.state = mode
 
+                    # 対象の制御機器へ稼働状態の変更を即座に通知する
+                    actuator_state_registry.update(id, mode)
+
             return ret
         except (
                 # データベースに接続できないエラーOperationalError
@@ -277,18 +328,12 @@ class EnvironmentValuesService:
                     ).first()
                 
                 if row is not None:
-                    row.first_stage = updateData.get('first_stage', 0)      # 第1段階
-                    row.first_value = updateData.get('first_value', 0)      # 第1段階設定値
-                    row.second_stage = updateData.get('second_stage', 0)    # 第2段階
-                    row.second_value = updateData.get('second_value', 0)    # 第2段階設定値
-                    row.third_stage = updateData.get('third_stage', 0)      # 第3段階
-                    row.third_value = updateData.get('third_value', 0)      # 第3段階設定値
-                    row.forth_stage = updateData.get('forth_stage', 0)      # 第4段階
-                    row.forth_value = updateData.get('forth_value', 0)      # 第4段階設定値
-                    row.fifth_stage = updateData.get('fifth_stage', 0)      # 第5段階
-                    row.fifth_value = updateData.get('fifth_value', 0)      # 第5段階設定値
-                    row.modified = datetime.now()                           # 更新年月日時刻
+                    apply_device_control(row, updateData)
                     db.commit()
+
+                    # コンパイル済みの段階別設定を破棄し、ETagを更新する
+                    control_curve_cache.invalidate(id)
+                    change_versions.bump('device_control_table', id)
                     return True
                 else:
                     return False
@@ -307,3 +352,236 @@ class EnvironmentValuesService:
             print(f'{err}')
             raise
 
+
+
+class AsyncEnvironmentValuesService:
+    """EnvironmentValuesServiceの非同期版
+    AsyncSession（aiosqlite）を使うため、DBアクセス中もイベントループを止めない。
+    環境計測値配信バス、ActuatorStateRegistry、ControlCurveCacheへの通知は同期版と同じ。
+    """
+    def __init__(self, db):
+        self.db = db
+
+    async def create_env_values(self, values: ds) -> ds:
+        """WatchOverから送信されてきた環境情報をenvironment_valuesテーブルへ追加する
+        登録した環境情報は、環境計測値配信バスで各制御機器へ通知する
+        古い環境情報はEnvironmentHistoryが保持期間を過ぎてから削除する
+
+        Args:
+            values (DeviceSchemas): 環境情報
+
+        Returns:
+            ds: 登録した環境情報
+        """
+        # DeviceSchemasからEnvironmentValuesへデータ変換する
+        vals = ev()
+        vals.temperature = values.temp
+        vals.humidity = values.hum
+        vals.moisture = values.mstr_0
+        vals.lux = values.lux
+        vals.updated = values.now
+
+        environment_history.ensure_schema()
+        self.db.add(vals)
+        # 1分・10分・1時間の集計に加算する（同じトランザクションでコミットする）
+        for rollup in build_rollup_upserts([values]):
+            await self.db.execute(rollup)
+        await self.db.commit()
+
+        # 各制御機器へ最新の環境情報を通知する
+        environment_bus.publish(EnvironmentSnapshot.from_schema(values))
+
+        return values
+
+    async def create_env_values_batch(self, readings: list) -> ds:
+        """まとめて送信されてきた環境情報を、1トランザクションでenvironment_valuesテーブルへ追加する
+        WatchOverが通信断から復帰したときに、未送信の環境情報を再送するために使う
+        制御機器へは、最も新しい環境情報だけを通知する
+
+        Args:
+            readings (list): [DeviceSchemas, ...]
+
+        Returns:
+            ds: 最も新しい環境情報, 環境情報が無い場合はNone
+        """
+        if len(readings) == 0:
+            return None
+
+        environment_history.ensure_schema()
+        await self.db.execute(insert(ev), [
+            {
+                'temperature': values.temp,
+                'humidity': values.hum,
+                'moisture': values.mstr_0,
+                'lux': values.lux,
+                'updated': values.now,
+            } for values in readings])
+        # 1分・10分・1時間の集計は、区間ごとにまとめてから加算する
+        for rollup in build_rollup_upserts(readings):
+            await self.db.execute(rollup)
+        await self.db.commit()
+
+        # 計測年月日時刻の最も新しい環境情報だけを通知する（同時刻の場合は後に送信されたもの）
+        # 既に受信している計測値の方が新しい場合は通知しない
+        latest = max(reversed(readings), key=lambda values: values.now)
+        environment_bus.publish_if_newer(EnvironmentSnapshot.from_schema(latest))
+
+        return latest
+
+    async def get_actuators_info(self) -> ass:
+        """各制御装置の稼働状況を取得する。
+        取得テーブル: actuator_states
+
+        Returns:
+            ass: 各制御装置の稼働状況リスト
+        """
+        result = await self.db.execute(
+            select(ast.actuator_id,
+                   ast.state,
+                   ast.aperture,
+                   ast.actuator_name,
+                   ast.adjust_value,
+                   ast.group_no)
+            .where(and_(ast.class_name != "", ast.class_name.is_not(None))))
+
+        list_ss = []
+        for val in result.all():
+            # 開度は、未書き込みのものを含めた最新の値を返す
+            item = ss(actuator_id=val.actuator_id,
+                    state=val.state,
+                    aperture=aperture_store.get(val.actuator_id, val.aperture),
+                    actuator_name=val.actuator_name,
+                    adjust_value=val.adjust_value,
+                    group_no=val.group_no) # type: ignore
+            list_ss.append(item)
+
+        return ass(actuators=list_ss)
+
+    async def get_actuator_info(self, id: str) -> ss:
+        """指定したidをもつ制御装置の稼働状況を取得する。
+        取得テーブル: actuator_states
+
+        Args:
+            id (str): 制御機器ID
+
+        Returns:
+            StateSchema: 制御装置の稼働状況
+        """
+        actuator = await self.db.scalar(
+            select(ast).where(and_(
+                ast.actuator_id == id,
+                ast.class_name != "",
+                ast.class_name.is_not(None))))
+
+        return ss(actuator_id=actuator.actuator_id,
+                state=actuator.state,
+                aperture=aperture_store.get(actuator.actuator_id, actuator.aperture),
+                actuator_name=actuator.actuator_name,
+                adjust_value=actuator.adjust_value,
+                group_no=actuator.group_no)
+
+    async def get_actuators_gpiono(self, id: str) -> ags:
+        """対象の制御器が使用するＧＰＩＯ番号を取得する
+
+        Args:
+            id (str): 制御機器ＩＤ
+
+        Returns:
+            ags: GPIO番号リスト
+        """
+        result = await self.db.execute(
+            select(agn.actuator_id, agn.gpio_no, agn.state).where(agn.actuator_id == id))
+
+        list_gs = [gs(actuator_id=val.actuator_id, gpio_no=val.gpio_no, state=val.state) # type: ignore
+                   for val in result.all()]
+
+        return ags(gpionos=list_gs)
+
+    async def get_device_step_values(self, id: str) -> dcs:
+        """device_control_tableから、指定したidをもつデータを抽出する
+
+        Args:
+            id (str): 制御機器ID(actuator_id)
+
+        Returns:
+            dcs: class DeviceControlSchemaの内容をjsonに変換したデータ
+        """
+        rows = await self.db.scalars(select(dct).where(dct.actuator_id == id))
+
+        return dcs(devctrls=[to_step_values_schema(val) for val in rows.all()])
+
+    async def update_actuator_mode(self, id: str, mode: int) -> ss:
+        """対象の制御機器の稼働状態を更新する
+        actuator_statesテーブルとActuatorStateRegistryを更新し、
+        対象の制御機器へ通知する
+
+        Args:
+            id (str): 対象制御機器ID
+            mode (int): 更新する稼働状態
+
+        Returns:
+            ss: actuator.stateを指定したmodeで更新した対象制御機器情報
+        """
+        try:
+            actuator = await self.db.scalar(select(ast).where(ast.actuator_id == id))
+
+            ret = ss(actuator_id=actuator.actuator_id,
+                    state=actuator.state,
+                    aperture=actuator.aperture,
+                    actuator_name=actuator.actuator_name,
+                    adjust_value=actuator.adjust_value,
+                    group_no=actuator.adjust_value)
+
+            actuator.state = mode
+            await self.db.commit()
+            ret.state = mode
+
+            # 対象の制御機器へ稼働状態の変更を即座に通知する
+            actuator_state_registry.update(id, mode)
+
+            return ret
+        except (
+                sqlalchemy.orm.exc.StaleDataError, \
+                sqlalchemy.exc.ArgumentError, \
+                sqlalchemy.exc.OperationalError, \
+                sqlalchemy.exc.IntegrityError
+            ) as err:
+            await self.db.rollback()
+            print(f'{err}')
+            raise
+
+    async def update_device_control(self, id: str, pattern: int, updateData: dict) -> bool:
+        """段階別データ更新処理
+            device_control_tableのデータを更新する
+
+        Args:
+            id (str): 制御機器ID
+            pattern (int): パターン№
+            updateData (dict): 更新データ
+
+        Returns:
+            bool: 更新が成功した場合はTrue、対象データが無い場合はFalse
+        """
+        try:
+            row = await self.db.scalar(
+                select(dct).where(and_(dct.actuator_id == id, dct.pattern_id == pattern)))
+
+            if row is None:
+                return False
+
+            apply_device_control(row, updateData)
+            await self.db.commit()
+
+            # コンパイル済みの段階別設定を破棄し、ETagを更新する
+            control_curve_cache.invalidate(id)
+            change_versions.bump('device_control_table', id)
+            return True
+        except (
+                sqlalchemy.orm.exc.StaleDataError, \
+                sqlalchemy.exc.ArgumentError, \
+                sqlalchemy.exc.OperationalError, \
+                sqlalchemy.exc.IntegrityError
+            ) as err:
+            await self.db.rollback()
+            print(f'{err}')
+            raise
@@ -0,0 +1,226 @@
+"""仮想時刻で制御機器を実行するシミュレーション
+VirtualTimeLoop（仮想時刻のイベントループ）、FakeChipBackend（GPIO出力の記録）、
+台本どおりの環境計測値・稼働状態の変更で、actuator_statesに登録された制御機器のタスクをそのまま実行する。
+24時間分の動作を数秒で実行できるため、回帰試験や性能試験に使う。
+
+開度の書き込み等でDBを更新するため、DATABASE_URLにはDBのコピーを指定して実行すること。
+"""
+import asyncio
+import contextlib
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from gpiod.line import Value
+from actuator_manager import ActuatorManager
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.actuator_supervisor import actuator_supervisor
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.calc_aperture import control_curve_cache
+from actuators.base_actuators.environment_bus import EnvironmentSnapshot, environment_bus
+from actuators.base_actuators.gpio_line_manager import FakeChipBackend, gpio_line_manager
+from actuators.base_actuators.tick_scheduler import tick_scheduler
+from actuators.base_actuators.virtual_clock import VirtualTimeLoop
+from actuators.irrigation.irrigation_scheduler import irrigation_scheduler
+from services.environment_history import UPDATED_FORMAT
+
+
+@dataclass(frozen=True)
+class LineTransition:
+    """GPIO出力の変化1件
+    """
+    at: datetime        # 年月日時刻（仮想時刻）
+    consumer: str       # 制御機器ID
+    gpio_no: int        # GPIO番号
+    value: Value        # 出力値
+
+
+@dataclass
+class SimulationResult:
+    """シミュレーションの結果
+    """
+    start: datetime                 # 開始年月日時刻（仮想時刻）
+    duration: float                 # シミュレーションした秒数（仮想時刻）
+    elapsed: float                  # 実行にかかった秒数（実時間）
+    transitions: list = field(default_factory=list)     # [LineTransition, ...]
+    apertures: dict = field(default_factory=dict)       # {制御機器ID: 終了時の開度}
+    health: dict = field(default_factory=dict)          # actuator_supervisor.stats()
+    ticks: dict = field(default_factory=dict)           # tick_scheduler.stats()
+
+    def line_transitions(self, gpio_no: int) -> list:
+        """指定したGPIO番号の出力の変化を取得する
+
+        Args:
+            gpio_no (int): GPIO番号
+
+        Returns:
+            list: [LineTransition, ...]
+        """
+        return [transition for transition in self.transitions if transition.gpio_no == gpio_no]
+
+    def active_seconds(self, gpio_no: int) -> float:
+        """指定したGPIO番号がACTIVEだった秒数を求める
+
+        Args:
+            gpio_no (int): GPIO番号
+
+        Returns:
+            float: ACTIVEの秒数（終了時にACTIVEの場合は終了時刻まで）
+        """
+        total = 0.0
+        since = None
+        for transition in self.line_transitions(gpio_no):
+            if transition.value == Value.ACTIVE and since is None:
+                since = transition.at
+            elif transition.value != Value.ACTIVE and since is not None:
+                total += (transition.at - since).total_seconds()
+                since = None
+
+        if since is not None:
+            total += (self.start + timedelta(seconds=self.duration) - since).total_seconds()
+
+        return total
+
+
+class ActuatorSimulation:
+    """制御機器のタスクを仮想時刻で実行する
+    environmentとstatesは、開始からの秒数順に並べた台本（ジェネレータも使用できる）。
+    """
+    def __init__(self,
+                 start: datetime,
+                 duration: float,
+                 environment=(),
+                 states=(),
+                 quiet: bool = True) -> None:
+        """初期化処理
+
+        Args:
+            start (datetime): 開始年月日時刻（仮想時刻）
+            duration (float): シミュレーションする秒数
+            environment (iterable): 環境計測値の台本 [(開始からの秒数, {'temperature': 25.0, 'humidity': 60.0,
+                                    'moisture': 0.9, 'lux': 300.0}), ...]
+            states (iterable): 稼働状態の変更の台本 [(開始からの秒数, 制御機器ID, 稼働状態), ...]
+            quiet (bool, optional): True:制御機器のprint出力を捨てる
+        """
+        self.start = start
+        self.duration = duration
+        self.environment = environment
+        self.states = states
+        self.quiet = quiet
+        self.actuator_ids = []      # 実行した制御機器ID
+        self.ticks = {}             # 終了時のtick_scheduler.stats()
+
+    def run(self) -> SimulationResult:
+        """シミュレーションを実行する
+
+        Returns:
+            SimulationResult: 結果
+        """
+        loop = VirtualTimeLoop(self.start)
+        backend = FakeChipBackend(clock=loop.time)
+        previous_backend = gpio_line_manager.backend
+        previous_clocks = (irrigation_scheduler.clock, control_curve_cache.clock)
+
+        gpio_line_manager.set_backend(backend)
+        irrigation_scheduler.clock = loop.now
+        control_curve_cache.clock = loop.now
+
+        started = time.perf_counter()
+        try:
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull) if self.quiet else contextlib.nullcontext():
+                loop.run_until_complete(self.main())
+        finally:
+            loop.close()
+            gpio_line_manager.set_backend(previous_backend)
+            irrigation_scheduler.clock, control_curve_cache.clock = previous_clocks
+
+        transitions = [LineTransition(self.start + timedelta(seconds=at), consumer, gpio_no, value)
+                       for at, consumer, gpio_no, value in backend.transitions]
+
+        return SimulationResult(
+            start=self.start,
+            duration=self.duration,
+            elapsed=time.perf_counter() - started,
+            transitions=transitions,
+            apertures={id: aperture_store.get(id) for id in self.actuator_ids
+                       if aperture_store.get(id) is not None},
+            health=actuator_supervisor.stats(),
+            ticks=self.ticks)
+
+    async def main(self):
+        """台本を再生しながら、制御機器を実行する
+        """
+        loop = asyncio.get_running_loop()
+        environment = iter(self.environment)
+        states = iter(self.states)
+
+        # 制御機器は起動時に環境計測値を参照するため、開始時刻までの計測値を先に配信する
+        actuator_state_registry.load()
+        pending_reading = self.publish_until(environment, 0)
+        pending_state = self.update_until(states, 0)
+
+        await irrigation_scheduler.load()
+        manager = ActuatorManager(loop)
+        await manager.reconcile()
+        scheduler = loop.create_task(irrigation_scheduler.run())
+
+        try:
+            while loop.time() < self.duration:
+                # 次の台本の時刻（無ければ終了時刻）まで、制御機器を実行する
+                nexts = [item[0] for item in (pending_reading, pending_state) if item is not None]
+                await asyncio.sleep(max(min(nexts + [self.duration]) - loop.time(), 0))
+
+                pending_reading = self.publish_until(environment, loop.time(), pending_reading)
+                pending_state = self.update_until(states, loop.time(), pending_state)
+
+            self.actuator_ids = list(manager.configs.keys())
+            # 制御機器の終了で周期実行タイマーは削除されるため、終了前に取得する
+            self.ticks = tick_scheduler.stats()
+        finally:
+            scheduler.cancel()
+            await asyncio.gather(scheduler, return_exceptions=True)
+            await manager.shutdown()
+
+    def publish_until(self, environment, now: float, pending: tuple = None) -> tuple:
+        """指定した時刻までの環境計測値を配信する
+
+        Args:
+            environment (iterator): 環境計測値の台本
+            now (float): 開始からの秒数
+            pending (tuple, optional): 前回読み込んで、まだ配信していない計測値
+
+        Returns:
+            tuple: 次に配信する計測値 (秒数, 計測値), 台本の終わりに達した場合はNone
+        """
+        item = pending if pending is not None else next(environment, None)
+        while item is not None and item[0] <= now:
+            at, values = item
+            environment_bus.publish(EnvironmentSnapshot(
+                temperature=values.get('temperature'),
+                humidity=values.get('humidity'),
+                moisture=values.get('moisture'),
+                lux=values.get('lux'),
+                updated=(self.start + timedelta(seconds=at)).strftime(UPDATED_FORMAT)))
+            item = next(environment, None)
+
+        return item
+
+    def update_until(self, states, now: float, pending: tuple = None) -> tuple:
+        """指定した時刻までの稼働状態の変更を反映する
+
+        Args:
+            states (iterator): 稼働状態の変更の台本
+            now (float): 開始からの秒数
+            pending (tuple, optional): 前回読み込んで、まだ反映していない変更
+
+        Returns:
+            tuple: 次に反映する変更 (秒数, 制御機器ID, 稼働状態), 台本の終わりに達した場合はNone
+        """
+        item = pending if pending is not None else next(states, None)
+        while item is not None and item[0] <= now:
+            at, actuator_id, state = item
+            actuator_state_registry.update(actuator_id, state)
+            item = next(states, None)
+
+        return item
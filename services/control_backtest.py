@@ -0,0 +1,394 @@
+"""環境計測値の履歴を段階別設定（device_control_table）で再生するバックテスト
+各制御機器が、記録された環境計測値に対してどのように動作したかを再現し、
+開度・オンオフのタイムライン、モータの動作秒数、反転回数を求める。
+/update_device_control/ で反映する前に、候補の段階別設定を比較するために使う。
+
+    python -m services.control_backtest --start '2024-06-01 00:00:00' --end '2024-07-01 00:00:00' \
+        [--ids blkcrtn_01,sdwnd_01] [--tables candidate.json] [--timeline timeline.csv]
+"""
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from database.db_access import get_session
+from models.actuator_models import ActuatorStates as ast, EnvironmentValues as ev
+from actuators.base_actuators.calc_aperture import ControlCurve, get_degrees_apertures
+from actuators.base_actuators.environment_bus import EnvironmentSnapshot
+from services.environment_history import UPDATED_FORMAT
+
+MOTOR: str = 'motor'        # 開度を動作時間で制御する（遮光カーテン、側窓）
+ON_OFF: str = 'on_off'      # オンオフ制御（循環扇）
+
+# 再生できる制御機器クラスと、判定に使う環境計測値・制御方式
+BACKTEST_INPUTS = {
+    'BlackoutCurtain': ('lux', MOTOR),
+    'SideWindow1': ('temperature', MOTOR),
+    'CirculatorFan': ('temperature', ON_OFF),
+}
+
+# /update_device_control/ のupdateDataの項目名（apply_device_controlと同じ）
+STAGE_KEYS = ['first', 'second', 'third', 'forth', 'fifth']
+
+
+@dataclass(frozen=True)
+class BacktestEvent:
+    """タイムラインの1件（モータの起動・目標変更・停止、オンオフの切り替え）
+    モータの開度は、起動から停止まで一定の速さで変化する
+    """
+    actuator_id: str
+    at: datetime            # 年月日時刻
+    event: str              # 'start', 'retarget', 'stop', 'move'（全開時間が未設定）, 'on', 'off'
+    position: float         # その時点の開度（オンオフは 1:オン, 0:オフ）
+    target: float           # 目標開度（オンオフは 1:オン, 0:オフ）
+    value: float = None     # 判定に使った環境計測値（停止はNone）
+
+
+@dataclass
+class BacktestResult:
+    """制御機器1台分の集計
+    """
+    actuator_id: str
+    kind: str                   # MOTOR, ON_OFF
+    readings: int = 0           # 判定した環境計測値の件数
+    starts: int = 0             # モータの起動回数
+    reversals: int = 0          # 前回と逆方向にモータを起動した回数
+    run_seconds: float = 0.0    # モータの動作秒数
+    switches: int = 0           # オンオフの切り替え回数
+    on_seconds: float = 0.0     # オンの秒数
+    final: float = None         # 最後の開度（オンオフは 1:オン, 0:オフ）
+
+
+class MotorBacktest:
+    """遮光カーテン・側窓（MotorPositioner）の動作を再現する
+    計測値を受け取るたびにget_apertureで目標開度を求め、
+        停止中: 目標開度が現在開度と異なれば起動する
+        動作中: 同じ方向の先の目標であれば目標を変更し、そうでなければ停止して（逆方向へ）起動し直す
+    動作時間は |目標開度 - 現在開度| ＊ 全開時間 / 100 とする。
+    """
+    kind = MOTOR
+
+    def __init__(self, actuator_id: str, curve: ControlCurve, field: str,
+                 full_travel_time: float, aperture: float) -> None:
+        """初期化処理
+
+        Args:
+            actuator_id (str): 制御機器ID
+            curve (ControlCurve): 段階別設定
+            field (str): 判定に使う環境計測値 'lux', 'temperature'
+            full_travel_time (float): 全開時間（actuator_states.adjust_value）
+            aperture (float): 開始時の開度
+        """
+        self.curve = curve
+        self.field = field
+        self.full_travel_time = float(full_travel_time or 0)
+        self.position = min(max(float(aperture or 0), 0), 100)
+        self.target: float = None
+        self.direction = 0          # 1:開く, -1:閉じる, 0:停止中
+        self.last_direction = 0     # 最後に起動した方向
+        self.at: datetime = None    # 最後に判定した年月日時刻
+        self.result = BacktestResult(actuator_id, self.kind)
+
+    def advance(self, at: datetime) -> list:
+        """指定した時刻までモータを動かす
+
+        Args:
+            at (datetime): 年月日時刻
+
+        Returns:
+            list: 目標開度に達した場合は停止のBacktestEvent
+        """
+        events = []
+
+        if self.direction != 0 and self.at is not None:
+            elapsed = max((at - self.at).total_seconds(), 0.0)
+            unit_time = self.full_travel_time / 100
+            need = abs(self.target - self.position) * unit_time
+
+            if elapsed >= need:
+                self.result.run_seconds += need
+                self.position = self.target
+                self.direction = 0
+                events.append(BacktestEvent(
+                    self.result.actuator_id, self.at + timedelta(seconds=need), 'stop', self.position, self.target))
+            else:
+                self.result.run_seconds += elapsed
+                self.position += self.direction * elapsed / unit_time
+
+        self.at = at
+        return events
+
+    def step(self, at: datetime, snapshot: EnvironmentSnapshot) -> list:
+        """環境計測値を1件再生する
+
+        Args:
+            at (datetime): 計測年月日時刻
+            snapshot (EnvironmentSnapshot): 環境計測値
+
+        Returns:
+            list: BacktestEventのリスト
+        """
+        events = self.advance(at)
+
+        value = getattr(snapshot, self.field)
+        if value is None:
+            return events
+
+        self.result.readings += 1
+        actuator_id = self.result.actuator_id
+        # MotorPositionerと同じく、目標開度は0 to 100に丸める
+        target = min(max(self.curve.get_aperture(value, self.position, at), 0), 100)
+        direction = (target > self.position) - (target < self.position)
+
+        if self.direction != 0:
+            if direction == self.direction:
+                if target != self.target:
+                    self.target = target
+                    events.append(BacktestEvent(actuator_id, at, 'retarget', self.position, target, value))
+                return events
+
+            # 目標に達した、または逆方向の目標のため停止する
+            self.direction = 0
+            events.append(BacktestEvent(actuator_id, at, 'stop', self.position, self.target))
+
+        if direction == 0:
+            return events
+
+        if self.full_travel_time <= 0:
+            # 全開時間が未設定の場合は、動作させずに開度だけ更新する
+            self.position = target
+            events.append(BacktestEvent(actuator_id, at, 'move', target, target, value))
+            return events
+
+        if self.last_direction not in (0, direction):
+            self.result.reversals += 1
+
+        self.result.starts += 1
+        self.direction = self.last_direction = direction
+        self.target = target
+        events.append(BacktestEvent(actuator_id, at, 'start', self.position, target, value))
+
+        return events
+
+    def finish(self) -> BacktestResult:
+        self.result.final = self.position
+        return self.result
+
+
+class OnOffBacktest:
+    """循環扇（on_off_condition_judgement）の動作を再現する
+    開始時はオフとする
+    """
+    kind = ON_OFF
+
+    def __init__(self, actuator_id: str, curve: ControlCurve, field: str) -> None:
+        self.curve = curve
+        self.field = field
+        self.on = False
+        self.at: datetime = None
+        self.result = BacktestResult(actuator_id, self.kind)
+
+    def step(self, at: datetime, snapshot: EnvironmentSnapshot) -> list:
+        """環境計測値を1件再生する
+
+        Args:
+            at (datetime): 計測年月日時刻
+            snapshot (EnvironmentSnapshot): 環境計測値
+
+        Returns:
+            list: BacktestEventのリスト
+        """
+        if self.on and self.at is not None:
+            self.result.on_seconds += max((at - self.at).total_seconds(), 0.0)
+        self.at = at
+
+        value = getattr(snapshot, self.field)
+        if value is None:
+            return []
+
+        self.result.readings += 1
+        on = bool(self.curve.on_off(value))
+        if on == self.on:
+            return []
+
+        self.on = on
+        self.result.switches += 1
+        state = 1.0 if on else 0.0
+
+        return [BacktestEvent(self.result.actuator_id, at, 'on' if on else 'off', state, state, value)]
+
+    def finish(self) -> BacktestResult:
+        self.result.final = 1.0 if self.on else 0.0
+        return self.result
+
+
+def candidate_rows(rows: list, pattern: int, update_data: dict) -> list:
+    """get_degrees_apertures()の抽出結果の1パターンを、候補の段階別設定に置き換える
+
+    Args:
+        rows (list): (パターンid, stageリスト, apertureリスト)のリスト
+        pattern (int): パターン№
+        update_data (dict): /update_device_control/ のupdateData ex.{'first_stage': 28.0, 'first_value': 70.0, ...}
+
+    Returns:
+        list: 置き換えたリスト（パターンが無い場合は末尾に追加する）
+    """
+    # apply_device_controlと同じく、指定のない項目は0とする
+    row = (pattern,
+           [update_data.get(f'{key}_stage', 0) for key in STAGE_KEYS],
+           [update_data.get(f'{key}_value', 0) for key in STAGE_KEYS])
+
+    replaced = [row if pattern_id == pattern else (pattern_id, stages, apertures)
+                for pattern_id, stages, apertures in rows]
+    if all(pattern_id != pattern for pattern_id, _, _ in rows):
+        replaced.append(row)
+
+    return replaced
+
+def load_models(actuator_ids: list = None, candidates: list = None) -> list:
+    """actuator_states, device_control_tableから再生する制御機器を読み込む
+
+    Args:
+        actuator_ids (list, optional): 制御機器IDのリスト. Noneの場合は再生できる全ての制御機器
+        candidates (list, optional): 候補の段階別設定. /update_device_control/ と同じ形式のリスト
+            [{'id': 'sdwnd_01', 'pattern': 0, 'updateData': {...}}, ...]
+
+    Returns:
+        list: MotorBacktest, OnOffBacktestのリスト
+    """
+    with get_session() as db:
+        rows = db.execute(
+            select(ast.actuator_id, ast.class_name, ast.aperture, ast.adjust_value)
+            .where(ast.class_name.in_(list(BACKTEST_INPUTS.keys())))
+            .order_by(ast.actuator_id)).all()
+
+    models = []
+    for row in rows:
+        if actuator_ids is not None and row.actuator_id not in actuator_ids:
+            continue
+
+        tables = list(get_degrees_apertures(row.actuator_id))
+        for candidate in candidates or []:
+            if candidate['id'] == row.actuator_id:
+                tables = candidate_rows(tables, int(candidate['pattern']), candidate['updateData'])
+
+        if len(tables) == 0:
+            print(f'{row.actuator_id}: device_control_tableが未設定のため再生しません。')
+            continue
+
+        curve = ControlCurve.compile(row.actuator_id, tables)
+        field, kind = BACKTEST_INPUTS[row.class_name]
+        if kind == MOTOR:
+            models.append(MotorBacktest(row.actuator_id, curve, field, row.adjust_value, row.aperture))
+        else:
+            models.append(OnOffBacktest(row.actuator_id, curve, field))
+
+    return models
+
+def iter_environment_values(start: str = None, end: str = None, batch: int = 1000):
+    """environment_valuesテーブルの計測値を、計測年月日時刻順に少しずつ読み込む
+
+    Args:
+        start (str, optional): 期間の開始年月日時刻（この時刻を含む） ex.'2024-06-20 00:00:00'
+        end (str, optional): 期間の終了年月日時刻（この時刻を含まない）
+        batch (int, optional): 1回に読み込む件数
+
+    Yields:
+        EnvironmentSnapshot: 環境計測値
+    """
+    stmt = select(ev).order_by(ev.updated, ev.id).execution_options(yield_per=batch)
+    if start is not None:
+        stmt = stmt.where(ev.updated >= start)
+    if end is not None:
+        stmt = stmt.where(ev.updated < end)
+
+    with get_session() as db:
+        for row in db.scalars(stmt):
+            yield EnvironmentSnapshot.from_model(row)
+            # 読み込んだレコードを保持しない
+            db.expunge(row)
+
+
+class ControlBacktest:
+    """計測値の履歴を、複数の制御機器へ順に再生する
+    制御機器ごとの状態と集計だけを保持するため、履歴の件数によらずメモリ使用量は一定。
+    タイムラインはrun()が順に返す。
+    """
+    def __init__(self, models: list) -> None:
+        self.models = models
+        self.skipped = 0    # 計測年月日時刻を解釈できなかった件数
+
+    def run(self, snapshots):
+        """計測値を再生する
+
+        Args:
+            snapshots (iterable): 計測年月日時刻順のEnvironmentSnapshot
+
+        Yields:
+            BacktestEvent: タイムライン
+        """
+        for snapshot in snapshots:
+            try:
+                at = datetime.strptime(snapshot.updated, UPDATED_FORMAT)
+            except (TypeError, ValueError):
+                self.skipped += 1
+                continue
+
+            for model in self.models:
+                yield from model.step(at, snapshot)
+
+    def results(self) -> list:
+        """制御機器ごとの集計を取得する
+
+        Returns:
+            list: BacktestResultのリスト
+        """
+        return [model.finish() for model in self.models]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='環境計測値の履歴を段階別設定で再生する')
+    parser.add_argument('--start', help="期間の開始年月日時刻 ex.'2024-06-20 00:00:00'")
+    parser.add_argument('--end', help='期間の終了年月日時刻（この時刻を含まない）')
+    parser.add_argument('--ids', help='制御機器ID（カンマ区切り）. 省略時は全ての制御機器')
+    parser.add_argument('--tables', help='候補の段階別設定（/update_device_control/ と同じ形式のJSONリスト）')
+    parser.add_argument('--timeline', help='タイムラインを書き込むCSVファイル')
+    args = parser.parse_args(argv)
+
+    candidates = None
+    if args.tables is not None:
+        with open(args.tables, encoding='utf-8') as f:
+            candidates = json.load(f)
+
+    ids = args.ids.split(',') if args.ids else None
+    backtest = ControlBacktest(load_models(ids, candidates))
+    events = backtest.run(iter_environment_values(args.start, args.end))
+
+    if args.timeline is not None:
+        with open(args.timeline, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['actuator_id', 'at', 'event', 'position', 'target', 'value'])
+            for event in events:
+                writer.writerow([event.actuator_id, event.at.strftime(UPDATED_FORMAT), event.event,
+                                 round(event.position, 2), round(event.target, 2), event.value])
+    else:
+        for _ in events:
+            pass
+
+    print(f'{"actuator_id":<12} {"kind":<7} {"readings":>9} {"starts":>7} {"reversals":>9} '
+          f'{"run_sec":>10} {"switches":>8} {"on_sec":>10} {"final":>7}')
+    for result in backtest.results():
+        print(f'{result.actuator_id:<12} {result.kind:<7} {result.readings:>9} {result.starts:>7} '
+              f'{result.reversals:>9} {result.run_seconds:>10.1f} {result.switches:>8} '
+              f'{result.on_seconds:>10.1f} {result.final:>7.1f}')
+
+    if backtest.skipped > 0:
+        print(f'skipped {backtest.skipped} readings (invalid updated)')
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
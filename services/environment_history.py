@@ -0,0 +1,154 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, select
+from database.db_access import engine, get_async_session
+from models.actuator_models import EnvironmentValues as ev, EnvironmentRollup as er
+from config import settings
+
+# environment_values.updated, environment_rollups.bucket_startの書式 ex.'2024-06-27 20:48:30'
+UPDATED_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class EnvironmentHistory:
+    """environment_valuesテーブル（環境計測値の履歴）とenvironment_rollupsテーブル（集計）の保守
+    計測値は追記のみで、保持期間（settings.ENVIRONMENT_RETENTION_DAYS）を過ぎたものを
+    settings.ENVIRONMENT_PRUNE_BATCH件ずつ削除する。
+    集計は分解能ごとの保持期間（settings.ENVIRONMENT_ROLLUP_RETENTION_DAYS）で、同じく削除する。
+    1回のDELETEを小さく保つことで、計測値の登録を長く待たせない。
+    最新の計測値はEnvironmentBusが保持するため、制御機器はこのテーブルを読まない。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def ensure_schema(self):
+        """計測年月日時刻のインデックスと集計テーブルを作成する（既存のDBにも追加する）
+        """
+        with self._lock:
+            if self._ready:
+                return
+
+            er.__table__.create(bind=engine, checkfirst=True)
+            for index in ev.__table__.indexes:
+                index.create(bind=engine, checkfirst=True)
+
+            self._ready = True
+
+    def get_cutoff(self, now: datetime = None) -> str:
+        """保持期間の開始時刻を求める
+
+        Args:
+            now (datetime, optional): 現在時刻. Noneの場合はdatetime.now()
+
+        Returns:
+            str: この時刻より前の計測値を削除する, 保持期間が0以下の場合はNone
+        """
+        if settings.ENVIRONMENT_RETENTION_DAYS <= 0:
+            return None
+
+        now = now if now is not None else datetime.now()
+        return (now - timedelta(days=settings.ENVIRONMENT_RETENTION_DAYS)).strftime(UPDATED_FORMAT)
+
+    def get_rollup_cutoff(self, resolution: int, now: datetime = None) -> str:
+        """集計の保持期間の開始時刻を求める
+
+        Args:
+            resolution (int): 分解能（秒）
+            now (datetime, optional): 現在時刻. Noneの場合はdatetime.now()
+
+        Returns:
+            str: この時刻より前に始まる区間を削除する, 保持期間が0以下または未設定の場合はNone
+        """
+        days = settings.ENVIRONMENT_ROLLUP_RETENTION_DAYS.get(resolution, 0)
+        if days <= 0:
+            return None
+
+        now = now if now is not None else datetime.now()
+        return (now - timedelta(days=days)).strftime(UPDATED_FORMAT)
+
+    async def prune(self, now: datetime = None) -> int:
+        """保持期間を過ぎた計測値と集計を削除する
+        1バッチごとにコミットし、イベントループへ制御を戻す
+
+        Args:
+            now (datetime, optional): 現在時刻. Noneの場合はdatetime.now()
+
+        Returns:
+            int: 削除した件数（計測値と集計の合計）
+        """
+        now = now if now is not None else datetime.now()
+        batch = settings.ENVIRONMENT_PRUNE_BATCH
+        statements = []
+
+        cutoff = self.get_cutoff(now)
+        if cutoff is not None:
+            # インデックスを使って古い順にbatch件だけ選ぶ
+            ids = select(ev.id).where(ev.updated < cutoff).order_by(ev.updated).limit(batch)
+            statements.append(delete(ev).where(ev.id.in_(ids.scalar_subquery())))
+
+        for resolution in settings.ENVIRONMENT_ROLLUP_RESOLUTIONS:
+            cutoff = self.get_rollup_cutoff(resolution, now)
+            if cutoff is None:
+                continue
+
+            # 主キー(分解能, 区間の開始年月日時刻)の順にbatch件だけ選ぶ
+            starts = select(er.bucket_start) \
+                .where(and_(er.resolution == resolution, er.bucket_start < cutoff)) \
+                .order_by(er.bucket_start).limit(batch)
+            statements.append(delete(er).where(
+                and_(er.resolution == resolution, er.bucket_start.in_(starts.scalar_subquery()))))
+
+        if len(statements) == 0:
+            return 0
+
+        self.ensure_schema()
+        total = 0
+        for stmt in statements:
+            total += await self.delete_in_batches(stmt, batch)
+
+        return total
+
+    async def delete_in_batches(self, stmt, batch: int) -> int:
+        """batch件ずつ削除するDELETE文を、削除する行が無くなるまで実行する
+
+        Args:
+            stmt (Delete): 1回にbatch件まで削除するDELETE文
+            batch (int): 1回に削除する件数
+
+        Returns:
+            int: 削除した件数
+        """
+        total = 0
+
+        while True:
+            async with get_async_session() as db:
+                result = await db.execute(stmt)
+                await db.commit()
+
+            total += result.rowcount
+            if result.rowcount < batch:
+                return total
+
+            await asyncio.sleep(0)
+
+    async def run(self, interval: float = None):
+        """一定間隔で保持期間を過ぎた計測値と集計を削除する
+
+        Args:
+            interval (float, optional): 削除間隔（秒）. Noneの場合はsettings.ENVIRONMENT_PRUNE_INTERVAL
+        """
+        interval = interval if interval is not None else settings.ENVIRONMENT_PRUNE_INTERVAL
+
+        while True:
+            try:
+                count = await self.prune()
+                if count > 0:
+                    print(f'pruned environment_values/environment_rollups: {count}')
+            except Exception as err:
+                print(f'environment_values prune failed: {err=}, {type(err)=}')
+
+            await asyncio.sleep(interval)
+
+
+environment_history = EnvironmentHistory()
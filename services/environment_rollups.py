@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.sqlite import insert
+from models.actuator_models import EnvironmentRollup as er
+from schemas.actuator_schemas import \
+    DeviceSchemas as ds, \
+    EnvironmentRollupSchema as ers, \
+    EnvironmentRollupsSchema as erss
+from services.environment_history import UPDATED_FORMAT
+from config import settings
+
+# 集計する計測値 {集計列名の接頭辞: DeviceSchemasの項目名}
+ROLLUP_METRICS = {
+    'temperature': 'temp',
+    'humidity': 'hum',
+    'moisture': 'mstr_0',
+    'lux': 'lux',
+}
+
+def get_bucket_start(updated: datetime, resolution: int) -> datetime:
+    """計測年月日時刻が属する区間の開始年月日時刻を求める
+    区間はその日の0時から分解能ごとに区切る
+
+    Args:
+        updated (datetime): 計測年月日時刻
+        resolution (int): 分解能（秒）
+
+    Returns:
+        datetime: 区間の開始年月日時刻
+    """
+    midnight = updated.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((updated - midnight).total_seconds())
+
+    return midnight + timedelta(seconds=elapsed - elapsed % resolution)
+
+# 1回のUPSERT文に含める区間数（SQLiteのパラメータ数の上限を超えないようにする）
+ROLLUP_UPSERT_CHUNK = 500
+
+def build_rollup_upserts(readings: list) -> list:
+    """計測値で、全ての分解能の集計を更新するUPSERT文を作成する
+    同じ区間に属する計測値はまとめてから加算するため、
+    履歴（environment_values）を読み直さない
+
+    Args:
+        readings (list): [DeviceSchemas, ...]
+
+    Returns:
+        list: UPSERT文のリスト. 計測年月日時刻の形式が正しくない計測値は集計しない
+    """
+    buckets = {}    # {(分解能, 区間の開始年月日時刻): 集計}
+    for values in readings:
+        try:
+            updated = datetime.strptime(values.now, UPDATED_FORMAT)
+        except ValueError:
+            print(f'skip rollup: invalid timestamp {values.now!r}')
+            continue
+
+        for resolution in settings.ENVIRONMENT_ROLLUP_RESOLUTIONS:
+            bucket_start = get_bucket_start(updated, resolution).strftime(UPDATED_FORMAT)
+            row = buckets.get((resolution, bucket_start))
+            if row is None:
+                row = {'resolution': resolution, 'bucket_start': bucket_start, 'count': 0}
+                for metric in ROLLUP_METRICS.keys():
+                    row[f'{metric}_sum'] = 0.0
+                    row[f'{metric}_min'] = None
+                    row[f'{metric}_max'] = None
+                buckets[(resolution, bucket_start)] = row
+
+            row['count'] += 1
+            for metric, field in ROLLUP_METRICS.items():
+                value = getattr(values, field)
+                row[f'{metric}_sum'] += value
+                row[f'{metric}_min'] = value if row[f'{metric}_min'] is None else min(row[f'{metric}_min'], value)
+                row[f'{metric}_max'] = value if row[f'{metric}_max'] is None else max(row[f'{metric}_max'], value)
+
+    rows = list(buckets.values())
+    return [build_rollup_upsert(rows[i:i + ROLLUP_UPSERT_CHUNK]) for i in range(0, len(rows), ROLLUP_UPSERT_CHUNK)]
+
+def build_rollup_upsert(rows: list):
+    """集計済みの区間を、environment_rollupsへ加算するUPSERT文を作成する
+
+    Args:
+        rows (list): [{'resolution':..., 'bucket_start':..., 'count':..., 'temperature_sum':..., ...}, ...]
+
+    Returns:
+        Insert: UPSERT文
+    """
+    stmt = insert(er).values(rows)
+    excluded = stmt.excluded
+
+    updates = {'count': er.count + excluded.count}
+    for metric in ROLLUP_METRICS.keys():
+        updates[f'{metric}_sum'] = getattr(er, f'{metric}_sum') + getattr(excluded, f'{metric}_sum')
+        updates[f'{metric}_min'] = func.min(getattr(er, f'{metric}_min'), getattr(excluded, f'{metric}_min'))
+        updates[f'{metric}_max'] = func.max(getattr(er, f'{metric}_max'), getattr(excluded, f'{metric}_max'))
+
+    return stmt.on_conflict_do_update(index_elements=[er.resolution, er.bucket_start], set_=updates)
+
+def to_rollup_schema(row) -> ers:
+    """environment_rollupsのレコードをEnvironmentRollupSchemaへ変換する
+    """
+    item = {'resolution': row.resolution, 'bucket_start': row.bucket_start, 'count': row.count}
+    for metric in ROLLUP_METRICS.keys():
+        total = getattr(row, f'{metric}_sum')
+        item[f'{metric}_mean'] = total / row.count if total is not None and row.count > 0 else None
+        item[f'{metric}_min'] = getattr(row, f'{metric}_min')
+        item[f'{metric}_max'] = getattr(row, f'{metric}_max')
+
+    return ers(**item)
+
+
+class AsyncEnvironmentRollupService:
+    """環境計測値の集計を取得する
+    """
+    def __init__(self, db):
+        self.db = db
+
+    async def get_rollups(self, resolution: int, start: str = None, end: str = None) -> erss:
+        """分解能と期間を指定して集計を取得する
+
+        Args:
+            resolution (int): 分解能（秒） settings.ENVIRONMENT_ROLLUP_RESOLUTIONSのいずれか
+            start (str, optional): 期間の開始年月日時刻（この時刻を含む） ex.'2024-06-20 00:00:00'
+            end (str, optional): 期間の終了年月日時刻（この時刻を含まない）
+
+        Raises:
+            ValueError: 集計していない分解能
+
+        Returns:
+            EnvironmentRollupsSchema: 区間の開始年月日時刻順の集計リスト
+        """
+        if resolution not in settings.ENVIRONMENT_ROLLUP_RESOLUTIONS:
+            raise ValueError(f'集計していない分解能です: {resolution} (集計済み: {settings.ENVIRONMENT_ROLLUP_RESOLUTIONS})')
+
+        conditions = [er.resolution == resolution]
+        if start is not None:
+            conditions.append(er.bucket_start >= start)
+        if end is not None:
+            conditions.append(er.bucket_start < end)
+
+        rows = await self.db.scalars(select(er).where(and_(*conditions)).order_by(er.bucket_start))
+
+        return erss(rollups=[to_rollup_schema(row) for row in rows.all()])
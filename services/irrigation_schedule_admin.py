@@ -1,11 +1,72 @@
+import re
 import sqlalchemy
 from datetime import datetime
 from sqlite3 import IntegrityError, OperationalError, ProgrammingError
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, select, insert, update
 from database.db_access import get_session, MANUAL_IRRIGATION_TIME
 from models.actuator_models import IrrigationSchedule
 from schemas.actuator_schemas import IrrigationTimeSchema, IrrigationScheduleSchema
+from actuators.irrigation.irrigation_scheduler import irrigation_scheduler, to_irrigation_time_schema
+
+# 潅水時刻(hh:mm)の形式
+SCHEDULE_TIME_PATTERN = re.compile(r'^([01][0-9]|2[0-3]):[0-5][0-9]$')
+
+def build_schedule_mappings(id: str, schedule: dict, rows: list, now: datetime) -> tuple:
+    """潅水スケジュールの更新データを、一括UPDATE・一括INSERT用の辞書リストに変換する
+    既存の時刻は更新し、存在しない時刻(hh:mm)は追加する
+
+    Args:
+        id (str): 制御機器ID
+        schedule (dict): 更新スケジュールデータ ex.{'05:00': [0, 3], '05:01': [1, 10], ...}
+        rows (list): 制御機器IDの既存のirrigation_scheduleレコード
+        now (datetime): 更新年月日時刻
+
+    Returns:
+        tuple: (更新用辞書リスト, 追加用辞書リスト, 更新後のIrrigationTimeSchemaリスト)
+               制御機器IDのレコードが無い、または時刻の形式が正しくない場合はNone
+    """
+    if len(rows) == 0:
+        # 潅水ライン番号が分からないため追加できない
+        return None
+
+    existing = {row.start_time: row for row in rows}
+    line_no = rows[0].line_no
+
+    updates, inserts, schedules = [], [], []
+    for start_time, value in schedule.items():
+        # ex. '05:00': [0, 3] -> start_time:05:00, permission:0, irrigation_time:3
+        permission, irrigation_time = value
+        row = existing.get(start_time)
+
+        if row is not None:
+            updates.append({
+                'actuator_id': id, 'start_time': start_time,
+                'permission': permission, 'irrigation_time': irrigation_time, 'modified': now})
+            builder_cd, created, updator_cd = row.builder_cd, row.created, row.updator_cd
+        elif SCHEDULE_TIME_PATTERN.match(start_time):
+            inserts.append({
+                'actuator_id': id, 'start_time': start_time, 'line_no': line_no,
+                'permission': permission, 'irrigation_time': irrigation_time,
+                'builder_cd': '', 'created': now, 'updator_cd': '', 'modified': now})
+            builder_cd, created, updator_cd = '', now, ''
+        else:
+            return None
+
+        schedules.append(IrrigationTimeSchema(
+            actuator_id = id,                       # 制御機器ID
+            permission = permission,                # 潅水許可 0:不許可 1:許可
+            line_no = line_no,                      # 潅水ライン
+            start_time = start_time,                # 潅水時刻
+            irrigation_time = irrigation_time,      # 潅水時間
+            builder_cd = builder_cd or '',          # 作成者コード
+            created = created,                      # 作成年月日時刻
+            updator_cd = updator_cd or '',          # 更新者コード
+            modified = now                          # 更新年月日時刻
+            ))
+
+    return updates, inserts, schedules
+
 
 class IrrigationScheduleAdmin:
     def __init__(self, db: Session = None):
@@ -98,22 +159,23 @@ class IrrigationScheduleAdmin:
                 return False
             
             with get_session() as db:
-                for key, value in schedule.items():
-                    # ex. '05:00': [0, 3] -> key:05:00, value:[0, 3]
-                    row = db.query(IrrigationSchedule).filter(
-                            and_(IrrigationSchedule.actuator_id == id,
-                                 IrrigationSchedule.start_time == key)
-                        ).first()
-
-                    if row is not None:
-                        row.permission, row.irrigation_time = value
-                        
-                        row.modified = datetime.now()
-                        db.commit()
-                    else:
-                        return False
-
-                return True
+                # 1回のSELECTで既存の時刻を取得し、1トランザクションで一括更新・追加する
+                rows = db.query(IrrigationSchedule).filter(IrrigationSchedule.actuator_id == id).all()
+                mappings = build_schedule_mappings(id, schedule, rows, datetime.now())
+                if mappings is None:
+                    return False
+
+                updates, inserts, schedules = mappings
+                if len(updates) > 0:
+                    db.execute(update(IrrigationSchedule), updates)
+                if len(inserts) > 0:
+                    db.execute(insert(IrrigationSchedule), inserts)
+                db.commit()
+
+            # 潅水スケジューラのヒープへ変更を反映する
+            irrigation_scheduler.upsert_many(schedules)
+
+            return True
 
         except (
                 # データベースに接続できないエラーOperationalError
@@ -208,6 +270,7 @@ class IrrigationScheduleAdmin:
                 if row is not None:
                     row.irrigation_time = time
                     db.commit()
+                    irrigation_scheduler.upsert(to_irrigation_time_schema(row))
                     return True
                 else:
                     return False
@@ -227,4 +290,133 @@ class IrrigationScheduleAdmin:
             self.db.rollback()
             print(f'{err}')
             raise
-    
\ No newline at end of file
+    
+
+
+class AsyncIrrigationScheduleAdmin:
+    """IrrigationScheduleAdminの非同期版
+    AsyncSession（aiosqlite）を使うため、DBアクセス中もイベントループを止めない。
+    """
+    def __init__(self, db):
+        self.db = db
+
+    async def get_irrigation_time_schedule(self, line_no: int) -> IrrigationScheduleSchema:
+        """潅水スケジュールを取得する
+        指定した潅水ライン番号をもつ潅水スケジュールを
+        irrigation_scheduleテーブルから取得する
+
+        Args:
+            line_no (int): 潅水ライン番号
+
+        Returns:
+            IrrigationScheduleSchema: irrigation_scheduleリスト
+        """
+        rows = await self.db.scalars(
+            select(IrrigationSchedule).where(and_(
+                IrrigationSchedule.line_no == line_no,
+                IrrigationSchedule.start_time != MANUAL_IRRIGATION_TIME)))
+
+        list_its = []
+        for val in rows.all():
+            item = IrrigationTimeSchema(
+                actuator_id = val.actuator_id,          # 制御機器ID
+                permission = val.permission,            # 潅水許可 0:不許可 1:許可
+                line_no = val.line_no,                  # 潅水ライン
+                start_time = val.start_time,            # 潅水時刻
+                irrigation_time = val.irrigation_time,  # 潅水時間
+                builder_cd = val.builder_cd if not None else "",    # 作成者コード
+                created = val.created,                  # 作成年月日時刻
+                updator_cd = val.updator_cd if not None else "",    # 更新者コード
+                modified = val.modified                 # 更新年月日時刻
+            ) # type: ignore
+
+            list_its.append(item)
+
+        return IrrigationScheduleSchema(schedules=list_its)
+
+    async def update_irrigation_table(self, data: dict) -> bool:
+        """潅水スケジュールを更新する
+
+        Args:
+            data (dict): 更新スケジュールデータ
+                ex.{'id': 'irrgtn_01', 'schedules': {'05:00': [0, 3], '06:00': [0, 0], ...}}
+
+        Returns:
+            bool: 更新が成功した場合はTrue、失敗した場合はFalse
+        """
+        id = data.get('id', '')
+        if id is None or id == '':
+            return False
+
+        schedule = data.get('schedules', {})
+        if schedule is None or len(schedule) == 0:
+            return False
+
+        try:
+            # 1回のSELECTで既存の時刻を取得し、1トランザクションで一括更新・追加する
+            rows = (await self.db.scalars(
+                select(IrrigationSchedule).where(IrrigationSchedule.actuator_id == id))).all()
+            mappings = build_schedule_mappings(id, schedule, rows, datetime.now())
+            if mappings is None:
+                await self.db.rollback()
+                return False
+
+            updates, inserts, schedules = mappings
+            if len(updates) > 0:
+                await self.db.execute(update(IrrigationSchedule), updates)
+            if len(inserts) > 0:
+                await self.db.execute(insert(IrrigationSchedule), inserts)
+            await self.db.commit()
+
+            # 潅水スケジューラのヒープへ変更を反映する
+            irrigation_scheduler.upsert_many(schedules)
+
+            return True
+
+        except Exception as err:
+            await self.db.rollback()
+            print(f'{err}')
+            raise
+
+    async def get_irrigation_line_no(self, id: str) -> int:
+        """潅水ライン番号を取得する
+
+        Args:
+            id (str): 制御機器ID
+
+        Returns:
+            int: 潅水ライン番号, 登録されていない場合は-1
+        """
+        row = await self.db.scalar(
+            select(IrrigationSchedule).where(IrrigationSchedule.actuator_id == id).limit(1))
+
+        return row.line_no if row is not None else -1
+
+    async def set_manual_irrigtion_time(self, id: str, time: int) -> bool:
+        """手動潅水時刻を設定する
+
+        Args:
+            id (str): 制御機器ID
+            time (int): 潅水時間
+
+        Returns:
+            bool: 更新が成功した場合はTrue、失敗した場合はFalse
+        """
+        try:
+            row = await self.db.scalar(
+                select(IrrigationSchedule).where(and_(
+                    IrrigationSchedule.actuator_id == id,
+                    IrrigationSchedule.start_time == MANUAL_IRRIGATION_TIME)))
+
+            if row is None:
+                return False
+
+            row.irrigation_time = time
+            await self.db.commit()
+            irrigation_scheduler.upsert(to_irrigation_time_schema(row))
+            return True
+
+        except Exception as err:
+            await self.db.rollback()
+            print(f'{err}')
+            raise
@@ -0,0 +1,34 @@
+"""過去の環境計測値（100万件）に対する開度判定の所要時間を計測する
+1件ずつcondition_judgementを呼ぶ方法と、batch_aperture.condition_judgement_batchを比較する。
+
+    cd test && python benchmarks/bench_batch_aperture.py [count]
+"""
+import sys, os
+import time
+import numpy as np
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from actuators.base_actuators.calc_aperture import condition_judgement
+from actuators.base_actuators.batch_aperture import condition_judgement_batch
+
+STAGES = [28.0, 30.0, 33.0, 35.0, 39.0]
+APERTURES = [70.0, 50.0, 20.0, 8.0, 0.0]
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    values = np.random.default_rng(0).uniform(15.0, 45.0, count)
+
+    started = time.perf_counter()
+    expected = [condition_judgement(v, STAGES, 0, APERTURES) for v in values.tolist()]
+    scalar = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = condition_judgement_batch(values, STAGES, 0, APERTURES)
+    batch = time.perf_counter() - started
+
+    assert expected == result.tolist()
+
+    print(f'{count} readings:')
+    print(f'  condition_judgement (loop) : {scalar * 1e3:9.1f} ms')
+    print(f'  condition_judgement_batch  : {batch * 1e3:9.1f} ms')
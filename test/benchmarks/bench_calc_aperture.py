@@ -0,0 +1,62 @@
+"""calc_aperture.get_apertureの1回あたりの所要時間を計測する
+device_control_tableを毎回読み込む従来の方法と、
+コンパイル済みのControlCurveを使う方法を比較する。
+
+    cd test && python benchmarks/bench_calc_aperture.py
+"""
+import sys, os
+import timeit
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from actuators.base_actuators.calc_aperture import \
+    PATTERN_LUX, \
+    PATTERN_TEMP, \
+    PATTERN_TIME, \
+    build_states, \
+    control_curve_cache, \
+    get_aperture, \
+    get_day_or_night_aperture, \
+    get_degrees_apertures, \
+    get_new_aperture, \
+    get_temperature_aperture
+
+CALLS = 2000
+
+def legacy_get_aperture(id: str, value: float, now_aperture: float) -> float:
+    """キャッシュ導入前のget_aperture"""
+    states = build_states(get_degrees_apertures(id))
+
+    if str(PATTERN_TIME) in states:
+        return get_day_or_night_aperture(states)
+    elif str(PATTERN_LUX) in states:
+        return get_new_aperture(value, PATTERN_LUX, now_aperture, states)
+    elif str(PATTERN_TEMP) in states:
+        return get_temperature_aperture(value, PATTERN_TEMP, now_aperture, states)
+
+    return 0
+
+def pure_judgement(id: str, value: float, now_aperture: float) -> float:
+    """DB読み込みを除いた判定だけの所要時間"""
+    states = build_states(rows[id])
+
+    if str(PATTERN_LUX) in states:
+        return get_new_aperture(value, PATTERN_LUX, now_aperture, states)
+    return get_temperature_aperture(value, PATTERN_TEMP, now_aperture, states)
+
+if __name__ == "__main__":
+    cases = [('blkcrtn_01', 450.0), ('sdwnd_01', 29.0)]
+    rows = {id: list(get_degrees_apertures(id)) for id, _ in cases}
+
+    for id, value in cases:
+        assert legacy_get_aperture(id, value, 20) == get_aperture(id, value, 20)
+
+        before = timeit.timeit(lambda: legacy_get_aperture(id, value, 20), number=CALLS)
+        judge = timeit.timeit(lambda: pure_judgement(id, value, 20), number=CALLS)
+        control_curve_cache.invalidate()
+        after = timeit.timeit(lambda: get_aperture(id, value, 20), number=CALLS)
+
+        print(f'{id}:')
+        print(f'  before (query + dict + linear) : {before / CALLS * 1e6:9.2f} us/call')
+        print(f'  before (dict + linear, no DB)  : {judge / CALLS * 1e6:9.2f} us/call')
+        print(f'  after  (compiled curve)        : {after / CALLS * 1e6:9.2f} us/call')
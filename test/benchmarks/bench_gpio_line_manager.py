@@ -0,0 +1,47 @@
+"""GPIO出力1回あたりの所要時間を計測する
+チップを毎回リクエストし直す従来の方法と、GpioLineManagerで
+リクエストを保持する方法を比較する。
+
+    python test/benchmarks/bench_gpio_line_manager.py [fake|gpiod]
+"""
+import sys, os
+import timeit
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from gpiod.line import Value
+from actuators.base_actuators.gpio_line_manager import GpioLineManager, create_backend
+
+GPIO_NO = 17
+TOGGLES = 10000
+
+def per_toggle_request(backend):
+    """従来のset_line: 出力のたびにリクエストして解放する"""
+    value = Value.ACTIVE
+    for _ in range(TOGGLES):
+        request = backend.request_lines('bench', [GPIO_NO], Value.ACTIVE)
+        request.set_value(GPIO_NO, value)
+        request.release()
+        value = Value.INACTIVE if value == Value.ACTIVE else Value.ACTIVE
+
+def held_request(manager):
+    """GpioLineManager: リクエストを保持したまま出力する"""
+    value = Value.ACTIVE
+    for _ in range(TOGGLES):
+        manager.set_value(GPIO_NO, value)
+        value = Value.INACTIVE if value == Value.ACTIVE else Value.ACTIVE
+
+if __name__ == "__main__":
+    backend_name = sys.argv[1] if len(sys.argv) > 1 else 'fake'
+
+    backend = create_backend(backend_name)
+    before = timeit.timeit(lambda: per_toggle_request(backend), number=1)
+
+    manager = GpioLineManager(create_backend(backend_name))
+    manager.request('bench', [GPIO_NO])
+    after = timeit.timeit(lambda: held_request(manager), number=1)
+    manager.release_all()
+
+    print(f'backend:{backend_name} toggles:{TOGGLES}')
+    print(f'request per toggle : {before / TOGGLES * 1e6:8.2f} us/toggle')
+    print(f'held line request  : {after / TOGGLES * 1e6:8.2f} us/toggle')
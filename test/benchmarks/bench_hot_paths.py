@@ -0,0 +1,278 @@
+"""制御とデータの主要処理の所要時間を計測し、保存した基準値と比較する
+実運用規模のDB（既定で30日分・1分間隔の環境計測値と集計）を一時ディレクトリに作成して計測する。
+基準値はbaselines/bench_hot_paths.jsonに保存し、基準値のthreshold倍を超えた処理があれば終了コード1で終了する。
+基準値は計測した環境（CPU、Python）に依存するため、環境を変えたときは--updateで取り直すこと。
+
+    cd test && python benchmarks/bench_hot_paths.py [--update] [--threshold 1.5] [--only get_aperture,...]
+"""
+import sys, os
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'actuators_manage_db.sqlite')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'bench_hot_paths.json')
+# 基準値に対して、この倍率を超えたら劣化とみなす
+DEFAULT_THRESHOLD = 1.5
+REPEAT = 5
+SEED_START = datetime(2024, 6, 1, 0, 0, 0)
+SEED_BATCH = 1440
+
+def make_reading(at: datetime, i: int):
+    from schemas.actuator_schemas import DeviceSchemas
+
+    return DeviceSchemas(mstr_0=0.9, temp=20.0 + (i % 600) / 50, hum=60.0 + i % 20,
+                         lux=(i % 1440) * 0.5, now=at.strftime('%Y-%m-%d %H:%M:%S'))
+
+def seed_database(days: int) -> datetime:
+    """環境計測値の履歴と集計を、1分間隔でdays日分登録する
+
+    Returns:
+        datetime: 登録した最後の計測年月日時刻の次の時刻
+    """
+    from sqlalchemy import insert
+    from database.db_access import get_session
+    from models.actuator_models import EnvironmentValues
+    from services.environment_history import environment_history
+    from services.environment_rollups import build_rollup_upserts
+
+    environment_history.ensure_schema()
+    count = days * 1440
+    with get_session() as db:
+        for offset in range(0, count, SEED_BATCH):
+            readings = [make_reading(SEED_START + timedelta(minutes=i), i)
+                        for i in range(offset, min(offset + SEED_BATCH, count))]
+            db.execute(insert(EnvironmentValues), [
+                {'temperature': r.temp, 'humidity': r.hum, 'moisture': r.mstr_0, 'lux': r.lux, 'updated': r.now}
+                for r in readings])
+            for rollup in build_rollup_upserts(readings):
+                db.execute(rollup)
+        db.commit()
+
+    return SEED_START + timedelta(minutes=count)
+
+def measure(func, number: int) -> float:
+    """REPEAT回計測した最小値を、1回あたりのマイクロ秒で返す"""
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / number * 1e6
+
+async def measure_async(func, number: int) -> float:
+    """measureの非同期版（funcはコルーチン関数）"""
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / number * 1e6
+
+def build_cases(next_time: datetime) -> list:
+    """計測する処理の一覧を作成する
+
+    Returns:
+        list: [(名前, 呼び出し回数, 関数, 非同期かどうか), ...]
+    """
+    import httpx
+    from fastapi import FastAPI
+    from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+    from actuators.base_actuators.base_actuator import Actuator
+    from actuators.base_actuators.calc_aperture import control_curve_cache, get_aperture, get_degrees_apertures
+    from api.endpoints.actuator_endpoints import router
+    from database.db_access import get_session
+    from services.actuator_services import EnvironmentValuesService
+
+    actuator_state_registry.load()
+    control_curve_cache.invalidate()
+    actuator = Actuator('sdwnd_01')
+    times = (next_time + timedelta(seconds=i) for i in range(10 ** 9))
+
+    def create_env_values():
+        with get_session() as db:
+            EnvironmentValuesService(db).create_env_values(make_reading(next(times), 0))
+
+    # 同じ開度では更新されないため、交互に変更する
+    apertures = itertools.cycle([40.0, 60.0])
+
+    app = FastAPI()
+    app.include_router(router)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench')
+
+    def request(method: str, url: str, **kwargs):
+        async def call():
+            response = await client.request(method, url, **kwargs)
+            assert response.status_code == 200, f'{method} {url}: {response.status_code} {response.text}'
+        return call
+
+    def reading_json() -> dict:
+        return make_reading(next(times), 0).model_dump()
+
+    async def post_env_values():
+        await request('POST', '/env_values/', json=reading_json())()
+
+    async def post_env_values_batch():
+        await request('POST', '/env_values/batch/', json=[reading_json() for _ in range(60)])()
+
+    device_control = {'id': 'sdwnd_01', 'pattern': 0,
+                      'updateData': {'first_stage': 17.0, 'first_value': 20.0, 'second_stage': 28.0,
+                                     'second_value': 60.0, 'third_stage': 30.0, 'third_value': 100.0}}
+    irrigation_table = {'id': 'irrgtn_01', 'schedules': {'05:00': [1, 20], '06:00': [1, 40], '07:00': [1, 20]}}
+    rollup_range = {'resolution': 600, 'start': SEED_START.strftime('%Y-%m-%d %H:%M:%S'),
+                    'end': (SEED_START + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')}
+
+    return [
+        ('get_aperture', 20000, lambda: get_aperture('sdwnd_01', 29.0, 20.0), False),
+        ('get_degrees_apertures', 500, lambda: list(get_degrees_apertures('sdwnd_01')), False),
+        ('update_aperture', 20000, lambda: actuator.update_aperture(next(apertures)), False),
+        ('get_actuator_state', 20000, actuator.get_actuator_state, True),
+        ('create_env_values', 200, create_env_values, False),
+        ('POST /env_values/', 100, post_env_values, True),
+        ('POST /env_values/batch/ (60)', 20, post_env_values_batch, True),
+        ('GET /actuators_state/', 100, request('GET', '/actuators_state/'), True),
+        ('GET /actuator_state/', 100, request('GET', '/actuator_state/', params={'id': 'sdwnd_01'}), True),
+        ('GET /actuators_gpiono/', 100, request('GET', '/actuators_gpiono/', params={'id': 'sdwnd_01'}), True),
+        ('GET /device_steps/', 100, request('GET', '/device_steps/', params={'id': 'sdwnd_01'}), True),
+        ('PUT /actuator_mode/', 50, request('PUT', '/actuator_mode/', json={'actuator_id': 'sdwnd_01', 'mode': 1}), True),
+        ('PUT /update_device_control/', 50, request('PUT', '/update_device_control/', json=device_control), True),
+        ('GET /irrigation_schedule/', 100, request('GET', '/irrigation_schedule/', params={'line_no': 1}), True),
+        ('PUT /update_irrigation_table/', 50, request('PUT', '/update_irrigation_table/', json=irrigation_table), True),
+        ('GET /irrigation_line_no/', 100, request('GET', '/irrigation_line_no/', params={'id': 'irrgtn_01'}), True),
+        ('PUT /manual_irrigation_time/', 50,
+         request('PUT', '/manual_irrigation_time/', json={'id': 'irrgtn_01', 'time': 0}), True),
+        ('GET /actuators_health/', 200, request('GET', '/actuators_health/'), True),
+        ('GET /env_rollups/', 100, request('GET', '/env_rollups/', params=rollup_range), True),
+    ]
+
+def run_cases(cases: list) -> dict:
+    """全ての処理を計測する
+
+    Returns:
+        dict: {名前: {'us_per_call': float, 'number': int}, ...}
+    """
+    results = {}
+    loop = asyncio.new_event_loop()
+    try:
+        # エンドポイントのprint出力は捨てる
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for name, number, func, is_async in cases:
+                if is_async:
+                    us = loop.run_until_complete(measure_async(func, number))
+                else:
+                    us = measure(func, number)
+                results[name] = {'us_per_call': round(us, 3), 'number': number}
+    finally:
+        loop.close()
+
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """基準値と比較し、劣化した処理を求める
+
+    Args:
+        results (dict): run_cases()の結果
+        baseline (dict): 保存した基準値の'results'
+        threshold (float): 劣化とみなす倍率
+
+    Returns:
+        list: [(名前, 計測値, 基準値, 倍率), ...] 基準値の無い処理は含めない
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['us_per_call'] / base['us_per_call']
+        if ratio > threshold:
+            regressions.append((name, result['us_per_call'], base['us_per_call'], ratio))
+
+    return regressions
+
+def machine_info() -> dict:
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'system': platform.system()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--update', action='store_true', help='計測値で基準値を保存し直す')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='劣化とみなす倍率')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基準値のJSONファイル')
+    parser.add_argument('--output', help='計測値をJSONで書き出すファイル')
+    parser.add_argument('--days', type=int, default=30, help='登録しておく環境計測値の日数（1分間隔）')
+    parser.add_argument('--only', help='計測する処理の名前（カンマ区切り）')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_hot_paths_')
+    try:
+        db_path = os.path.join(workdir, 'bench.sqlite')
+        shutil.copyfile(DB_PATH, db_path)
+        # DBへ接続する前に、コピーしたDBを使うよう設定する
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+        started = time.perf_counter()
+        next_time = seed_database(args.days)
+        print(f'seeded {args.days * 1440} readings in {time.perf_counter() - started:.1f} s')
+
+        cases = build_cases(next_time)
+        if args.only:
+            names = set(args.only.split(','))
+            cases = [case for case in cases if case[0] in names]
+
+        results = run_cases(cases)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'machine': machine_info(), 'days': args.days, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    for name, result in results.items():
+        base = (baseline or {}).get('results', {}).get(name)
+        ratio = f'{result["us_per_call"] / base["us_per_call"]:6.2f}x' if base else '     -'
+        print(f'  {name:32} {result["us_per_call"]:12.2f} us/call  {ratio}')
+
+    if args.update:
+        if baseline is not None and args.only:
+            # 一部だけ計測した場合は、その処理の基準値だけを置き換える
+            report['results'] = {**baseline['results'], **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'baseline saved: {args.baseline}')
+        sys.exit(0)
+
+    if baseline is None:
+        print(f'no baseline: run with --update to create {args.baseline}')
+        sys.exit(0)
+
+    if baseline.get('machine') != machine_info():
+        print(f'warning: baseline was measured on {baseline.get("machine")}')
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    for name, us, base, ratio in regressions:
+        print(f'REGRESSION {name}: {us:.2f} us/call (baseline {base:.2f}, {ratio:.2f}x > {args.threshold}x)')
+
+    sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,75 @@
+"""1日分（1分刻み 1,440枠）の潅水スケジュール更新を計測する
+従来の1時刻ごとにSELECT・COMMITする方法と、
+IrrigationScheduleAdmin.update_irrigation_tableの1トランザクションの一括更新を比較する。
+DBは一時ディレクトリへコピーしたものを使い、リポジトリのDBは変更しない。
+
+    cd test && python benchmarks/bench_irrigation_bulk_update.py [repeat]
+"""
+import sys, os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'actuators_manage_db.sqlite')
+ACTUATOR_ID = 'irrgtn_01'
+
+def make_schedules(seed: int) -> dict:
+    """1分刻みの潅水スケジュールを作成する ex.{'00:00': [1, 3], '00:01': [0, 0], ...}"""
+    return {f'{m // 60:02}:{m % 60:02}': [(m + seed) % 2, (m + seed) % 30] for m in range(1440)}
+
+def update_per_row(schedules: dict):
+    """従来の方法: 1時刻ごとにSELECTしてCOMMITする"""
+    from sqlalchemy import and_
+    from database.db_access import get_session
+    from models.actuator_models import IrrigationSchedule
+
+    with get_session() as db:
+        for key, value in schedules.items():
+            row = db.query(IrrigationSchedule).filter(
+                    and_(IrrigationSchedule.actuator_id == ACTUATOR_ID,
+                         IrrigationSchedule.start_time == key)
+                ).first()
+            row.permission, row.irrigation_time = value
+            row.modified = datetime.now()
+            db.commit()
+
+def update_bulk(schedules: dict):
+    """一括更新: 1回のSELECTと1回のCOMMIT"""
+    from services.irrigation_schedule_admin import IrrigationScheduleAdmin
+
+    assert IrrigationScheduleAdmin().update_irrigation_table({'id': ACTUATOR_ID, 'schedules': schedules})
+
+def measure(func, repeat: int) -> float:
+    elapsed = []
+    for i in range(repeat):
+        schedules = make_schedules(i + 1)
+        started = time.perf_counter()
+        func(schedules)
+        elapsed.append(time.perf_counter() - started)
+
+    return min(elapsed)
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    workdir = tempfile.mkdtemp(prefix='bench_irrigation_')
+    try:
+        db_path = os.path.join(workdir, 'bench.sqlite')
+        shutil.copyfile(DB_PATH, db_path)
+        # DBへ接続する前に、コピーしたDBを使うよう設定する
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+        # 存在しない時刻の追加（初回）も一括更新で行う
+        started = time.perf_counter()
+        update_bulk(make_schedules(0))
+        print(f'insert 1440 slots (bulk)  : {(time.perf_counter() - started) * 1000:8.1f} ms')
+
+        per_row = measure(update_per_row, repeat)
+        bulk = measure(update_bulk, repeat)
+        print(f'update 1440 slots per row : {per_row * 1000:8.1f} ms')
+        print(f'update 1440 slots bulk    : {bulk * 1000:8.1f} ms  ({per_row / bulk:.1f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,149 @@
+"""SQLite接続プロファイルごとの書き込み競合を計測する
+制御機器ループ側（別スレッド）がactuator_statesへ書き込み続けている間に、
+/env_values/ へ並行してPOSTし、スループットとp99レイテンシ、エラー数を比較する。
+DBは一時ディレクトリへコピーしたものを使い、リポジトリのDBは変更しない。
+
+    cd test && python benchmarks/bench_sqlite_contention.py [requests] [concurrency]
+"""
+import sys, os
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'actuators_manage_db.sqlite')
+
+# sqlite3モジュールの既定値相当と、settingsの既定値（チューニング後）
+PROFILES = {
+    'default': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT': '5000',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_TEMP_STORE': 'DEFAULT',
+    },
+    'tuned': {},
+}
+
+WRITE_INTERVAL = 0.005  # 制御機器ループ側の書き込み間隔（秒）
+
+def actuator_writer(stop: threading.Event, counter: dict):
+    """制御機器ループ側: 開度の書き込みと稼働状態の読み込みを繰り返す"""
+    from database.db_access import get_session
+    from models.actuator_models import ActuatorStates as ast
+
+    aperture = 0
+    while not stop.is_set():
+        try:
+            with get_session() as db:
+                row = db.query(ast).filter(ast.actuator_id == 'blkcrtn_01').first()
+                row.aperture = aperture
+                db.commit()
+                db.query(ast.state).all()
+            counter['writes'] += 1
+        except Exception:
+            counter['errors'] += 1
+
+        aperture = (aperture + 1) % 100
+        time.sleep(WRITE_INTERVAL)
+
+async def post_env_values(total: int, concurrency: int) -> dict:
+    """/env_values/ へ並行してPOSTする"""
+    import asyncio
+    import httpx
+    from fastapi import FastAPI
+    from api.endpoints.actuator_endpoints import router
+
+    app = FastAPI()
+    app.include_router(router)
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def client_worker(client):
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            body = {'mstr_0': 0.9, 'temp': 20 + i % 10, 'hum': 60, 'lux': 100 + i, 'now': '2024-06-27 20:48:30'}
+            started = time.perf_counter()
+            try:
+                response = await client.post('/env_values/', json=body)
+                if response.status_code != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[client_worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'throughput': total / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'errors': errors,
+    }
+
+def run_worker(total: int, concurrency: int):
+    """子プロセス: 環境変数で指定したプロファイルで計測し、結果をJSONで出力する"""
+    import asyncio
+    from database.db_access import apply_journal_mode
+
+    # main.pyと同じく、起動時にjournal_modeを設定する
+    apply_journal_mode()
+
+    stop = threading.Event()
+    counter = {'writes': 0, 'errors': 0}
+    writer = threading.Thread(target=actuator_writer, args=(stop, counter))
+    writer.start()
+    try:
+        result = asyncio.run(post_env_values(total, concurrency))
+    finally:
+        stop.set()
+        writer.join()
+
+    result['loop_writes'] = counter['writes']
+    result['loop_errors'] = counter['errors']
+    print(json.dumps(result))
+
+def run_profile(name: str, total: int, concurrency: int) -> dict:
+    """プロファイルごとにDBをコピーし、子プロセスで計測する"""
+    workdir = tempfile.mkdtemp(prefix='bench_sqlite_')
+    try:
+        db_path = os.path.join(workdir, 'bench.sqlite')
+        shutil.copyfile(DB_PATH, db_path)
+
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', **PROFILES[name])
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', __file__, '--worker', str(total), str(concurrency)],
+            env=env, capture_output=True, text=True, check=True).stdout
+
+        return json.loads(output.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        run_worker(int(sys.argv[2]), int(sys.argv[3]))
+        sys.exit(0)
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    print(f'requests:{total} concurrency:{concurrency} loop write interval:{WRITE_INTERVAL}s')
+    for name in PROFILES.keys():
+        r = run_profile(name, total, concurrency)
+        print(f"{name:8}: {r['throughput']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  p99 {r['p99_ms']:7.1f} ms  "
+              f"errors {r['errors']}  loop writes {r['loop_writes']} (errors {r['loop_errors']})")
@@ -0,0 +1,22 @@
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+# テストはリポジトリのDBを変更しないよう、一時ディレクトリへコピーしたDBを使う
+# database.db_accessのエンジンはインポート時に作成されるため、テストモジュールを読み込む前に設定する
+# （DATABASE_URLを指定して実行した場合は、そのDBを使う）
+test_db_dir = None
+if 'DATABASE_URL' not in os.environ:
+    test_db_dir = tempfile.mkdtemp(prefix='actuators_test_')
+    test_db_path = os.path.join(test_db_dir, 'actuators_manage_db.sqlite')
+    shutil.copyfile(DB_PATH, test_db_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{test_db_path}'
+
+def pytest_sessionfinish(session, exitstatus):
+    if test_db_dir is not None:
+        shutil.rmtree(test_db_dir, ignore_errors=True)
@@ -0,0 +1,36 @@
+import sys, os
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.actuator_class_registry import ActuatorClassRegistry, ACTUATOR_CLASSES
+
+MODULE_NAME = 'actuators.irrigation.irrigation_data'
+
+def test_validate_rejects_unknown_class_name():
+    registry = ActuatorClassRegistry()
+
+    registry.validate(['BlackoutCurtain', 'SideWindow1'])
+    with pytest.raises(ValueError):
+        registry.validate(['BlackoutCurtain', 'BlackoutCurtainX'])
+
+def test_module_is_imported_only_when_requested():
+    sys.modules.pop(MODULE_NAME, None)
+    registry = ActuatorClassRegistry({'IrrigationLine': MODULE_NAME})
+    registry.validate(['IrrigationLine'])
+
+    assert MODULE_NAME not in sys.modules
+
+    cls = registry.get('IrrigationLine')
+
+    assert 'IrrigationLine' == cls.__name__
+    assert MODULE_NAME in sys.modules
+    assert 'IrrigationLine' in registry.import_times
+    assert cls is registry.get('IrrigationLine')
+
+def test_registered_classes_exist():
+    registry = ActuatorClassRegistry()
+
+    for class_name in ACTUATOR_CLASSES.keys():
+        assert class_name == registry.get(class_name).__name__
@@ -0,0 +1,110 @@
+import sys, os
+import asyncio
+from dataclasses import replace
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuator_manager import ActuatorManager, ActuatorConfig
+from actuators.base_actuators.gpio_line_manager import FakeChipBackend, gpio_line_manager
+from actuators.base_actuators.state_stream import state_stream
+
+CURTAIN = ActuatorConfig('blkcrtn_01', 'BlackoutCurtain', 0.0, 100.0, 10, (23, 24))
+FAN = ActuatorConfig('crcltn_01', 'CirculatorFan', -1.0, 0.0, 0, (17,))
+
+@pytest.fixture
+def chip():
+    chip = FakeChipBackend()
+    gpio_line_manager.set_backend(chip)
+    yield chip
+    gpio_line_manager.set_backend(None)
+
+def manager_with(configs: list) -> ActuatorManager:
+    am = ActuatorManager(asyncio.get_running_loop())
+    am.rows = {config.actuator_id: config for config in configs}
+
+    async def get_actuator_configs():
+        return dict(am.rows)
+
+    am.get_actuator_configs = get_actuator_configs
+    return am
+
+@pytest.mark.asyncio
+async def test_reconcile_starts_and_removes_only_changed_rows(chip):
+    am = manager_with([CURTAIN])
+    assert {'added': ['blkcrtn_01'], 'removed': [], 'changed': []} == await am.reconcile(strict=True)
+    curtain_task = am.tasks['blkcrtn_01']
+
+    am.rows['crcltn_01'] = FAN
+    assert {'added': ['crcltn_01'], 'removed': [], 'changed': []} == await am.reconcile()
+    assert am.tasks['blkcrtn_01'] is curtain_task
+    assert 2 == chip.request_count
+
+    del am.rows['crcltn_01']
+    assert {'added': [], 'removed': ['crcltn_01'], 'changed': []} == await am.reconcile()
+    assert 'crcltn_01' not in am.tasks
+    assert not gpio_line_manager.is_requested(17)
+    assert not curtain_task.done()
+
+    await am.shutdown()
+
+@pytest.mark.asyncio
+async def test_reconcile_restarts_changed_actuator(chip):
+    am = manager_with([CURTAIN, FAN])
+    await am.reconcile(strict=True)
+    fan_task = am.tasks['crcltn_01']
+    curtain_task = am.tasks['blkcrtn_01']
+
+    # 開度だけの変更では再初期化しない
+    am.rows['blkcrtn_01'] = replace(CURTAIN, aperture=50.0)
+    assert {'added': [], 'removed': [], 'changed': []} == await am.reconcile()
+
+    am.rows['blkcrtn_01'] = replace(CURTAIN, adjust_value=120.0)
+    assert {'added': [], 'removed': [], 'changed': ['blkcrtn_01']} == await am.reconcile()
+    await asyncio.sleep(0)
+
+    assert curtain_task.cancelled()
+    assert am.tasks['blkcrtn_01'] is not curtain_task
+    assert am.tasks['crcltn_01'] is fan_task
+
+    await am.shutdown()
+
+@pytest.mark.asyncio
+async def test_reconcile_updates_stream_groups(chip):
+    am = manager_with([replace(CURTAIN, group_no=2)])
+    await am.reconcile(strict=True)
+    curtain_task = am.tasks['blkcrtn_01']
+    client = state_stream.subscribe(3)
+    try:
+        # 後から追加した制御機器と、グループの変更を反映する（グループの変更では再初期化しない）
+        am.rows['crcltn_01'] = replace(FAN, group_no=3)
+        am.rows['blkcrtn_01'] = replace(CURTAIN, group_no=3)
+        assert {'added': ['crcltn_01'], 'removed': [], 'changed': []} == await am.reconcile()
+        assert am.tasks['blkcrtn_01'] is curtain_task
+
+        state_stream.publish('crcltn_01', state=1)
+        state_stream.publish('blkcrtn_01', state=1)
+        assert {'actuator_id': 'crcltn_01', 'group_no': 3, 'state': 1} == await client.get(1)
+        assert {'actuator_id': 'blkcrtn_01', 'group_no': 3, 'state': 1} == await client.get(1)
+
+        del am.rows['crcltn_01']
+        await am.reconcile()
+        state_stream.publish('crcltn_01', state=9)
+        assert client.queue.empty()
+    finally:
+        state_stream.unsubscribe(client)
+        await am.shutdown()
+
+@pytest.mark.asyncio
+async def test_unknown_class_name_is_skipped_after_startup(chip):
+    am = manager_with([CURTAIN])
+    await am.reconcile(strict=True)
+
+    am.rows['crcltn_01'] = replace(FAN, class_name='UnknownFan')
+    assert {'added': [], 'removed': [], 'changed': []} == await am.reconcile()
+
+    with pytest.raises(ValueError):
+        await manager_with([replace(FAN, class_name='UnknownFan')]).reconcile(strict=True)
+
+    await am.shutdown()
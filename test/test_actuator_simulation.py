@@ -0,0 +1,50 @@
+import sys, os
+from datetime import datetime
+
+import pytest
+from gpiod.line import Value
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from services.actuator_simulation import ActuatorSimulation
+
+START = datetime(2024, 6, 27, 4, 50, 0)
+SIDE_WINDOW_GPIO = (20, 21)
+IRRIGATOR_GPIO = 27
+
+def environment(duration: int, step: int = 60):
+    # 10分ごとに気温を上下させる
+    for at in range(0, duration, step):
+        yield at, {'temperature': 29.0 if (at // 600) % 2 == 0 else 18.0,
+                   'humidity': 60.0, 'moisture': 0.9, 'lux': 300.0}
+
+@pytest.fixture(autouse=True)
+def restore_states():
+    yield
+    actuator_state_registry.load()
+    for actuator_id in ('sdwnd_01', 'blkcrtn_01'):
+        actuator_state_registry.update(actuator_id, 1)
+
+def test_simulates_hours_in_seconds():
+    duration = 3 * 3600
+    result = ActuatorSimulation(START, duration, environment(duration)).run()
+
+    assert result.elapsed < 60
+    assert all(START <= t.at <= datetime(2024, 6, 27, 7, 50, 0) for t in result.transitions)
+
+    # 灌水スケジュール（05:00, 06:00, 07:00）どおりに開閉する
+    irrigations = [t.at.strftime('%H:%M') for t in result.line_transitions(IRRIGATOR_GPIO) if t.value == Value.ACTIVE]
+    assert ['05:00', '06:00', '07:00'] == irrigations
+    assert 0 < result.active_seconds(IRRIGATOR_GPIO)
+
+    # 気温の上下に合わせて側窓が開閉する
+    assert any(t.value == Value.ACTIVE for gpio in SIDE_WINDOW_GPIO for t in result.line_transitions(gpio))
+    assert 'sdwnd_01' in result.apertures
+    assert 0 < result.ticks['sdwnd_01']['ticks']
+
+def test_stopped_actuator_does_not_move():
+    duration = 3600
+    result = ActuatorSimulation(START, duration, environment(duration), states=[(0, 'sdwnd_01', 9)]).run()
+
+    assert not any(t.value == Value.ACTIVE for gpio in SIDE_WINDOW_GPIO for t in result.line_transitions(gpio))
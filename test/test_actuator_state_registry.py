@@ -0,0 +1,28 @@
+import sys, os
+import threading
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from actuators.base_actuators.actuator_state_registry import ActuatorStateRegistry
+
+def test_update_and_get():
+    registry = ActuatorStateRegistry()
+    registry.update('blkcrtn_01', settings.ACTUATOR_AUTO)
+    registry.update('blkcrtn_01', settings.ACTUATOR_FORCED_CLOSE)
+
+    assert settings.ACTUATOR_FORCED_CLOSE == registry.get('blkcrtn_01')
+
+@pytest.mark.asyncio
+async def test_update_wakes_only_target_actuator():
+    registry = ActuatorStateRegistry()
+    target = registry.subscribe('blkcrtn_01')
+    other = registry.subscribe('sdwnd_01')
+
+    # API側スレッドからの更新を想定する
+    threading.Timer(0.05, registry.update, args=['blkcrtn_01', settings.ACTUATOR_STOPPED]).start()
+
+    assert await target.wait(timeout=2)
+    assert not await other.wait(timeout=0.05)
@@ -0,0 +1,79 @@
+import sys, os
+import asyncio
+
+import pytest
+import httpx
+from fastapi import FastAPI
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from actuators.base_actuators.actuator_supervisor import ActuatorSupervisor, actuator_supervisor
+from actuators.base_actuators.metrics import actuator_missed_ticks
+from api.endpoints.actuator_endpoints import router
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, 'ACTUATOR_RESTART_BACKOFF', 0.01)
+    monkeypatch.setattr(settings, 'ACTUATOR_RESTART_BACKOFF_MAX', 0.04)
+
+def test_backoff_doubles_up_to_max(fast_backoff):
+    supervisor = ActuatorSupervisor()
+
+    assert [0.01, 0.02, 0.04, 0.04] == [supervisor.get_backoff(n) for n in range(1, 5)]
+
+@pytest.mark.asyncio
+async def test_failed_actuator_is_restarted(fast_backoff):
+    supervisor = ActuatorSupervisor()
+    calls = []
+
+    async def run():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception('Invalid GPIO number count.')
+
+    await asyncio.wait_for(supervisor.supervise('blkcrtn_01', run), timeout=2)
+    health = supervisor.stats()['blkcrtn_01']
+
+    assert 3 == len(calls)
+    assert 2 == health['restarts']
+    assert 'Exception: Invalid GPIO number count.' == health['last_error']
+    assert 'stopped' == health['status']
+
+@pytest.mark.asyncio
+async def test_failure_does_not_cancel_other_tasks(fast_backoff):
+    supervisor = ActuatorSupervisor()
+
+    async def failing():
+        raise ValueError('boom')
+
+    async def healthy():
+        for _ in range(5):
+            supervisor.record_iteration('crcltn_01', 0.001)
+            await asyncio.sleep(0.01)
+
+    async with asyncio.TaskGroup() as tg:
+        failing_task = tg.create_task(supervisor.supervise('blkcrtn_01', failing))
+        healthy_task = tg.create_task(supervisor.supervise('crcltn_01', healthy))
+        await healthy_task
+        failing_task.cancel()
+
+    stats = supervisor.stats()
+    assert 5 == stats['crcltn_01']['iterations']
+    assert stats['crcltn_01']['iterations_per_sec'] > 0
+    assert stats['blkcrtn_01']['restarts'] >= 1
+
+@pytest.mark.asyncio
+async def test_health_endpoint():
+    actuator_supervisor.record_iteration('sdwnd_01', 0.002)
+    actuator_missed_ticks.inc('sdwnd_01', amount=2)
+    app = FastAPI()
+    app.include_router(router)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/actuators_health/')
+
+    assert 200 == response.status_code
+    health = {item['actuator_id']: item for item in response.json()['actuators']}
+    assert 0.002 == health['sdwnd_01']['last_latency']
+    assert actuator_missed_ticks.get('sdwnd_01') == health['sdwnd_01']['missed_ticks'] >= 2
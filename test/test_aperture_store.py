@@ -0,0 +1,44 @@
+import sys, os
+import asyncio
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators import base_actuator
+from actuators.base_actuators.aperture_store import ApertureStore, aperture_store
+
+def test_set_keeps_only_latest_aperture():
+    store = ApertureStore()
+    for aperture in range(100):
+        store.set('blkcrtn_01', aperture)
+
+    assert 99 == store.get('blkcrtn_01')
+    assert {'blkcrtn_01': 99} == store.pending()
+
+def test_get_returns_default_when_not_set():
+    store = ApertureStore()
+
+    assert 50.0 == store.get('sdwnd_01', 50.0)
+    assert {} == store.pending()
+
+def test_flush_without_pending_does_not_write():
+    store = ApertureStore()
+
+    assert 0 == store.flush()
+
+@pytest.mark.asyncio
+async def test_flush_aperture_keeps_task_and_reports_error(monkeypatch, capsys):
+    async def flush_async():
+        await asyncio.sleep(0)
+        raise OSError('database is locked')
+
+    monkeypatch.setattr(aperture_store, 'flush_async', flush_async)
+    base_actuator.Actuator('blkcrtn_01').flush_aperture()
+
+    tasks = set(base_actuator.flush_tasks)
+    assert 1 == len(tasks)
+    await asyncio.wait(tasks)
+
+    assert 0 == len(base_actuator.flush_tasks)
+    assert 'aperture flush failed' in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import sys, os
+
+import pytest
+import httpx
+from fastapi import FastAPI
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.db_access import get_session, get_async_session
+from services.actuator_services import EnvironmentValuesService, AsyncEnvironmentValuesService
+from services.irrigation_schedule_admin import IrrigationScheduleAdmin, AsyncIrrigationScheduleAdmin
+from api.endpoints.actuator_endpoints import router
+
+@pytest.mark.asyncio
+async def test_async_actuators_info_matches_sync():
+    with get_session() as db:
+        expected = EnvironmentValuesService(db).get_actuators_info()
+
+    async with get_async_session() as db:
+        result = await AsyncEnvironmentValuesService(db).get_actuators_info()
+
+    assert expected == result
+
+@pytest.mark.asyncio
+async def test_async_device_step_values_matches_sync():
+    with get_session() as db:
+        expected = EnvironmentValuesService(db).get_device_step_values('blkcrtn_01')
+
+    async with get_async_session() as db:
+        result = await AsyncEnvironmentValuesService(db).get_device_step_values('blkcrtn_01')
+
+    assert expected == result
+
+@pytest.mark.asyncio
+async def test_async_irrigation_schedule_matches_sync():
+    expected = IrrigationScheduleAdmin().get_irrigation_time_schedule(1)
+
+    async with get_async_session() as db:
+        result = await AsyncIrrigationScheduleAdmin(db).get_irrigation_time_schedule(1)
+        line_no = await AsyncIrrigationScheduleAdmin(db).get_irrigation_line_no('irrgtn_01')
+
+    assert expected == result
+    assert IrrigationScheduleAdmin().get_irrigation_line_no('irrgtn_01') == line_no
+
+@pytest.mark.asyncio
+async def test_async_endpoint():
+    app = FastAPI()
+    app.include_router(router)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/actuator_state/', params={'id': 'blkcrtn_01'})
+
+    assert 200 == response.status_code
+    assert 'blkcrtn_01' == response.json()['actuator_id']
@@ -0,0 +1,102 @@
+import sys, os
+import random
+
+import numpy as np
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.calc_aperture import \
+    ControlCurve, \
+    condition_judgement, \
+    on_off_condition_judgement
+from actuators.base_actuators.batch_aperture import \
+    condition_judgement_batch, \
+    get_aperture_batch, \
+    get_apertures_batch, \
+    on_off_batch, \
+    on_off_condition_judgement_batch
+
+# device_control_tableの設定例
+TABLES = [
+    ([100.0, 300.0, 600.0, 800.0], [90.0, 80.0, 50.0, 30.0]),
+    ([28.0, 30.0, 39.0, 0.0, 0.0], [70.0, 20.0, 8.0, 0.0, 0.0]),   # 0.0が混在（昇順でない）
+    ([17.0, 28.0, 30.0], [20.0, 60.0, 100.0]),
+    ([24.0, 27.0], [0.0, 0.0]),
+    ([28.0, 30.0, 30.0], [70.0, 20.0, 5.0]),   # 同じ段階値
+    ([30.0, 25.0, 35.0, 20.0], [10.0, -1.0, 40.0, 60.0]),   # 降順が混在、-1の開度
+    ([28.0, 30.0, 33.0], [70.0, 20.0]),     # 開度が足りない
+]
+
+def sample_values(stages: list) -> list:
+    values = [x for x in stages] + [x + 0.5 for x in stages] + [x - 0.5 for x in stages]
+    rnd = random.Random(0)
+    values += [rnd.uniform(min(stages) - 50, max(stages) + 50) for _ in range(500)]
+    return values + [float('nan')]
+
+def random_table(rnd: random.Random) -> tuple:
+    count = rnd.randint(1, 5)
+    stages = [float(rnd.choice([0, rnd.randint(0, 40)])) for _ in range(count)]
+    apertures = [float(rnd.choice([-1, rnd.randint(0, 100)])) for _ in range(count)]
+    return stages, apertures
+
+@pytest.mark.parametrize('stages, apertures', TABLES)
+def test_matches_condition_judgement(stages, apertures):
+    values = sample_values(stages)
+    for min_aperture in [100, 0, 1]:
+        expected = [condition_judgement(v, stages, 50, apertures, min_aperture, 0) for v in values]
+        assert expected == condition_judgement_batch(values, stages, 50, apertures, min_aperture, 0).tolist()
+
+def test_matches_condition_judgement_on_random_tables():
+    rnd = random.Random(1)
+    for _ in range(300):
+        stages, apertures = random_table(rnd)
+        values = [float(rnd.randint(-5, 45)) + rnd.choice([0, 0.5]) for _ in range(50)]
+        # 現在の開度は、計測値ごとに異なってよい
+        now = [float(rnd.randint(0, 100)) for _ in values]
+
+        expected = [condition_judgement(v, stages, n, apertures) for v, n in zip(values, now)]
+        assert expected == condition_judgement_batch(values, stages, np.array(now), apertures).tolist(), \
+            (stages, apertures)
+
+        expected = [on_off_condition_judgement(v, stages, 0, apertures) for v in values]
+        assert expected == on_off_condition_judgement_batch(values, stages, 0, apertures).tolist()
+
+def test_empty_degrees_raise_like_scalar():
+    with pytest.raises(ValueError):
+        condition_judgement([1.0], [], 0, [])
+    with pytest.raises(ValueError):
+        condition_judgement_batch([1.0], [], 0, [])
+
+def test_control_curves_match_scalar_methods():
+    curves = [
+        ControlCurve.compile('blkcrtn_01', [
+            (0, [28.0, 30.0, 39.0, 0.0, 0.0], [70.0, 20.0, 8.0, 0.0, 0.0]),
+            (1, [100.0, 300.0, 600.0, 800.0, ''], [90.0, 80.0, 50.0, 30.0, None])]),
+        ControlCurve.compile('sdwnd_01', [(0, [17.0, 28.0, 30.0, None, None], [20.0, 60.0, 100.0, None, None])]),
+        ControlCurve.compile('crcltn_01', [(0, [24.0, 27.0, None, None, None], [0.0, 0.0, None, None, None])]),
+        ControlCurve.compile('irrgtn_01', []),
+    ]
+    values = sample_values([0.0, 900.0])
+
+    apertures = get_apertures_batch(curves, values, 20)
+
+    assert (len(curves), len(values)) == apertures.shape
+    for curve, row in zip(curves, apertures):
+        assert [curve.get_aperture(v, 20) for v in values] == row.tolist()
+
+    assert [curves[2].on_off(v) for v in values] == on_off_batch(curves[2], values).tolist()
+
+def test_time_pattern_uses_current_time():
+    curve = ControlCurve.compile('skylght_01', [(2, ['00:00', '23:59', 20], ['23:59', '00:00', 10])])
+
+    assert [curve.get_aperture(v, 0) for v in [1.0, 2.0]] == get_aperture_batch(curve, [1.0, 2.0], 0).tolist()
+
+def test_values_per_curve():
+    curves = [ControlCurve.compile('sdwnd_01', [(0, [17.0, 28.0, 30.0], [20.0, 60.0, 100.0])])] * 2
+    apertures = get_apertures_batch(curves, [[10.0, 29.0], [31.0, 28.0]])
+
+    assert [[0.0, 60.0], [20.0, 60.0]] == apertures.tolist()
+
+    with pytest.raises(ValueError):
+        get_apertures_batch(curves, [[1.0], [2.0], [3.0]])
@@ -0,0 +1,153 @@
+import sys, os
+import csv
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+import httpx
+from fastapi import FastAPI
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.calc_aperture import ControlCurve, get_degrees_apertures
+from actuators.base_actuators.environment_bus import EnvironmentSnapshot
+from services.control_backtest import \
+    ControlBacktest, \
+    MotorBacktest, \
+    OnOffBacktest, \
+    STAGE_KEYS, \
+    candidate_rows, \
+    load_models, \
+    main
+from api.endpoints.actuator_endpoints import router
+
+START = datetime(2024, 6, 27, 9, 0, 0)
+SIDE_WINDOW = [(0, [17.0, 28.0, 30.0, None, None], [20.0, 60.0, 100.0, None, None])]
+
+def reading(seconds: float, temperature: float = None, lux: float = None) -> EnvironmentSnapshot:
+    updated = (START + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+    return EnvironmentSnapshot(temperature, 60.0, 0.9, lux, updated)
+
+def side_window(aperture: float = 20.0) -> MotorBacktest:
+    # 全開時間50秒（開度1%あたり0.5秒）
+    return MotorBacktest('sdwnd_01', ControlCurve.compile('sdwnd_01', SIDE_WINDOW), 'temperature', 50.0, aperture)
+
+def test_motor_runs_to_target_then_reverses():
+    backtest = ControlBacktest([side_window()])
+    events = list(backtest.run([
+        reading(0, 29.0),       # 20 -> 60 (20秒)
+        reading(10, 29.0),      # 動作中, 同じ目標
+        reading(60, 10.0),      # 20秒で停止済み, 60 -> 0 (30秒)
+        reading(120, 10.0),
+    ]))
+
+    assert [('start', 0, 20.0, 60.0), ('stop', 20, 60.0, 60.0), ('start', 60, 60.0, 0.0), ('stop', 90, 0.0, 0.0)] == \
+        [(e.event, (e.at - START).total_seconds(), e.position, e.target) for e in events]
+
+    result, = backtest.results()
+    assert (4, 2, 1, 50.0, 0.0) == \
+        (result.readings, result.starts, result.reversals, result.run_seconds, result.final)
+
+def test_motor_stops_midway_on_opposite_target():
+    backtest = ControlBacktest([side_window()])
+    events = list(backtest.run([
+        reading(0, 30.0),       # 20 -> 100 (40秒)
+        reading(10, 10.0),      # 開度40で停止し、0へ閉じる
+        reading(100, 10.0),
+    ]))
+
+    assert ['start', 'stop', 'start', 'stop'] == [e.event for e in events]
+    assert 40.0 == events[1].position
+
+    result, = backtest.results()
+    assert (1, 30.0, 0.0) == (result.reversals, result.run_seconds, result.final)
+
+def test_motor_without_full_travel_time_only_moves_aperture():
+    model = MotorBacktest('sdwnd_01', ControlCurve.compile('sdwnd_01', SIDE_WINDOW), 'temperature', 0, 20.0)
+    backtest = ControlBacktest([model])
+
+    events = list(backtest.run([reading(0, 29.0)]))
+
+    assert ['move'] == [e.event for e in events]
+    assert (0, 0.0, 60.0) == (model.result.starts, model.result.run_seconds, model.position)
+
+def test_on_off_switches_and_on_seconds():
+    curve = ControlCurve.compile('crcltn_01', [(0, [24.0, 27.0, None, None, None], [0.0, 0.0, None, None, None])])
+    backtest = ControlBacktest([OnOffBacktest('crcltn_01', curve, 'temperature')])
+
+    events = list(backtest.run([reading(i * 60, t) for i, t in enumerate([20.0, 25.0, 30.0, 20.0, 26.0])]))
+
+    assert [('on', 60), ('off', 180), ('on', 240)] == [(e.event, (e.at - START).total_seconds()) for e in events]
+    result, = backtest.results()
+    assert (5, 3, 120.0, 1.0) == (result.readings, result.switches, result.on_seconds, result.final)
+
+def test_missing_values_and_invalid_time_are_skipped():
+    lux_curve = ControlCurve.compile('blkcrtn_01', [(1, [100.0, 300.0, 600.0], [90.0, 80.0, 50.0])])
+    curtain = MotorBacktest('blkcrtn_01', lux_curve, 'lux', 100.0, 100.0)
+    backtest = ControlBacktest([curtain, side_window()])
+
+    events = list(backtest.run([reading(0, temperature=29.0), EnvironmentSnapshot(29.0, 0, 0, 500.0, 'broken')]))
+
+    assert {'sdwnd_01'} == {e.actuator_id for e in events}
+    assert (0, 1) == (curtain.result.readings, backtest.skipped)
+
+def test_run_streams_lazily():
+    backtest = ControlBacktest([side_window()])
+    forever = (reading(i * 30, 29.0 if i % 4 < 2 else 10.0) for i in itertools.count())
+
+    events = list(itertools.islice(backtest.run(forever), 10))
+
+    assert 10 == len(events)
+
+def test_candidate_rows_replace_pattern():
+    rows = [(0, [28.0, 30.0, 39.0, 0.0, 0.0], [70.0, 20.0, 8.0, 0.0, 0.0]),
+            (1, [100.0, 300.0, 600.0, 800.0, ''], [90.0, 80.0, 50.0, 30.0, None])]
+
+    replaced = candidate_rows(rows, 0, {'first_stage': 20.0, 'first_value': 10.0})
+
+    assert (0, [20.0, 0, 0, 0, 0], [10.0, 0, 0, 0, 0]) == replaced[0]
+    assert rows[1] == replaced[1]
+    assert 3 == len(candidate_rows(rows, 2, {}))
+
+def test_load_models_from_database_with_candidate():
+    candidate = {'id': 'sdwnd_01', 'pattern': 0,
+                 'updateData': {'first_stage': 20.0, 'first_value': 0.0, 'second_stage': 25.0, 'second_value': 50.0}}
+
+    models = load_models(['sdwnd_01', 'crcltn_01', 'irrgtn_01'], [candidate])
+
+    assert [('crcltn_01', 'on_off'), ('sdwnd_01', 'motor')] == [(m.result.actuator_id, m.kind) for m in models]
+    assert (20.0, 25.0, 0, 0, 0) == models[1].curve.temperature.stages
+
+@pytest.mark.asyncio
+async def test_candidate_matches_stored_device_control():
+    app = FastAPI()
+    app.include_router(router)
+    rows = list(get_degrees_apertures('sdwnd_01'))
+    _, stages, apertures = next(row for row in rows if row[0] == 0)
+    original = {}
+    for key, stage, aperture in zip(STAGE_KEYS, stages, apertures):
+        original[f'{key}_stage'] = stage
+        original[f'{key}_value'] = aperture
+    update_data = {'first_stage': 20.0, 'first_value': 0.0, 'second_stage': 25.0, 'second_value': 50.0,
+                   'third_stage': 31.0, 'third_value': 100.0}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.put('/update_device_control/',
+                                    json={'id': 'sdwnd_01', 'pattern': 0, 'updateData': update_data})
+        try:
+            assert response.json() is True
+            # バックテストで評価した設定と、保存された設定が一致する
+            assert candidate_rows(rows, 0, update_data) == list(get_degrees_apertures('sdwnd_01'))
+        finally:
+            await client.put('/update_device_control/',
+                             json={'id': 'sdwnd_01', 'pattern': 0, 'updateData': original})
+
+def test_cli_writes_timeline(tmp_path, capsys):
+    timeline = tmp_path / 'timeline.csv'
+
+    assert 0 == main(['--ids', 'sdwnd_01,crcltn_01', '--timeline', str(timeline)])
+
+    output = capsys.readouterr().out
+    assert 'sdwnd_01' in output and 'crcltn_01' in output
+    with open(timeline, newline='', encoding='utf-8') as f:
+        assert ['actuator_id', 'at', 'event', 'position', 'target', 'value'] == next(csv.reader(f))
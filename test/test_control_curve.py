@@ -0,0 +1,106 @@
+import sys, os
+import random
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from actuators.base_actuators.calc_aperture import \
+    ControlCurve, \
+    ControlCurveCache, \
+    StageCurve, \
+    condition_judgement, \
+    on_off_condition_judgement, \
+    get_new_aperture, \
+    get_temperature_aperture, \
+    build_states
+
+# device_control_tableの設定例
+TABLES = [
+    ([100.0, 300.0, 600.0, 800.0], [90.0, 80.0, 50.0, 30.0]),
+    ([28.0, 30.0, 39.0, 0.0, 0.0], [70.0, 20.0, 8.0, 0.0, 0.0]),   # 0.0が混在（昇順でない）
+    ([17.0, 28.0, 30.0], [20.0, 60.0, 100.0]),
+    ([24.0, 27.0], [0.0, 0.0]),
+    ([28.0, 30.0, 30.0], [70.0, 20.0, 5.0]),   # 同じ段階値
+]
+
+def sample_values(stages: list) -> list:
+    values = [x for x in stages] + [x + 0.5 for x in stages] + [x - 0.5 for x in stages]
+    rnd = random.Random(0)
+    values += [rnd.uniform(min(stages) - 50, max(stages) + 50) for _ in range(200)]
+    return values
+
+@pytest.mark.parametrize('stages, apertures', TABLES)
+def test_stage_curve_matches_condition_judgement(stages, apertures):
+    curve = StageCurve.compile(stages, apertures)
+
+    for value in sample_values(stages):
+        for min_aperture in [100, 0, 1]:
+            expected = condition_judgement(value, stages, 50, apertures, min_aperture, 0)
+            assert expected == curve.judge(value, 50, min_aperture, 0), value
+
+def test_stage_curve_nan():
+    stages, apertures = TABLES[0]
+    curve = StageCurve.compile(stages, apertures)
+    assert condition_judgement(float('nan'), stages, 50, apertures) == curve.judge(float('nan'), 50)
+
+def test_unsorted_table_is_not_bisected():
+    assert not StageCurve.compile(*TABLES[1]).bisectable
+    assert StageCurve.compile(*TABLES[0]).bisectable
+
+def test_control_curve_matches_get_aperture_helpers():
+    # 日射量パターンがあるときは、日射量で判定する
+    rows = [
+        (0, [28.0, 30.0, 39.0, 0.0, 0.0], [70.0, 20.0, 8.0, 0.0, 0.0]),
+        (1, [100.0, 300.0, 600.0, 800.0, ''], [90.0, 80.0, 50.0, 30.0, None]),
+    ]
+    curve = ControlCurve.compile('blkcrtn_01', rows)
+    states = build_states(rows)
+
+    for value in sample_values([100.0, 800.0]):
+        assert get_new_aperture(value, 1, 20, states) == curve.get_aperture(value, 20)
+
+    # 温度パターンだけのときは、温度で判定する
+    rows = [(0, [17.0, 28.0, 30.0, None, None], [20.0, 60.0, 100.0, None, None])]
+    curve = ControlCurve.compile('sdwnd_01', rows)
+    states = build_states(rows)
+
+    for value in sample_values([17.0, 30.0]):
+        assert get_temperature_aperture(value, 0, 20, states) == curve.get_aperture(value, 20)
+
+def test_control_curve_on_off():
+    rows = [(0, [24.0, 27.0, None, None, None], [0.0, 0.0, None, None, None])]
+    curve = ControlCurve.compile('crcltn_01', rows)
+
+    for value in sample_values([24.0, 27.0]):
+        assert on_off_condition_judgement(value, [24.0, 27.0], 0, [0.0, 0.0]) == curve.on_off(value)
+
+def test_cache_invalidate():
+    cache = ControlCurveCache()
+    curve = ControlCurve.compile('crcltn_01', [])
+    cache._curves['crcltn_01'] = curve
+
+    assert curve is cache.get('crcltn_01')
+
+    cache.invalidate('crcltn_01')
+    assert 'crcltn_01' not in cache._curves
+
+def test_cache_recompiles_after_ttl(monkeypatch):
+    monkeypatch.setattr(settings, 'CONTROL_CURVE_CACHE_TTL', 60)
+    now = [1000.0]
+    cache = ControlCurveCache(timer=lambda: now[0])
+
+    curve = cache.get('crcltn_01')
+    now[0] += 59
+    assert curve is cache.get('crcltn_01')
+
+    # APIを通さずに変更された場合も、有効期限を過ぎればコンパイルし直す
+    now[0] += 1
+    assert curve is not cache.get('crcltn_01')
+
+    monkeypatch.setattr(settings, 'CONTROL_CURVE_CACHE_TTL', 0)
+    cache.invalidate()
+    curve = cache.get('crcltn_01')
+    now[0] += 3600
+    assert curve is cache.get('crcltn_01')
@@ -0,0 +1,114 @@
+import sys, os
+import json
+import shutil
+
+import pytest
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.db_access import get_async_db
+from models.actuator_models import EnvironmentRollup, EnvironmentValues
+from actuators.base_actuators.environment_bus import EnvironmentBus, EnvironmentSnapshot
+from services import actuator_services
+from services.environment_history import environment_history
+from api.endpoints.actuator_endpoints import router
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.fixture
+def context(tmp_path, monkeypatch):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'batch.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    EnvironmentRollup.__table__.create(bind=create_engine(f'sqlite:///{db_path}'), checkfirst=True)
+    monkeypatch.setattr(environment_history, '_ready', True)
+
+    bus = EnvironmentBus()
+    monkeypatch.setattr(actuator_services, 'environment_bus', bus)
+
+    session_factory = async_sessionmaker(
+        create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool), expire_on_commit=False)
+
+    async def get_test_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_db] = get_test_db
+    return app, session_factory, bus
+
+def make_readings(count: int) -> list:
+    return [{'mstr_0': 0.9, 'temp': 20 + i % 5, 'hum': 60, 'lux': 100 + i,
+             'now': f'2024-06-27 {i // 3600:02}:{i // 60 % 60:02}:{i % 60:02}'} for i in range(count)]
+
+async def count_rows(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(EnvironmentValues)
+                               .where(EnvironmentValues.updated.like('2024-06-27%')))
+
+@pytest.mark.asyncio
+async def test_json_array_is_inserted_and_only_newest_is_published(context):
+    app, session_factory, bus = context
+    readings = make_readings(300)
+    # 送信順と計測年月日時刻の順は一致しないことがある
+    readings.reverse()
+    wake = bus.subscribe()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post('/env_values/batch/', json=readings)
+
+    assert 200 == response.status_code
+    assert 300 == response.json()['inserted']
+    assert '2024-06-27 00:04:59' == bus.latest().updated
+    assert wake.event.is_set()
+    assert 300 == await count_rows(session_factory)
+
+    async with session_factory() as db:
+        hour = await db.scalar(select(EnvironmentRollup).where(EnvironmentRollup.resolution == 3600))
+    assert (300, 100.0, 399.0) == (hour.count, hour.lux_min, hour.lux_max)
+
+@pytest.mark.asyncio
+async def test_ndjson_stream_is_validated_per_line(context):
+    app, session_factory, bus = context
+    lines = [json.dumps(r) for r in make_readings(5)]
+    lines.insert(2, '{"mstr_0": 0.9, "temp": "hot"}')
+
+    async def body():
+        data = '\n'.join(lines).encode()
+        # 行の途中で分割して送信する
+        for i in range(0, len(data), 37):
+            yield data[i:i + 37]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        invalid = await client.post('/env_values/batch/', content=body(),
+                                    headers={'content-type': 'application/x-ndjson'})
+        del lines[2]
+        valid = await client.post('/env_values/batch/', content='\n'.join(lines) + '\n',
+                                  headers={'content-type': 'application/x-ndjson'})
+
+    # 1件でも検証エラーがあれば登録しない
+    assert 422 == invalid.status_code
+    assert {3} == {e['line'] for e in invalid.json()['detail']}
+    assert 200 == valid.status_code
+    assert 5 == valid.json()['inserted']
+    assert 5 == await count_rows(session_factory)
+
+@pytest.mark.asyncio
+async def test_replayed_history_does_not_replace_newer_reading(context):
+    app, _, bus = context
+    bus.publish(EnvironmentSnapshot(25.0, 60.0, 0.9, 500.0, '2024-06-28 09:00:00'))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post('/env_values/batch/', json=make_readings(10))
+
+    assert 200 == response.status_code
+    assert '2024-06-28 09:00:00' == bus.latest().updated
@@ -0,0 +1,47 @@
+import sys, os
+import asyncio
+import threading
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.environment_bus import EnvironmentBus, EnvironmentSnapshot
+
+def make_snapshot(temperature: float, lux: float) -> EnvironmentSnapshot:
+    return EnvironmentSnapshot(
+        temperature=temperature,
+        humidity=60.0,
+        moisture=0.9,
+        lux=lux,
+        updated='2025-04-13 21:25:59')
+
+def test_latest_after_publish():
+    bus = EnvironmentBus()
+    bus.publish(make_snapshot(25.0, 300.0))
+    bus.publish(make_snapshot(26.5, 350.0))
+
+    assert 26.5 == bus.latest().temperature
+    assert 350.0 == bus.latest().lux
+
+@pytest.mark.asyncio
+async def test_subscriber_wakes_on_publish():
+    bus = EnvironmentBus()
+    subscription = bus.subscribe()
+
+    # API側スレッドからの登録を想定する
+    threading.Timer(0.05, bus.publish, args=[make_snapshot(30.0, 500.0)]).start()
+
+    assert await subscription.wait(timeout=2)
+    assert 30.0 == bus.latest().temperature
+
+@pytest.mark.asyncio
+async def test_subscriber_timeout_without_publish():
+    bus = EnvironmentBus()
+    subscription = bus.subscribe()
+
+    assert not await subscription.wait(timeout=0.05)
+
+    bus.unsubscribe(subscription)
+    bus.publish(make_snapshot(20.0, 100.0))
+    assert not await subscription.wait(timeout=0.05)
@@ -0,0 +1,107 @@
+import sys, os
+import shutil
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from models.actuator_models import EnvironmentRollup, EnvironmentValues
+from services import environment_history as history_module
+from services.environment_history import EnvironmentHistory, UPDATED_FORMAT
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'history.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    engine = create_engine(f'sqlite:///{db_path}')
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def get_async_session():
+        async with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(history_module, 'engine', engine)
+    monkeypatch.setattr(history_module, 'get_async_session', get_async_session)
+    return engine, session_factory
+
+def test_cutoff_follows_retention(monkeypatch):
+    monkeypatch.setattr(settings, 'ENVIRONMENT_RETENTION_DAYS', 7)
+    history = EnvironmentHistory()
+
+    assert '2024-06-20 12:00:00' == history.get_cutoff(datetime(2024, 6, 27, 12, 0))
+
+    monkeypatch.setattr(settings, 'ENVIRONMENT_RETENTION_DAYS', 0)
+    assert history.get_cutoff(datetime(2024, 6, 27, 12, 0)) is None
+
+def test_ensure_schema_adds_updated_index(history_db):
+    engine, _ = history_db
+    EnvironmentHistory().ensure_schema()
+
+    names = [index['name'] for index in inspect(engine).get_indexes('environment_values')]
+    assert 'ix_environment_values_updated' in names
+
+@pytest.mark.asyncio
+async def test_prune_deletes_expired_rows_in_batches(history_db, monkeypatch):
+    _, session_factory = history_db
+    monkeypatch.setattr(settings, 'ENVIRONMENT_RETENTION_DAYS', 1)
+    monkeypatch.setattr(settings, 'ENVIRONMENT_PRUNE_BATCH', 7)
+    now = datetime(2024, 6, 27, 12, 0)
+
+    async with session_factory() as db:
+        for minutes in range(0, 3 * 24 * 60, 60):
+            updated = (now - timedelta(minutes=minutes)).strftime(UPDATED_FORMAT)
+            db.add(EnvironmentValues(temperature=20, humidity=60, moisture=0.9, lux=100, updated=updated))
+        await db.commit()
+
+    deleted = await EnvironmentHistory().prune(now)
+
+    async with session_factory() as db:
+        oldest = await db.scalar(select(func.min(EnvironmentValues.updated)))
+        # コピー元のDBにある計測値（保持期間内）は数えない
+        count = await db.scalar(select(func.count()).select_from(EnvironmentValues)
+                                .where(EnvironmentValues.updated <= now.strftime(UPDATED_FORMAT)))
+
+    # 直近1日分（24時間 + 境界の1件）だけが残る
+    assert 25 == count
+    assert '2024-06-26 12:00:00' == oldest
+    assert deleted > settings.ENVIRONMENT_PRUNE_BATCH
+
+@pytest.mark.asyncio
+async def test_prune_deletes_expired_rollups_per_resolution(history_db, monkeypatch):
+    _, session_factory = history_db
+    monkeypatch.setattr(settings, 'ENVIRONMENT_RETENTION_DAYS', 0)
+    monkeypatch.setattr(settings, 'ENVIRONMENT_ROLLUP_RETENTION_DAYS', {60: 1, 3600: 10})
+    monkeypatch.setattr(settings, 'ENVIRONMENT_PRUNE_BATCH', 7)
+    now = datetime(2024, 6, 27, 12, 0)
+    EnvironmentHistory().ensure_schema()
+
+    async with session_factory() as db:
+        for resolution in (60, 600, 3600):
+            for hours in range(0, 20 * 24, 6):
+                bucket_start = (now - timedelta(hours=hours)).strftime(UPDATED_FORMAT)
+                db.add(EnvironmentRollup(resolution=resolution, bucket_start=bucket_start, count=1))
+        await db.commit()
+
+    deleted = await EnvironmentHistory().prune(now)
+
+    async with session_factory() as db:
+        oldest = {resolution: await db.scalar(select(func.min(EnvironmentRollup.bucket_start))
+                                              .where(EnvironmentRollup.resolution == resolution))
+                  for resolution in (60, 600, 3600)}
+
+    assert '2024-06-26 12:00:00' == oldest[60]
+    # 保持期間を設定していない分解能は削除しない
+    assert '2024-06-07 18:00:00' == oldest[600]
+    assert '2024-06-17 12:00:00' == oldest[3600]
+    assert (80 - 5) + (80 - 41) == deleted
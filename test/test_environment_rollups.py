@@ -0,0 +1,74 @@
+import sys, os
+import shutil
+from datetime import datetime
+
+import pytest
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.db_access import get_async_db
+from models.actuator_models import EnvironmentRollup
+from services.environment_history import environment_history
+from services.environment_rollups import get_bucket_start
+from api.endpoints.actuator_endpoints import router
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'rollup.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    EnvironmentRollup.__table__.create(bind=create_engine(f'sqlite:///{db_path}'), checkfirst=True)
+    monkeypatch.setattr(environment_history, '_ready', True)
+
+    session_factory = async_sessionmaker(
+        create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool), expire_on_commit=False)
+
+    async def get_test_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_db] = get_test_db
+    return app
+
+def test_bucket_start_is_aligned_from_midnight():
+    updated = datetime(2024, 6, 27, 20, 48, 30)
+
+    assert datetime(2024, 6, 27, 20, 48) == get_bucket_start(updated, 60)
+    assert datetime(2024, 6, 27, 20, 40) == get_bucket_start(updated, 600)
+    assert datetime(2024, 6, 27, 20, 0) == get_bucket_start(updated, 3600)
+
+@pytest.mark.asyncio
+async def test_rollups_follow_each_reading(app):
+    readings = [
+        {'mstr_0': 0.9, 'temp': 20.0, 'hum': 60, 'lux': 100, 'now': '2024-06-27 20:48:30'},
+        {'mstr_0': 0.8, 'temp': 26.0, 'hum': 70, 'lux': 300, 'now': '2024-06-27 20:48:50'},
+        {'mstr_0': 0.7, 'temp': 23.0, 'hum': 80, 'lux': 200, 'now': '2024-06-27 20:51:00'},
+    ]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        for body in readings:
+            assert 200 == (await client.post('/env_values/', json=body)).status_code
+
+        minutes = (await client.get('/env_rollups/', params={
+            'resolution': 60, 'start': '2024-06-27 20:00:00', 'end': '2024-06-27 21:00:00'})).json()['rollups']
+        ten_minutes = (await client.get('/env_rollups/', params={
+            'resolution': 600, 'start': '2024-06-27 20:00:00'})).json()['rollups']
+        invalid = await client.get('/env_rollups/', params={'resolution': 17})
+
+    assert ['2024-06-27 20:48:00', '2024-06-27 20:51:00'] == [r['bucket_start'] for r in minutes]
+    assert (2, 23.0, 20.0, 26.0) == (minutes[0]['count'], minutes[0]['temperature_mean'],
+                                     minutes[0]['temperature_min'], minutes[0]['temperature_max'])
+
+    assert ['2024-06-27 20:40:00', '2024-06-27 20:50:00'] == [r['bucket_start'] for r in ten_minutes]
+    assert (100.0, 300.0) == (ten_minutes[0]['lux_min'], ten_minutes[0]['lux_max'])
+    assert 400 == invalid.status_code
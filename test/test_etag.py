@@ -0,0 +1,107 @@
+import sys, os
+import shutil
+
+import pytest
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.db_access import get_async_db
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.change_versions import ChangeVersions, change_versions
+from api.endpoints.actuator_endpoints import router
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+class NoDatabase:
+    """304を返すときにDBへアクセスしていないことを確認する"""
+    def __getattr__(self, name):
+        raise AssertionError(f'database accessed: {name}')
+
+@pytest.fixture
+def app(tmp_path):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'etag.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    session_factory = async_sessionmaker(
+        create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool), expire_on_commit=False)
+    state = {'db': True}
+
+    async def get_test_db():
+        if not state['db']:
+            yield NoDatabase()
+            return
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_db] = get_test_db
+    app.state.db = state
+    return app
+
+def test_key_versions_follow_table_wide_changes():
+    versions = ChangeVersions()
+    before = versions.etag('actuator_states', 'blkcrtn_01')
+
+    versions.bump('actuator_states', 'sdwnd_01')
+    assert before == versions.etag('actuator_states', 'blkcrtn_01')
+
+    versions.bump('actuator_states')
+    assert before != versions.etag('actuator_states', 'blkcrtn_01')
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('url, table, key', [
+    ('/actuators_state/', 'actuator_states', 'blkcrtn_01'),
+    ('/actuator_state/?id=blkcrtn_01', 'actuator_states', 'blkcrtn_01'),
+    ('/device_steps/?id=blkcrtn_01', 'device_control_table', 'blkcrtn_01'),
+])
+async def test_unchanged_poll_returns_304_without_db(app, url, table, key):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        first = await client.get(url)
+        etag = first.headers['ETag']
+
+        app.state.db['db'] = False
+        second = await client.get(url, headers={'If-None-Match': etag})
+
+        change_versions.bump(table, key)
+        app.state.db['db'] = True
+        third = await client.get(url, headers={'If-None-Match': etag})
+
+    assert 200 == first.status_code
+    assert 304 == second.status_code
+    assert b'' == second.content
+    assert etag == second.headers['ETag']
+    assert 200 == third.status_code
+    assert etag != third.headers['ETag']
+
+@pytest.fixture
+def restore_aperture():
+    yield
+    # 他のテストへ未書き込みの開度を残さない
+    aperture_store._take_pending()
+    aperture_store._apertures.pop('sdwnd_01', None)
+
+@pytest.mark.asyncio
+async def test_aperture_and_mode_changes_update_etag(app, restore_aperture):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        # 同じ開度の書き込みでは変わらない
+        aperture_store.set('sdwnd_01', 42.0)
+        etag = (await client.get('/actuator_state/?id=sdwnd_01')).headers['ETag']
+        aperture_store.set('sdwnd_01', 42.0)
+        assert 304 == (await client.get('/actuator_state/?id=sdwnd_01', headers={'If-None-Match': etag})).status_code
+
+        aperture_store.set('sdwnd_01', 43.0)
+        moved = await client.get('/actuator_state/?id=sdwnd_01', headers={'If-None-Match': etag})
+        assert 200 == moved.status_code
+        assert 43.0 == moved.json()['aperture']
+
+        actuator_state_registry.update('sdwnd_01', actuator_state_registry.get('sdwnd_01'))
+        assert 200 == (await client.get('/actuator_state/?id=sdwnd_01',
+                                        headers={'If-None-Match': moved.headers['ETag']})).status_code
@@ -0,0 +1,58 @@
+import sys, os
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from gpiod.line import Value
+from actuators.base_actuators.gpio_line_manager import GpioLineManager, FakeChipBackend
+
+def test_lines_requested_once():
+    chip = FakeChipBackend()
+    manager = GpioLineManager(chip)
+    manager.request('blkcrtn_01', [23, 24])
+
+    for _ in range(10):
+        manager.set_value(23, Value.ACTIVE)
+        manager.set_value(23, Value.INACTIVE)
+
+    assert 1 == chip.request_count
+    assert Value.INACTIVE == chip.values[23]
+
+def test_no_glitch_to_active_on_write():
+    chip = FakeChipBackend()
+    manager = GpioLineManager(chip)
+    manager.request('crcltn_01', [17])
+
+    manager.set_value(17, Value.INACTIVE)
+    manager.set_value(17, Value.INACTIVE)
+
+    # リクエスト時の初期値はINACTIVEで、以降ACTIVEへ変化していない
+    assert [Value.INACTIVE] == [value for *_, value in chip.transitions]
+
+def test_set_values_grouped_by_request():
+    chip = FakeChipBackend()
+    manager = GpioLineManager(chip)
+    manager.request('sdwnd_01', [20, 21])
+
+    manager.set_values({20: Value.ACTIVE, 21: Value.ACTIVE})
+    assert Value.ACTIVE == chip.values[20]
+    assert Value.ACTIVE == chip.values[21]
+
+def test_unrequested_line_is_requested_lazily():
+    chip = FakeChipBackend()
+    manager = GpioLineManager(chip)
+
+    manager.set_value(27, Value.ACTIVE)
+    manager.set_value(27, Value.INACTIVE)
+
+    assert 1 == chip.request_count
+    assert manager.is_requested(27)
+
+def test_release():
+    chip = FakeChipBackend()
+    manager = GpioLineManager(chip)
+    manager.request('irrgtn_01', [27])
+    manager.release('irrgtn_01')
+
+    assert not manager.is_requested(27)
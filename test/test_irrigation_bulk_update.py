@@ -0,0 +1,81 @@
+import sys, os
+import shutil
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from models.actuator_models import IrrigationSchedule
+from services.irrigation_schedule_admin import AsyncIrrigationScheduleAdmin, build_schedule_mappings
+from actuators.irrigation.irrigation_scheduler import irrigation_scheduler
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'bulk.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool)
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+class Row:
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.line_no = 1
+        self.builder_cd = ''
+        self.created = datetime(2024, 5, 3)
+        self.updator_cd = None
+
+def test_build_schedule_mappings_splits_updates_and_inserts():
+    now = datetime(2024, 6, 27, 12, 0)
+    updates, inserts, schedules = build_schedule_mappings(
+        'irrgtn_01', {'05:00': [0, 3], '05:01': [1, 10]}, [Row('05:00')], now)
+
+    assert [('05:00', 0, 3)] == [(m['start_time'], m['permission'], m['irrigation_time']) for m in updates]
+    assert [('05:01', 1, 1)] == [(m['start_time'], m['line_no'], m['permission']) for m in inserts]
+    assert ['05:00', '05:01'] == [s.start_time for s in schedules]
+
+def test_build_schedule_mappings_rejects_unknown_actuator_and_bad_time():
+    now = datetime(2024, 6, 27, 12, 0)
+
+    assert build_schedule_mappings('irrgtn_09', {'05:00': [0, 3]}, [], now) is None
+    assert build_schedule_mappings('irrgtn_01', {'24:00': [0, 3]}, [Row('05:00')], now) is None
+
+@pytest.mark.asyncio
+async def test_full_day_schedule_is_applied_in_one_transaction(session_factory):
+    # 05:06 -> 306分 -> 潅水時間 306 % 7 = 5
+    schedules = {f'{m // 60:02}:{m % 60:02}': [1, m % 7] for m in range(1440)}
+
+    async with session_factory() as db:
+        assert await AsyncIrrigationScheduleAdmin(db).update_irrigation_table(
+            {'id': 'irrgtn_01', 'schedules': schedules})
+
+    async with session_factory() as db:
+        count = await db.scalar(select(func.count()).select_from(IrrigationSchedule).where(
+            IrrigationSchedule.actuator_id == 'irrgtn_01', IrrigationSchedule.start_time != '99:99'))
+        row = await db.scalar(select(IrrigationSchedule).where(
+            IrrigationSchedule.actuator_id == 'irrgtn_01', IrrigationSchedule.start_time == '05:06'))
+
+    assert 1440 == count
+    assert (1, 1, 5.0) == (row.line_no, row.permission, row.irrigation_time)
+    assert 5.0 == irrigation_scheduler.get_schedule('irrgtn_01', '05:06').irrigation_time
+
+@pytest.mark.asyncio
+async def test_invalid_slot_leaves_table_unchanged(session_factory):
+    async with session_factory() as db:
+        before = (await db.scalar(select(IrrigationSchedule).where(
+            IrrigationSchedule.actuator_id == 'irrgtn_01', IrrigationSchedule.start_time == '05:00'))).irrigation_time
+
+        assert not await AsyncIrrigationScheduleAdmin(db).update_irrigation_table(
+            {'id': 'irrgtn_01', 'schedules': {'05:00': [1, before + 1], 'xx:yy': [1, 1]}})
+
+    async with session_factory() as db:
+        after = (await db.scalar(select(IrrigationSchedule).where(
+            IrrigationSchedule.actuator_id == 'irrgtn_01', IrrigationSchedule.start_time == '05:00'))).irrigation_time
+
+    assert before == after
@@ -0,0 +1,168 @@
+import sys, os
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.irrigation.irrigation_scheduler import IrrigationScheduler
+from schemas.actuator_schemas import IrrigationTimeSchema
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+def make_schedule(start_time: str, irrigation_time: float = 3, permission: int = 1,
+                  actuator_id: str = 'irrgtn_01') -> IrrigationTimeSchema:
+    return IrrigationTimeSchema(
+        actuator_id=actuator_id, permission=permission, line_no=1 if actuator_id == 'irrgtn_01' else 2,
+        start_time=start_time, irrigation_time=irrigation_time,
+        builder_cd='', created=datetime(2024, 6, 1), updator_cd='', modified=datetime(2024, 6, 1))
+
+def test_next_fire_time_rolls_over_to_next_day():
+    now = datetime(2024, 6, 27, 12, 0, 30)
+
+    assert datetime(2024, 6, 27, 13, 0) == IrrigationScheduler.get_next_fire_time('13:00', now)
+    assert datetime(2024, 6, 28, 11, 0) == IrrigationScheduler.get_next_fire_time('11:00', now)
+    # 猶予時間内であれば当日とみなす
+    assert datetime(2024, 6, 27, 12, 0) == IrrigationScheduler.get_next_fire_time('12:00', now, 60)
+    assert IrrigationScheduler.get_next_fire_time('99:99', now) is None
+
+def test_dispatch_delivers_due_schedules_across_lines():
+    clock = FakeClock(datetime(2024, 6, 27, 4, 59))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([
+        make_schedule('05:00'),
+        make_schedule('05:00', actuator_id='irrgtn_02'),
+        make_schedule('06:00', permission=0),
+        make_schedule('99:99', irrigation_time=10),
+    ])
+
+    assert datetime(2024, 6, 27, 5, 0) == scheduler.next_fire_time()
+    assert [] == scheduler.dispatch()
+
+    clock.now = datetime(2024, 6, 27, 5, 0, 2)
+    delivered = scheduler.dispatch()
+
+    assert {'irrgtn_01', 'irrgtn_02'} == {s.actuator_id for s in delivered}
+    assert '05:00' == scheduler.pop_due('irrgtn_01').start_time
+    assert scheduler.pop_due('irrgtn_01') is None
+    # 不許可のスケジュールは配信しない
+    clock.now = datetime(2024, 6, 27, 6, 0)
+    assert [] == scheduler.dispatch()
+    # 配信したスケジュールは翌日に登録し直される
+    assert datetime(2024, 6, 28, 5, 0) == scheduler.next_fire_time()
+    # 手動潅水時間はキャッシュから取得する
+    assert 10 == scheduler.get_manual_schedule('irrgtn_01').irrigation_time
+
+def test_missed_schedule_beyond_grace_is_skipped(monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, 'IRRIGATION_GRACE_SECONDS', 60)
+    clock = FakeClock(datetime(2024, 6, 27, 4, 59))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([make_schedule('05:00')])
+
+    clock.now = datetime(2024, 6, 27, 5, 0, 59)
+    assert 1 == len(scheduler.dispatch())
+    assert scheduler.pop_due('irrgtn_01') is not None
+
+    clock.now = datetime(2024, 6, 28, 5, 5)
+    assert [] == scheduler.dispatch()
+    assert scheduler.pop_due('irrgtn_01') is None
+    assert datetime(2024, 6, 29, 5, 0) == scheduler.next_fire_time()
+
+def test_upsert_replaces_stale_heap_entry():
+    clock = FakeClock(datetime(2024, 6, 27, 4, 0))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([make_schedule('05:00', irrigation_time=3)])
+
+    scheduler.upsert(make_schedule('05:00', irrigation_time=20))
+    scheduler.upsert(make_schedule('04:30', irrigation_time=5))
+
+    assert datetime(2024, 6, 27, 4, 30) == scheduler.next_fire_time()
+
+    clock.now = datetime(2024, 6, 27, 4, 30)
+    assert [('04:30', 5)] == [(s.start_time, s.irrigation_time) for s in scheduler.dispatch()]
+
+    # 古い要素は読み飛ばされ、同じ時刻は一度だけ配信される
+    clock.now = datetime(2024, 6, 27, 5, 0)
+    assert [('05:00', 20)] == [(s.start_time, s.irrigation_time) for s in scheduler.dispatch()]
+
+def test_load_schedules_discards_undelivered_due_schedule():
+    clock = FakeClock(datetime(2024, 6, 27, 4, 59))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([make_schedule('05:00')])
+
+    clock.now = datetime(2024, 6, 27, 5, 0)
+    assert 1 == len(scheduler.dispatch())
+
+    # 潅水装置が取り出す前に読み直した場合、削除済みのスケジュールで潅水しない
+    scheduler.load_schedules([make_schedule('06:00')])
+    assert scheduler.pop_due('irrgtn_01') is None
+
+def test_due_schedules_missed_in_manual_are_not_replayed_in_auto(monkeypatch):
+    from config import settings
+    monkeypatch.setattr(settings, 'IRRIGATION_GRACE_SECONDS', 60)
+    clock = FakeClock(datetime(2024, 6, 27, 4, 59))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([make_schedule('05:00'), make_schedule('05:30'), make_schedule('06:00')])
+
+    # 手動運転中は潅水装置が取り出さないため、配信されたまま残る
+    for fire_at in ('05:00', '05:30', '06:00'):
+        hour, minute = [int(val) for val in fire_at.split(':')]
+        clock.now = datetime(2024, 6, 27, hour, minute, 5)
+        assert [fire_at] == [s.start_time for s in scheduler.dispatch()]
+    # 猶予時間を過ぎたものは配信時に破棄され、取り出されなくても溜まらない
+    assert 1 == len(scheduler._due['irrgtn_01'])
+
+    # 自動運転に戻ったときは、猶予時間内の潅水時刻だけを潅水する
+    assert '06:00' == scheduler.pop_due('irrgtn_01').start_time
+    assert scheduler.pop_due('irrgtn_01') is None
+
+    clock.now = datetime(2024, 6, 28, 5, 0, 5)
+    scheduler.dispatch()
+    clock.now = datetime(2024, 6, 28, 5, 2)
+    assert scheduler.pop_due('irrgtn_01') is None
+
+def test_upsert_replaces_undelivered_due_schedule():
+    clock = FakeClock(datetime(2024, 6, 27, 4, 59))
+    scheduler = IrrigationScheduler(clock)
+    scheduler.load_schedules([make_schedule('05:00', irrigation_time=3), make_schedule('05:01')])
+
+    clock.now = datetime(2024, 6, 27, 5, 1)
+    assert 2 == len(scheduler.dispatch())
+
+    # 配信直後に潅水時間を変更した場合は、変更後の潅水時間で潅水する
+    scheduler.upsert(make_schedule('05:00', irrigation_time=10))
+    # 不許可に変更した場合は潅水しない
+    scheduler.upsert(make_schedule('05:01', permission=0))
+
+    due = scheduler.pop_due('irrgtn_01')
+    assert ('05:00', 10) == (due.start_time, due.irrigation_time)
+    assert scheduler.pop_due('irrgtn_01') is None
+
+@pytest.mark.asyncio
+async def test_run_wakes_subscriber_when_schedule_is_due():
+    start = datetime.now()
+    scheduler = IrrigationScheduler()
+    scheduler.load_schedules([])
+
+    from actuators.base_actuators.notifier import Subscription
+    wake = scheduler.attach('irrgtn_01', Subscription(asyncio.get_running_loop()))
+    task = asyncio.create_task(scheduler.run())
+    try:
+        await asyncio.sleep(0.01)
+        # 実行中の追加でも、待機をやり直して配信する
+        fire_at = (start + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        scheduler.clock = lambda: fire_at
+        scheduler.upsert(make_schedule(fire_at.strftime('%H:%M')))
+
+        assert await wake.wait(timeout=2)
+        assert fire_at.strftime('%H:%M') == scheduler.pop_due('irrgtn_01').start_time
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
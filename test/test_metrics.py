@@ -0,0 +1,110 @@
+import sys, os
+import asyncio
+import time
+
+import pytest
+import httpx
+from fastapi import FastAPI
+from gpiod.line import Value
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.actuator_supervisor import actuator_supervisor
+from actuators.base_actuators.gpio_line_manager import FakeChipBackend, GpioLineManager
+from actuators.base_actuators.metrics import \
+    Counter, \
+    Histogram, \
+    MetricsMiddleware, \
+    MetricsRegistry, \
+    actuator_iteration_duration, \
+    db_query_duration, \
+    event_loop_lag, \
+    gpio_set_line_duration, \
+    gpio_toggles, \
+    http_request_duration, \
+    monitor_loop_lag
+from api.endpoints.actuator_endpoints import router
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram('op_seconds', 'Operation time.', ('op',), buckets=(0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'read')
+
+    lines = registry.render().splitlines()
+
+    assert ['# HELP op_seconds Operation time.', '# TYPE op_seconds histogram',
+            'op_seconds_bucket{op="read",le="0.1"} 2',
+            'op_seconds_bucket{op="read",le="1.0"} 3',
+            'op_seconds_bucket{op="read",le="+Inf"} 4',
+            'op_seconds_sum{op="read"} 3.65',
+            'op_seconds_count{op="read"} 4'] == lines
+    assert 4 == histogram.get_count('read')
+
+def test_counter_escapes_labels_and_rejects_duplicates():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter('events_total', 'Events.', ('name',)))
+    counter.inc('a"b\\c')
+    counter.inc('a"b\\c', amount=2)
+
+    assert 'events_total{name="a\\"b\\\\c"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        registry.register(Counter('events_total', 'Events.'))
+
+def test_gpio_latency_and_toggles():
+    manager = GpioLineManager(FakeChipBackend())
+    manager.request('blkcrtn_01', [23, 24])
+    before = (gpio_toggles.get(23), gpio_toggles.get(24), gpio_set_line_duration.get_count(23))
+
+    manager.set_value(23, Value.INACTIVE)      # 初期値と同じ
+    manager.set_value(23, Value.ACTIVE)
+    manager.set_values({23: Value.INACTIVE, 24: Value.ACTIVE})
+
+    assert (before[0] + 2, before[1] + 1) == (gpio_toggles.get(23), gpio_toggles.get(24))
+    assert before[2] + 3 == gpio_set_line_duration.get_count(23)
+    manager.release_all()
+
+def test_iteration_and_db_helper_durations():
+    iterations = actuator_iteration_duration.get_count('metrics_test')
+    queries = db_query_duration.get_count('get_actuator_state')
+
+    actuator_supervisor.record_iteration('metrics_test', 0.01)
+    actuator_state_registry.load()
+
+    assert iterations + 1 == actuator_iteration_duration.get_count('metrics_test')
+    assert queries + 1 == db_query_duration.get_count('get_actuator_state')
+    actuator_supervisor.remove('metrics_test')
+
+@pytest.mark.asyncio
+async def test_monitor_loop_lag_observes_blocked_loop():
+    task = asyncio.create_task(monitor_loop_lag('lag_test', interval=0.01))
+    await asyncio.sleep(0.02)
+    time.sleep(0.05)        # イベントループを止める
+    await asyncio.sleep(0.02)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert 0 < event_loop_lag.get_count('lag_test')
+    sums = [line for line in event_loop_lag.samples() if line.startswith('event_loop_lag_seconds_sum{loop="lag_test"}')]
+    assert float(sums[0].split()[-1]) >= 0.03
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_route_latency():
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+    health = http_request_duration.get_count('GET', '/actuators_health/', '200')
+    unmatched = http_request_duration.get_count('GET', 'unmatched', '404')
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        assert 200 == (await client.get('/actuators_health/')).status_code
+        assert 404 == (await client.get('/no_such_route/')).status_code
+        response = await client.get('/metrics')
+
+    assert 200 == response.status_code
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert health + 1 == http_request_duration.get_count('GET', '/actuators_health/', '200')
+    assert unmatched + 1 == http_request_duration.get_count('GET', 'unmatched', '404')
+    assert '# TYPE gpio_toggles_total counter' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/actuators_health/",status="200"}' in response.text
@@ -0,0 +1,74 @@
+import sys, os
+import asyncio
+
+import pytest
+from gpiod.line import Value
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.gpio_line_manager import FakeChipBackend, gpio_line_manager
+from actuators.base_actuators.motor_positioner import MotorPositioner
+from actuators.base_actuators.notifier import Subscription
+
+FORWARD = 901
+REVERSE = 902
+
+@pytest.fixture
+def chip():
+    chip = FakeChipBackend()
+    gpio_line_manager.set_backend(chip)
+    yield chip
+    gpio_line_manager.set_backend(None)
+
+def active_count(chip, gpio_no):
+    return len([t for t in chip.transitions if t[2] == gpio_no and t[3] == Value.ACTIVE])
+
+@pytest.mark.asyncio
+async def test_move_runs_motor_once_for_exact_time(chip):
+    positioner = MotorPositioner('test_motor', FORWARD, REVERSE)
+    positioner.configure(0.4, 0)    # 全開0.4秒 -> 開度１％0.004秒
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    position = await positioner.move_to(50)
+
+    assert 50 == position
+    assert 0.2 == pytest.approx(loop.time() - started, abs=0.05)
+    assert 1 == active_count(chip, FORWARD)
+    assert 0 == active_count(chip, REVERSE)
+    assert Value.INACTIVE == chip.values[FORWARD]
+
+@pytest.mark.asyncio
+async def test_move_stops_when_mode_changes(chip):
+    positioner = MotorPositioner('test_motor', FORWARD, REVERSE)
+    positioner.configure(1.0, 100)
+    wake = Subscription(asyncio.get_running_loop())
+    running = {'value': True}
+
+    def change_mode():
+        running['value'] = False
+        wake.notify()
+
+    asyncio.get_running_loop().call_later(0.2, change_mode)
+    position = await positioner.move_to(0, keep_running=lambda: running['value'], wake=wake)
+
+    assert 80 == pytest.approx(position, abs=5)
+    assert 1 == active_count(chip, REVERSE)
+    assert Value.INACTIVE == chip.values[REVERSE]
+
+@pytest.mark.asyncio
+async def test_retarget_extends_run_without_restarting_motor(chip):
+    positioner = MotorPositioner('test_motor', FORWARD, REVERSE)
+    positioner.configure(0.5, 0)
+    wake = Subscription(asyncio.get_running_loop())
+    target = {'value': 20}
+
+    def extend():
+        target['value'] = 60
+        wake.notify()
+
+    asyncio.get_running_loop().call_later(0.05, extend)
+    position = await positioner.move_to(20, retarget=lambda aperture: target['value'], wake=wake)
+
+    assert 60 == position
+    assert 1 == active_count(chip, FORWARD)
@@ -0,0 +1,49 @@
+import sys, os
+import asyncio
+
+import pytest
+import httpx
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from actuators.base_actuators.gpio_line_manager import FakeChipBackend, gpio_line_manager
+from database.db_access import engine
+from main import create_app
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+def test_runs_against_database_copy():
+    # lifespanは環境計測値の削除や開度の書き込みをおこなうため、conftest.pyがコピーしたDBで実行する
+    assert os.path.realpath(engine.url.database) != os.path.realpath(DB_PATH)
+
+@pytest.mark.asyncio
+async def test_lifespan_runs_actuators_on_same_loop(monkeypatch):
+    monkeypatch.setattr(settings, 'SINGLE_LOOP_MODE', True)
+    gpio_line_manager.set_backend(FakeChipBackend())
+    app = create_app()
+
+    async with app.router.lifespan_context(app):
+        await asyncio.sleep(0.2)
+        am = app.state.actuator_manager
+
+        assert len(am.actuators) > 0
+        assert all(not tsk.done() for tsk in am.tasks.values())
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            response = await client.get('/actuators_state/')
+
+        assert 200 == response.status_code
+
+    # 終了時にタスクを停止し、GPIOラインを解放する
+    assert {} == am.tasks
+    assert not gpio_line_manager.is_requested(23)
+    gpio_line_manager.set_backend(None)
+
+@pytest.mark.asyncio
+async def test_lifespan_without_single_loop_mode(monkeypatch):
+    monkeypatch.setattr(settings, 'SINGLE_LOOP_MODE', False)
+    app = create_app()
+
+    async with app.router.lifespan_context(app):
+        assert app.state.actuator_manager is None
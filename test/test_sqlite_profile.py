@@ -0,0 +1,66 @@
+import sys, os
+import shutil
+
+import pytest
+from sqlalchemy import create_engine, event, text
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import settings
+from database.db_access import \
+    apply_journal_mode, \
+    apply_sqlite_pragmas, \
+    get_async_session, \
+    get_session, \
+    get_sqlite_pragmas
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.fixture
+def db_copy(tmp_path):
+    # journal_modeの変更はDBファイルに保存されるため、一時ディレクトリへコピーして確認する
+    db_path = tmp_path / 'profile.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    engine = create_engine(f'sqlite:///{db_path}')
+    event.listen(engine, 'connect', apply_sqlite_pragmas)
+    yield engine
+    engine.dispose()
+
+def journal_mode(engine) -> str:
+    with engine.connect() as connection:
+        return connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+
+def test_profile_applied_on_connect():
+    with get_session() as db:
+        busy_timeout = db.execute(text('PRAGMA busy_timeout')).scalar()
+        cache_size = db.execute(text('PRAGMA cache_size')).scalar()
+
+    assert settings.SQLITE_BUSY_TIMEOUT == busy_timeout
+    assert settings.SQLITE_CACHE_SIZE == cache_size
+
+@pytest.mark.asyncio
+async def test_profile_applied_on_async_connect():
+    async with get_async_session() as db:
+        mmap_size = (await db.execute(text('PRAGMA mmap_size'))).scalar()
+
+    assert settings.SQLITE_MMAP_SIZE == mmap_size
+
+def test_connect_does_not_change_journal_mode(db_copy):
+    before = journal_mode(db_copy)
+
+    assert 'journal_mode' not in get_sqlite_pragmas()
+    assert before == journal_mode(db_copy)
+
+def test_apply_journal_mode_migrates_file(db_copy, monkeypatch):
+    monkeypatch.setattr(settings, 'SQLITE_JOURNAL_MODE', 'WAL')
+
+    assert 'wal' == apply_journal_mode(db_copy)
+    db_copy.dispose()
+    assert 'wal' == journal_mode(db_copy)
+
+def test_empty_setting_is_skipped(monkeypatch):
+    monkeypatch.setattr(settings, 'SQLITE_TEMP_STORE', '')
+    monkeypatch.setattr(settings, 'SQLITE_JOURNAL_MODE', '')
+
+    assert 'temp_store' not in get_sqlite_pragmas()
+    assert apply_journal_mode() is None
@@ -0,0 +1,110 @@
+import sys, os
+import asyncio
+import json
+import shutil
+import threading
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.aperture_store import aperture_store
+from actuators.base_actuators.actuator_state_registry import actuator_state_registry
+from actuators.base_actuators.state_stream import StateStream, state_stream
+from api.endpoints.actuator_endpoints import stream_actuators_state
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'actuators_manage_db.sqlite')
+
+@pytest.mark.asyncio
+async def test_deltas_are_filtered_by_group():
+    stream = StateStream()
+    stream.set_groups({'sdwnd_01': 1, 'blkcrtn_01': 2})
+    everything = stream.subscribe()
+    group_1 = stream.subscribe(1)
+
+    stream.publish('sdwnd_01', aperture=40.0)
+    stream.publish('blkcrtn_01', state=9)
+
+    assert {'actuator_id': 'sdwnd_01', 'group_no': 1, 'aperture': 40.0} == await group_1.get(1)
+    assert group_1.queue.empty()
+    assert 2 == everything.queue.qsize()
+
+@pytest.mark.asyncio
+async def test_slow_client_is_dropped_without_blocking_publisher():
+    stream = StateStream()
+    slow = stream.subscribe()
+    slow.queue = asyncio.Queue(3)
+    fast = stream.subscribe()
+
+    for i in range(10):
+        stream.publish('sdwnd_01', aperture=float(i))
+        await fast.get(1)
+
+    assert slow.dropped
+    assert 3 == slow.queue.qsize()
+    assert not fast.dropped
+
+@pytest.mark.asyncio
+async def test_publish_from_control_thread():
+    stream = StateStream()
+    client = stream.subscribe()
+
+    thread = threading.Thread(target=stream.publish, args=('sdwnd_01',), kwargs={'state': 1})
+    thread.start()
+    thread.join()
+
+    assert {'actuator_id': 'sdwnd_01', 'group_no': None, 'state': 1} == await client.get(1)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # リポジトリのDBは変更しないよう、一時ディレクトリへコピーして使う
+    db_path = tmp_path / 'stream.sqlite'
+    shutil.copyfile(DB_PATH, db_path)
+    factory = async_sessionmaker(
+        create_async_engine(f'sqlite+aiosqlite:///{db_path}', poolclass=NullPool), expire_on_commit=False)
+    yield factory
+    # 他のテストへ未書き込みの開度を残さない
+    aperture_store._take_pending()
+    aperture_store._apertures.pop('sdwnd_01', None)
+
+def parse_event(chunk: str) -> tuple:
+    lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return lines['event'], json.loads(lines['data'])
+
+@pytest.mark.asyncio
+async def test_endpoint_sends_snapshot_then_deltas(session_factory):
+    async with session_factory() as db:
+        response = await stream_actuators_state(None, db)
+    body = response.body_iterator
+
+    event, snapshot = parse_event(await anext(body))
+    assert 'snapshot' == event
+    group_no = next(s['group_no'] for s in snapshot['actuators'] if s['actuator_id'] == 'sdwnd_01')
+
+    aperture_store.set('sdwnd_01', 37.0)
+    actuator_state_registry.update('sdwnd_01', actuator_state_registry.get('sdwnd_01'))
+
+    event, delta = parse_event(await asyncio.wait_for(anext(body), 1))
+    assert 'delta' == event
+    assert {'actuator_id': 'sdwnd_01', 'group_no': group_no, 'aperture': 37.0} == delta
+    event, delta = parse_event(await asyncio.wait_for(anext(body), 1))
+    assert {'actuator_id', 'group_no', 'state'} == set(delta)
+
+    # 切断すると購読を解除する
+    await body.aclose()
+    assert 0 == len(state_stream._clients)
+
+@pytest.mark.asyncio
+async def test_endpoint_snapshot_is_filtered_by_group(session_factory):
+    async with session_factory() as db:
+        response = await stream_actuators_state(-1, db)
+    body = response.body_iterator
+
+    event, snapshot = parse_event(await anext(body))
+    aperture_store.set('sdwnd_01', 38.0)
+
+    assert [] == snapshot['actuators']
+    assert 0 == state_stream._clients[0].queue.qsize()
+    await body.aclose()
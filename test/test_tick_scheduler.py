@@ -0,0 +1,60 @@
+import sys, os
+import asyncio
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.notifier import Notifier
+from actuators.base_actuators.tick_scheduler import TickScheduler
+from actuators.base_actuators.metrics import actuator_missed_ticks
+
+@pytest.mark.asyncio
+async def test_deadlines_do_not_drift():
+    scheduler = TickScheduler()
+    ticker = scheduler.register('blkcrtn_01', 0.05)
+    loop = asyncio.get_running_loop()
+
+    await ticker.wait()
+    start = ticker.deadline
+    for _ in range(5):
+        # 処理時間（計測間隔未満）
+        await asyncio.sleep(0.01)
+        await ticker.wait()
+
+    # 期限は開始時刻 + n × 計測間隔のまま
+    assert ticker.deadline == pytest.approx(start + 5 * 0.05)
+    assert 5 == ticker.ticks
+    assert 0 == ticker.missed_ticks
+    assert loop.time() >= start + 4 * 0.05
+
+@pytest.mark.asyncio
+async def test_overrun_counts_missed_ticks():
+    scheduler = TickScheduler()
+    ticker = scheduler.register('crcltn_01', 0.05)
+    missed = actuator_missed_ticks.get('crcltn_01')
+
+    await ticker.wait()
+    # 計測間隔を超える処理時間
+    await asyncio.sleep(0.18)
+    await ticker.wait()
+
+    assert 3 == ticker.missed_ticks
+    assert 3 == scheduler.stats()['crcltn_01']['missed_ticks']
+    assert missed + 3 == actuator_missed_ticks.get('crcltn_01')
+
+@pytest.mark.asyncio
+async def test_wake_before_deadline():
+    scheduler = TickScheduler()
+    ticker = scheduler.register('sdwnd_01', 10)
+    notifier = Notifier()
+    wake = notifier.subscribe()
+    loop = asyncio.get_running_loop()
+
+    loop.call_later(0.05, notifier.notify_all)
+    started = loop.time()
+    await ticker.wait(wake)
+
+    assert loop.time() - started < 1
+    # 早期起床では期限は変わらない
+    assert ticker.deadline == pytest.approx(started + 10, abs=0.01)
@@ -0,0 +1,50 @@
+import sys, os
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+# インポートさせたいディレクトリパスを取得する
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from actuators.base_actuators.virtual_clock import VirtualTimeLoop
+
+START = datetime(2024, 6, 27, 6, 0, 0)
+
+@pytest.fixture
+def loop():
+    loop = VirtualTimeLoop(START)
+    yield loop
+    loop.close()
+
+def test_sleep_advances_virtual_time_only(loop):
+    async def main():
+        await asyncio.sleep(3600)
+        return loop.time()
+
+    started = time.perf_counter()
+    assert 3600 == loop.run_until_complete(main())
+    assert time.perf_counter() - started < 1.0
+    assert datetime(2024, 6, 27, 7, 0, 0) == loop.now()
+
+def test_timers_fire_in_order(loop):
+    fired = []
+    loop.call_later(30, fired.append, ('b', 30))
+    loop.call_later(10, fired.append, ('a', 10))
+
+    async def main():
+        try:
+            await asyncio.wait_for(asyncio.Event().wait(), timeout=60)
+        except asyncio.TimeoutError:
+            fired.append(('timeout', loop.time()))
+
+    loop.run_until_complete(main())
+
+    assert [('a', 10), ('b', 30), ('timeout', 60)] == fired
+
+def test_thread_work_does_not_advance_virtual_time(loop):
+    async def main():
+        await loop.run_in_executor(None, time.sleep, 0.05)
+        return loop.time()
+
+    assert 0 == loop.run_until_complete(main())